@@ -0,0 +1,207 @@
+"""
+Reproducible generators for synthetic benchmark data.
+
+All generators take a seed, so the same arguments always give the same file. They write in chunks,
+so they can be used for large files (up to about 10^8 edges or nodes, memory permitting).
+
+- write_scale_free_edgelist(): edgelist with a power-law degree distribution (Chung-Lu model)
+- write_scale_free_pajek(): the same kind of network, as a Pajek file
+- write_treefile(): hierarchical Infomap-style .tree file
+- generate_inverted_abstracts(): inverted abstracts like the ones from the Microsoft Academic API
+"""
+
+import csv
+import math
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 1000000
+
+
+def _power_law_cdf(num_nodes, exponent):
+    # Chung-Lu model: expected degree of node i is proportional to (i + 1) ** (-1 / (exponent - 1))
+    weights = np.arange(1, num_nodes + 1, dtype=np.float64) ** (-1.0 / (exponent - 1.0))
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    return cdf
+
+def _node_names(num_nodes, rng):
+    # shuffle the names, so that the high-degree nodes are not the first ones
+    return rng.permutation(num_nodes) + 1
+
+def iter_scale_free_edges(num_edges, num_nodes=None, exponent=2.1, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """Generate the edges of a directed scale-free network
+
+    Both endpoints of each edge are drawn with probability proportional to the node's expected degree,
+    so the in- and out-degree distributions follow a power law. Self loops and repeated edges are allowed.
+
+    :num_edges: number of edges
+    :num_nodes: number of nodes to draw from. Default: num_edges // 10 (at least 2)
+    :exponent: exponent of the degree distribution
+    :seed: random seed
+    :chunksize: number of edges per chunk
+    :returns: generator of (sources, targets) arrays of node names (ints from 1 to num_nodes)
+
+    """
+    num_nodes = num_nodes or max(2, num_edges // 10)
+    rng = np.random.RandomState(seed)
+    cdf = _power_law_cdf(num_nodes, exponent)
+    names = _node_names(num_nodes, rng)
+    for start in range(0, num_edges, chunksize):
+        n = min(chunksize, num_edges - start)
+        sources = np.minimum(np.searchsorted(cdf, rng.random_sample(n)), num_nodes - 1)
+        targets = np.minimum(np.searchsorted(cdf, rng.random_sample(n)), num_nodes - 1)
+        yield names[sources], names[targets]
+
+def write_scale_free_edgelist(fname, num_edges, num_nodes=None, exponent=2.1, seed=0, sep='\t', header=True, weighted=False, chunksize=DEFAULT_CHUNKSIZE):
+    """Write a scale-free edgelist (see iter_scale_free_edges())
+
+    :fname: output filename
+    :header: write a header row
+    :weighted: add a third column of random weights
+    :returns: fname
+
+    """
+    rng = np.random.RandomState(seed + 1)
+    with open(fname, 'w') as outf:
+        if header:
+            outf.write(sep.join(['source', 'target', 'weight'] if weighted else ['source', 'target']) + '\n')
+        for sources, targets in iter_scale_free_edges(num_edges, num_nodes=num_nodes, exponent=exponent, seed=seed, chunksize=chunksize):
+            chunk = pd.DataFrame({'source': sources, 'target': targets})
+            if weighted:
+                chunk['weight'] = np.round(rng.random_sample(len(chunk)), 4)
+            chunk.to_csv(outf, sep=sep, header=False, index=False)
+    return fname
+
+def write_scale_free_pajek(fname, num_edges, num_nodes=None, exponent=2.1, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """Write a scale-free network as a Pajek file (see iter_scale_free_edges())
+
+    The vertex names are the node names as strings, and the vertex ids are the node names,
+    so every node from 1 to num_nodes is a vertex, whether or not it has edges.
+
+    :fname: output filename
+    :returns: fname
+
+    """
+    num_nodes = num_nodes or max(2, num_edges // 10)
+    with open(fname, 'w') as outf:
+        outf.write("*vertices {}\n".format(num_nodes))
+        for start in range(1, num_nodes + 1, chunksize):
+            ids = pd.Series(np.arange(start, min(start + chunksize, num_nodes + 1))).astype(str)
+            outf.write('\n'.join(ids + ' "' + ids + '"') + '\n')
+        outf.write("*arcs {}\n".format(num_edges))
+        for sources, targets in iter_scale_free_edges(num_edges, num_nodes=num_nodes, exponent=exponent, seed=seed, chunksize=chunksize):
+            pd.DataFrame({'source': sources, 'target': targets}).to_csv(outf, sep=' ', header=False, index=False)
+    return fname
+
+def _dense_codes(prefix_start, codes):
+    """Renumber sorted codes 1, 2, 3, ... within each group of rows that share a prefix
+
+    :prefix_start: boolean array: True where a new prefix group starts
+    :codes: codes, sorted within each prefix group
+    :returns: array of int64
+
+    """
+    new_code = prefix_start.copy()
+    new_code[1:] |= codes[1:] != codes[:-1]
+    rank = np.cumsum(new_code)
+    # subtract the rank at the start of each prefix group
+    group_base = np.maximum.accumulate(np.where(prefix_start, rank, 0))
+    return rank - group_base + 1
+
+def _subtree_rows(num_nodes, depth, branching, rng):
+    """Random cluster codes for the nodes of one top-level cluster
+
+    :returns: list of arrays: cluster codes at levels 2..depth, then the leaf position, all in hierarchical order
+
+    """
+    # cluster sizes are skewed: child k is chosen with probability proportional to k ** -1.5
+    p = np.arange(1, branching + 1, dtype=np.float64) ** -1.5
+    p /= p.sum()
+    levels = [rng.choice(branching, size=num_nodes, p=p) for _ in range(depth - 1)]
+    order = np.lexsort(levels[::-1]) if levels else np.arange(num_nodes)
+    levels = [level[order] for level in levels]
+    out = []
+    prefix_start = np.zeros(num_nodes, dtype=bool)
+    prefix_start[0] = True
+    for level in levels:
+        out.append(_dense_codes(prefix_start, level))
+        prefix_start[1:] |= level[1:] != level[:-1]
+    # leaf positions within the lowest level clusters
+    out.append(_dense_codes(prefix_start, np.arange(num_nodes)))
+    return out
+
+def write_treefile(fname, num_nodes, branching=10, depth=None, seed=0):
+    """Write a hierarchical treefile in the format written by Infomap
+
+    Each line is: <path> <flow> "<name>" <node id>, e.g.: 1:2:5 0.000123 "17" 17
+    The clusters have skewed sizes, all leaves are at the same depth, the rows are in hierarchical order,
+    and the rows of each leaf cluster are in descending order of flow (as in Infomap's output).
+
+    :fname: output filename
+    :num_nodes: number of nodes (rows)
+    :branching: maximum number of child clusters of a cluster
+    :depth: number of cluster levels above the leaves. Default: from num_nodes and branching (at least 1)
+    :seed: random seed
+    :returns: fname
+
+    """
+    rng = np.random.RandomState(seed)
+    if depth is None:
+        # about branching nodes per leaf cluster (the top level has up to branching ** 2 clusters)
+        depth = max(1, int(round(math.log(max(num_nodes, 2)) / math.log(branching))) - 2)
+    # the top-level clusters are written one at a time
+    num_top = max(1, min(num_nodes, branching ** 2))
+    p = np.arange(1, num_top + 1, dtype=np.float64) ** -1.2
+    top_sizes = rng.multinomial(num_nodes, p / p.sum())
+    top_sizes = top_sizes[top_sizes > 0]
+    names = _node_names(num_nodes, rng)
+    # flows follow a power law and add up to 1
+    flows = rng.pareto(2.0, num_nodes) + 1
+    flows /= flows.sum()
+    start = 0
+    with open(fname, 'w') as outf:
+        outf.write("# synthetic treefile: {} nodes, seed {}\n".format(num_nodes, seed))
+        for top, size in enumerate(top_sizes):
+            levels = _subtree_rows(size, depth, branching, rng)
+            flow = flows[start:start + size]
+            # descending flow within each leaf cluster: sort by (cluster codes, -flow). the leaf positions stay in row order
+            order = np.lexsort([-flow] + levels[:-1][::-1]) if len(levels) > 1 else np.argsort(-flow, kind='mergesort')
+            flow = flow[order]
+            path = pd.Series(np.full(size, top + 1)).astype(str)
+            for level in levels[:-1]:
+                path = path + ':' + pd.Series(level[order]).astype(str)
+            path = path + ':' + pd.Series(levels[-1]).astype(str)
+            node_names = names[start:start + size]
+            start += size
+            chunk = pd.DataFrame({
+                'path': path,
+                'flow': flow,
+                'name': pd.Series(node_names).astype(str).radd('"') + '"',
+                'node': node_names,
+            })
+            chunk.to_csv(outf, sep=' ', header=False, index=False, float_format='%.8g', quoting=csv.QUOTE_NONE, quotechar="'")
+    return fname
+
+def generate_inverted_abstracts(num_abstracts, words_per_abstract=150, vocab_size=5000, seed=0):
+    """Generate inverted abstracts (dicts of word -> list of positions)
+
+    Word frequencies follow Zipf's law, and the lengths vary around words_per_abstract.
+
+    :returns: list of (inverted abstract, index length) tuples
+
+    """
+    rng = np.random.RandomState(seed)
+    p = 1.0 / np.arange(1, vocab_size + 1, dtype=np.float64)
+    p /= p.sum()
+    vocab = np.array(['w{}'.format(i) for i in range(vocab_size)], dtype=object)
+    out = []
+    for _ in range(num_abstracts):
+        n = max(1, int(rng.normal(words_per_abstract, words_per_abstract / 4.0)))
+        words = vocab[rng.choice(vocab_size, size=n, p=p)]
+        inverted = {}
+        for i, w in enumerate(words):
+            inverted.setdefault(w, []).append(i)
+        out.append((inverted, n))
+    return out
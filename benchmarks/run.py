@@ -0,0 +1,200 @@
+"""
+Run the benchmarks and record their throughput and peak memory.
+
+Each benchmark runs in a fresh Python process, so its peak resident set size (RSS) is its own.
+The input data is generated once per size in the data directory, and reused.
+
+    python -m benchmarks.run --sizes 1e4 1e5 1e6
+    python -m benchmarks.run --benchmarks Treefile --sizes 1e6 --output results.jsonl
+    python -m benchmarks.run --sizes 1e5 --compare baseline.jsonl
+
+With --output, one JSON line per result is appended to the file (with the git commit and the time).
+With --compare, results are checked against a previous output file, and the exit status is 1 if the throughput
+dropped, or the peak RSS grew, by more than the threshold.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from tempfile import gettempdir
+from timeit import default_timer as timer
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DATA_DIR = os.path.join(gettempdir(), 'h1theswan_utils_benchmarks')
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, in MB"""
+    try:
+        # VmHWM is the peak for the current process image (not including the parent's memory before exec)
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxrss / 1024.0
+
+def run_in_process(name, size, data_dir, repeat=1):
+    """Run one benchmark in this process
+
+    :returns: dictionary with the benchmark's results
+
+    """
+    from .suite import get_benchmark
+    # make sure the lazily imported modules are loaded before timing
+    import numpy, pandas
+    cls = get_benchmark(name)
+    times = []
+    for i in range(repeat):
+        bench = cls(size, data_dir)
+        bench.setup()
+        setup_rss = peak_rss_mb()
+        try:
+            start = timer()
+            bench.run()
+            times.append(timer() - start)
+        finally:
+            bench.teardown()
+    seconds = min(times)
+    num_elements = bench.num_elements()
+    return {
+        'benchmark': name,
+        'size': size,
+        'unit': cls.unit,
+        'num_elements': num_elements,
+        'seconds': seconds,
+        'throughput': num_elements / seconds if seconds > 0 else float('inf'),
+        'setup_peak_rss_mb': setup_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'repeat': repeat,
+    }
+
+def run_benchmark(name, size, data_dir=DEFAULT_DATA_DIR, repeat=1):
+    """Generate the data for a benchmark if needed, then run it in a new process
+
+    :returns: dictionary with the benchmark's results
+
+    """
+    from .suite import get_benchmark
+    get_benchmark(name)(size, data_dir).prepare()
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_ROOT, env.get('PYTHONPATH', '')]).rstrip(os.pathsep)
+    cmd = [sys.executable, '-m', 'benchmarks.run', '--child', name, '--sizes', str(size), '--data-dir', data_dir, '--repeat', str(repeat)]
+    out = subprocess.check_output(cmd, env=env, cwd=REPO_ROOT)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+def get_git_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.STDOUT)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(fname):
+    """Load results from an output file. For each (benchmark, size), the last result in the file is used
+
+    :returns: dictionary of (benchmark, size) -> result
+
+    """
+    results = {}
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                r = json.loads(line)
+                results[(r['benchmark'], r['size'])] = r
+    return results
+
+def compare_results(results, baseline, threshold=0.25):
+    """Find regressions against a baseline
+
+    :results: list of result dictionaries
+    :baseline: dictionary of (benchmark, size) -> result (see load_results())
+    :threshold: fraction by which the throughput can drop, or the peak RSS can grow, before it counts as a regression
+    :returns: list of messages, one per regression
+
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get((r['benchmark'], r['size']))
+        if base is None:
+            continue
+        if r['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append("{} (size {}): throughput {:.4g} {}/s, baseline {:.4g}".format(
+                                r['benchmark'], r['size'], r['throughput'], r['unit'], base['throughput']))
+        if r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            regressions.append("{} (size {}): peak RSS {:.1f} MB, baseline {:.1f} MB".format(
+                                r['benchmark'], r['size'], r['peak_rss_mb'], base['peak_rss_mb']))
+    return regressions
+
+def format_result(r):
+    return "{:<45} {:>11} {:>10.3f} s {:>14.4g} {}/s {:>10.1f} MB".format(
+                r['benchmark'], r['size'], r['seconds'], r['throughput'], r['unit'], r['peak_rss_mb'])
+
+def parse_size(s):
+    # accept 1e6 as well as 1000000
+    return int(float(s))
+
+def main(args):
+    if args.child:
+        print(json.dumps(run_in_process(args.child, args.sizes[0], args.data_dir, repeat=args.repeat)))
+        return 0
+
+    from .suite import BENCHMARKS
+    names = [cls.name for cls in BENCHMARKS]
+    if args.benchmarks:
+        names = [name for name in names if any(pattern in name for pattern in args.benchmarks)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    meta = {
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    results = []
+    for name in names:
+        for size in args.sizes:
+            r = run_benchmark(name, size, data_dir=args.data_dir, repeat=args.repeat)
+            r.update(meta)
+            results.append(r)
+            print(format_result(r))
+            sys.stdout.flush()
+            if args.output:
+                with open(args.output, 'a') as outf:
+                    outf.write(json.dumps(r) + '\n')
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), threshold=args.threshold)
+        for msg in regressions:
+            print("REGRESSION: {}".format(msg))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the benchmarks, and record their throughput and peak memory")
+    parser.add_argument("--sizes", nargs='+', type=parse_size, default=DEFAULT_SIZES, help="sizes to run (numbers of edges, nodes, or words), e.g. 1e4 1e6 (default: 1e4 1e5 1e6)")
+    parser.add_argument("--benchmarks", nargs='+', help="only run the benchmarks whose names contain one of these strings")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="directory for the generated data (default: {})".format(DEFAULT_DATA_DIR))
+    parser.add_argument("--repeat", type=int, default=1, help="number of times to run each benchmark (the fastest time is kept)")
+    parser.add_argument("--output", help="append the results to this file (JSON lines)")
+    parser.add_argument("--compare", help="compare the results against this file (output of an earlier run)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="fraction of throughput or peak RSS that counts as a regression (default: 0.25)")
+    parser.add_argument("--list", action='store_true', help="list the benchmarks and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sys.exit(main(args))
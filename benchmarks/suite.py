@@ -0,0 +1,309 @@
+"""
+The benchmarks.
+
+Each benchmark has a size: the number of edges, treefile rows, or abstract words it works on.
+prepare() writes its input files (once per size, in the data directory), setup() loads what the timed part needs,
+and run() is the part that is timed. The benchmark's throughput is the number of elements divided by the time of run().
+"""
+
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from h1theswan_utils.microsoft_academic_api import convert_inverted_abstract_to_abstract_words
+from h1theswan_utils.network_data import PajekFactory, edgelist_to_pajek, extract_subgraph_from_pajek
+from h1theswan_utils.network_data.AutoID import AutoID, CompactAutoID
+from h1theswan_utils.treefiles import Treefile
+
+from . import generators
+
+SEED = 0
+
+
+def data_file(data_dir, kind, size, write):
+    """Filename for generated input data, writing it first if it does not exist
+
+    :kind: kind of file, e.g. 'edgelist.tsv'
+    :write: function of (filename, size) that writes the file
+    :returns: filename
+
+    """
+    fname = os.path.join(data_dir, '{}-seed{}-{}'.format(size, SEED, kind))
+    if not os.path.exists(fname):
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        tmp_fname = fname + '.tmp'
+        write(tmp_fname, size)
+        os.rename(tmp_fname, fname)
+    return fname
+
+def edgelist_file(data_dir, size):
+    return data_file(data_dir, 'edgelist.tsv', size, lambda fname, n: generators.write_scale_free_edgelist(fname, n, seed=SEED))
+
+def pajek_file(data_dir, size):
+    return data_file(data_dir, 'network.net', size, lambda fname, n: generators.write_scale_free_pajek(fname, n, seed=SEED))
+
+def treefile_file(data_dir, size):
+    return data_file(data_dir, 'clusters.tree', size, lambda fname, n: generators.write_treefile(fname, n, seed=SEED))
+
+
+class Benchmark(object):
+
+    """Base class for benchmarks"""
+
+    name = None
+    unit = 'elements'
+
+    def __init__(self, size, data_dir):
+        self.size = size
+        self.data_dir = data_dir
+        self.temp_dir = None
+
+    def prepare(self):
+        """Write the input files (not timed, and not counted in the benchmark's memory)"""
+        pass
+
+    def setup(self):
+        """Load the inputs for run() (not timed)"""
+        pass
+
+    def run(self):
+        """The timed part"""
+        raise NotImplementedError
+
+    def num_elements(self):
+        """Number of elements that run() processes"""
+        return self.size
+
+    def teardown(self):
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir)
+            self.temp_dir = None
+
+    def make_temp_dir(self):
+        self.temp_dir = mkdtemp(dir=self.data_dir)
+        return self.temp_dir
+
+
+class EdgelistToPajek(Benchmark):
+
+    unit = 'edges'
+    engine = None
+
+    def prepare(self):
+        self.fname = edgelist_file(self.data_dir, self.size)
+
+    def setup(self):
+        self.prepare()
+        self.make_temp_dir()
+
+    def run(self):
+        edgelist_to_pajek(self.fname, engine=self.engine, temp_dir=self.temp_dir)
+
+class EdgelistToPajekPython(EdgelistToPajek):
+    name = 'edgelist_to_pajek[python]'
+    engine = 'python'
+
+class EdgelistToPajekPandas(EdgelistToPajek):
+    name = 'edgelist_to_pajek[pandas]'
+    engine = 'pandas'
+
+
+class PajekFactoryAddEdge(Benchmark):
+
+    name = 'PajekFactory.add_edge'
+    unit = 'edges'
+
+    def setup(self):
+        self.edges = []
+        for sources, targets in generators.iter_scale_free_edges(self.size, seed=SEED):
+            self.edges.extend(zip(sources.astype(str).tolist(), targets.astype(str).tolist()))
+        self.pjk = PajekFactory(temp_dir=self.make_temp_dir())
+
+    def run(self):
+        add_edge = self.pjk.add_edge
+        for source, target in self.edges:
+            add_edge(source, target)
+
+
+class PajekFactoryWrite(Benchmark):
+
+    name = 'PajekFactory.write'
+    unit = 'edges'
+
+    def setup(self):
+        temp_dir = self.make_temp_dir()
+        self.pjk = PajekFactory(temp_dir=temp_dir)
+        for sources, targets in generators.iter_scale_free_edges(self.size, seed=SEED):
+            self.pjk.add_edges(sources.astype(str), targets.astype(str))
+        self.output_fname = os.path.join(temp_dir, 'out.net')
+
+    def run(self):
+        with open(self.output_fname, 'w') as outf:
+            self.pjk.write(outf)
+
+
+class AutoIDLookup(Benchmark):
+
+    """Assign ids to the names of both endpoints of each edge, one name at a time, as PajekFactory.add_edge() does.
+    There are as many nodes as edges, so most of the names are distinct. The names are new strings, as from a parser.
+
+    Compare with CompactAutoIDLookup for the speed/memory tradeoff of CompactAutoID:
+    the memory of the ids is peak_rss_mb - setup_peak_rss_mb"""
+
+    name = 'AutoID'
+    unit = 'edges'
+    id_class = AutoID
+    batch_size = 100000
+
+    def setup(self):
+        # sources and targets interleaved, in edge order
+        self.names = np.concatenate([np.column_stack([sources, targets]).ravel()
+                                        for sources, targets in generators.iter_scale_free_edges(self.size, num_nodes=self.size, seed=SEED)])
+
+    def iter_batches(self):
+        for start in range(0, len(self.names), self.batch_size):
+            yield self.names[start:start + self.batch_size]
+
+    def run(self):
+        self.ids = ids = self.id_class(first_id=1)
+        for batch in self.iter_batches():
+            for name in map(str, batch.tolist()):
+                name in ids
+                ids[name]
+
+class CompactAutoIDLookup(AutoIDLookup):
+    name = 'CompactAutoID'
+    id_class = CompactAutoID
+
+
+class AutoIDGetIds(AutoIDLookup):
+
+    """Assign ids to the unique names of each batch of edges with get_ids(), as PajekFactory.add_edges() does"""
+
+    name = 'AutoID.get_ids'
+
+    def run(self):
+        self.ids = ids = self.id_class(first_id=1)
+        for batch in self.iter_batches():
+            codes, uniques = pd.factorize(batch.astype(str).astype(object))
+            ids.get_ids(uniques)
+
+class CompactAutoIDGetIds(AutoIDGetIds):
+    name = 'CompactAutoID.get_ids'
+    id_class = CompactAutoID
+
+
+class ExtractSubgraph(Benchmark):
+
+    name = 'extract_subgraph_from_pajek'
+    unit = 'edges'
+
+    def prepare(self):
+        self.fname = pajek_file(self.data_dir, self.size)
+
+    def setup(self):
+        self.prepare()
+        # a random tenth of the vertices
+        num_nodes = max(2, self.size // 10)
+        rng = np.random.RandomState(SEED)
+        self.names = set(str(x) for x in rng.choice(num_nodes, size=max(1, num_nodes // 10), replace=False) + 1)
+
+    def run(self):
+        extract_subgraph_from_pajek(self.fname, self.names)
+
+
+class TreefileParse(Benchmark):
+
+    name = 'Treefile.parse'
+    unit = 'nodes'
+
+    def prepare(self):
+        self.fname = treefile_file(self.data_dir, self.size)
+
+    def setup(self):
+        self.prepare()
+
+    def run(self):
+        Treefile(self.fname).parse()
+
+
+class TreefileLoadDf(TreefileParse):
+
+    """load_df() with the 'python' engine: parse into dictionaries, then build the DataFrame"""
+
+    name = 'Treefile.load_df[python]'
+
+    def run(self):
+        Treefile(self.fname, engine='python').load_df()
+
+
+class TreefileGetNodesForCluster(TreefileParse):
+
+    """get_nodes_for_cluster() for a sample of the clusters at depths 1 and 2 (the index is built in setup)"""
+
+    name = 'Treefile.get_nodes_for_cluster'
+    unit = 'queries'
+    num_queries = 1000
+
+    def setup(self):
+        self.prepare()
+        self.treefile = Treefile(self.fname)
+        self.treefile.load_df()
+        self.treefile.build_hierarchy_index()
+        clusters = np.concatenate([self.treefile.get_cluster_stats(depth=depth)['cluster'].to_numpy(dtype=object) for depth in [1, 2]])
+        rng = np.random.RandomState(SEED)
+        self.clusters = rng.choice(clusters, size=self.num_queries).tolist()
+
+    def run(self):
+        for cluster in self.clusters:
+            self.treefile.get_nodes_for_cluster(cluster)
+
+    def num_elements(self):
+        return self.num_queries
+
+
+class ConvertInvertedAbstracts(Benchmark):
+
+    """convert_inverted_abstract_to_abstract_words() for abstracts with size words in total"""
+
+    name = 'convert_inverted_abstract_to_abstract_words'
+    unit = 'words'
+    words_per_abstract = 150
+
+    def setup(self):
+        self.abstracts = generators.generate_inverted_abstracts(max(1, self.size // self.words_per_abstract),
+                                                                words_per_abstract=self.words_per_abstract, seed=SEED)
+
+    def run(self):
+        for inverted_abstract, index_length in self.abstracts:
+            convert_inverted_abstract_to_abstract_words(inverted_abstract, index_length=index_length)
+
+    def num_elements(self):
+        return sum(index_length for _, index_length in self.abstracts)
+
+
+BENCHMARKS = [
+    EdgelistToPajekPython,
+    EdgelistToPajekPandas,
+    PajekFactoryAddEdge,
+    PajekFactoryWrite,
+    AutoIDLookup,
+    CompactAutoIDLookup,
+    AutoIDGetIds,
+    CompactAutoIDGetIds,
+    ExtractSubgraph,
+    TreefileParse,
+    TreefileLoadDf,
+    TreefileGetNodesForCluster,
+    ConvertInvertedAbstracts,
+]
+
+def get_benchmark(name):
+    for cls in BENCHMARKS:
+        if cls.name == name:
+            return cls
+    raise KeyError("unknown benchmark: {}".format(name))
@@ -0,0 +1,135 @@
+import io
+import os
+import re
+
+
+def line_aligned_byte_ranges(fname, num_ranges, start=0, end=None):
+    """Split a file (or part of a file) into byte ranges that start and end on line boundaries
+
+    :fname: filename
+    :num_ranges: number of ranges to split into. Fewer ranges are returned if the lines are too long to split this finely
+    :start: byte offset where the first range starts. Should be the start of a line
+    :end: byte offset where the last range ends. Default: end of the file
+    :returns: list of (start, end) tuples of byte offsets
+
+    """
+    if end is None:
+        end = os.path.getsize(fname)
+    boundaries = [start]
+    with open(fname, 'rb') as f:
+        for i in range(1, num_ranges):
+            pos = start + (end - start) * i // num_ranges
+            if pos <= boundaries[-1]:
+                continue
+            # move forward to the beginning of the next line
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= end:
+                break
+            if pos > boundaries[-1]:
+                boundaries.append(pos)
+    boundaries.append(end)
+    return [(a, b) for a, b in zip(boundaries[:-1], boundaries[1:]) if b > a]
+
+class _ByteRangeRaw(io.RawIOBase):
+    """Raw reader for the bytes in [start, end) of a file. Positions are relative to start"""
+
+    def __init__(self, fname, start, end):
+        self._f = open(fname, 'rb', buffering=0)
+        self._start = start
+        self._end = end
+        self._pos = start
+        self._f.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self._end - self._pos)
+        if n <= 0:
+            return 0
+        n = self._f.readinto(memoryview(b)[:n])
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = self._start + offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        else:
+            pos = self._end + offset
+        pos = max(self._start, pos)
+        self._f.seek(pos)
+        self._pos = pos
+        return pos - self._start
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        io.RawIOBase.close(self)
+
+def open_byte_range(fname, start, end, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """Open the bytes in [start, end) of a file as a binary file object, which ends at end.
+    The range is read as it is consumed, not all at once. tell() and seek() are relative to start
+
+    :returns: buffered binary file object
+
+    """
+    return io.BufferedReader(_ByteRangeRaw(fname, start, end), buffer_size)
+
+class _SkipLinesRaw(io.RawIOBase):
+    """Raw reader for a binary file without the lines that start with a prefix"""
+
+    def __init__(self, f, prefix, block_size=2**20):
+        self._f = f
+        self._prefix = prefix
+        self._pattern = re.compile(b'^' + re.escape(prefix) + b'[^\n]*(?:\n|$)', re.MULTILINE)
+        self._block_size = block_size
+        self._pending = b''
+        self._pending_pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        # read a block of whole lines, and drop the ones that start with the prefix
+        block = self._f.read(self._block_size)
+        if not block:
+            self._eof = True
+            return
+        if not block.endswith(b'\n'):
+            block += self._f.readline()
+        if block.startswith(self._prefix) or b'\n' + self._prefix in block:
+            block = self._pattern.sub(b'', block)
+        self._pending = block
+        self._pending_pos = 0
+
+    def readinto(self, b):
+        while self._pending_pos >= len(self._pending) and not self._eof:
+            self._fill()
+        n = min(len(b), len(self._pending) - self._pending_pos)
+        b[:n] = self._pending[self._pending_pos:self._pending_pos + n]
+        self._pending_pos += n
+        return n
+
+def skip_lines_starting_with(f, prefix, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """Wrap a binary file object so that the lines starting with prefix are left out.
+    Only the start of each line is checked, so the prefix can appear elsewhere in a line.
+    The file is read a block at a time from its current position. Closing the wrapper does not close f
+
+    :prefix: bytes, or str (encoded as UTF-8)
+    :returns: buffered binary file object
+
+    """
+    if not isinstance(prefix, bytes):
+        prefix = prefix.encode('utf-8')
+    return io.BufferedReader(_SkipLinesRaw(f, prefix), buffer_size)
@@ -0,0 +1,44 @@
+"""
+Lazy imports for heavy dependencies.
+
+    np = LazyModule('numpy')
+
+binds a placeholder that imports numpy on the first attribute access (e.g., np.array),
+so importing a module that uses numpy does not import numpy until it is needed.
+"""
+
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+
+    """Module placeholder that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        types.ModuleType.__init__(self, name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        # only called for attributes that are not set on the placeholder itself
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__dict__['_lazy_module'] is None:
+            return "<lazy module '{}' (not loaded)>".format(self.__name__)
+        return repr(self.__dict__['_lazy_module'])
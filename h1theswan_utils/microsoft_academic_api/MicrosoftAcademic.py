@@ -1,6 +1,10 @@
 from .config import MAGConf
-import requests
-from six import string_types, iteritems, itervalues
+from .session import get_session
+from . import cache as _cache
+from ..lazy import LazyModule
+from urllib.parse import quote_plus
+
+requests = LazyModule('requests')
 
 class MAGQueryType(object):
     HISTOGRAM = 0
@@ -35,13 +39,22 @@ class MAGQuery(object):
 
     """Microsoft Academic API Query"""
 
-    def __init__(self):
-        """TODO: to be defined1. """
+    PATH = None
+
+    def __init__(self, session=None, cache=None):
+        """
+        :session: (optional) MAGSession to send the query with. Default: the shared session (see session.get_session())
+        :cache: (optional) ResponseCache for the responses. Default: the shared cache, if one is set (see cache.set_cache()).
+                False to turn off caching for this query
+
+        """
         self.query_type = MAGQueryType.UNKNOWN
 
         self.url = MAGConf.BASE_URL  # will need to modify this later depending on the query type
         self.body = {}
         self.headers = {}
+        self.session = session
+        self.cache = cache
 
         # if isinstance(self.query_type, string_types):
         #     self.query_type = assign_query_type(self.query_type)
@@ -55,42 +68,77 @@ class MAGQuery(object):
         }
 
     def get_url(self):
-        raise NotImplementedError("get_url() is not implemented in base class")
+        # computed at call time, so that MAGConf.BASE_URL can be changed after import
+        if self.PATH is None:
+            raise NotImplementedError("get_url() is not implemented in base class")
+        return MAGConf.BASE_URL + self.PATH
+
+    def get_session(self):
+        return self.session or get_session()
+
+    def get_prepared_url(self):
+        """:returns: the full URL of a GET request for this query, with the percent-encoded parameters"""
+        return requests.Request('GET', self.get_url(), params=self.get_body()).prepare().url
 
     def get_body(self):
         raise NotImplementedError("get_body() is not implemented in base class")
 
-    def post(self, return_json=True):
+    def get_cache(self):
+        if self.cache is False:
+            return None
+        if self.cache is None:
+            return _cache.get_cache()
+        return self.cache
+
+    def _request(self, method, **kwargs):
+        """Send the query and check the status code
+
+        :kwargs: passed to the session (e.g., stream=True)
+        :returns: requests.Response
+
+        """
         url = self.get_url()
-        headers = self.get_headers()
         body = self.get_body()
-        r = requests.post(url, data=body, headers=headers)
-        if r.status_code >= 300:
-            raise QueryPostError("An error occurred during the query. Status code: {}".format(r.status_code))
-        j = r.json()
-        if j.get('aborted'):
-            raise QueryTimeoutError("The query POST request encountered a timeout and aborted")
-        if return_json:
-            return j
+        headers = self.get_headers()
+        if method == 'POST':
+            r = self.get_session().post(url, data=body, headers=headers, **kwargs)
+            if r.status_code >= 300:
+                r.close()
+                raise QueryPostError("An error occurred during the query. Status code: {}".format(r.status_code))
         else:
-            return r
+            r = self.get_session().get(url, params=body, headers=headers, **kwargs)
+            if r.status_code >= 300:
+                r.close()
+                raise QueryGetError("An error occurred during the query. Status code: {}".format(r.status_code))
+        return r
 
-    def get(self, return_json=True):
-        # for Evaluate and Interpret queries, get() can be used as an alternative to post()
+    def _send(self, method, return_json=True):
         url = self.get_url()
-        headers = self.get_headers()
         body = self.get_body()
-        r = requests.get(url, params=body, headers=headers)
-        if r.status_code >= 300:
-            raise QueryGetError("An error occurred during the query. Status code: {}".format(r.status_code))
+        cache = self.get_cache() if return_json else None
+        if cache is not None:
+            key = _cache.make_cache_key(method, url, body)
+            j = cache.get(key)
+            if j is not None:
+                return j
+        r = self._request(method)
         j = r.json()
         if j.get('aborted'):
-            raise QueryTimeoutError("The query GET request encountered a timeout and aborted")
+            raise QueryTimeoutError("The query {} request encountered a timeout and aborted".format(method))
+        if cache is not None:
+            cache.set(key, j)
         if return_json:
             return j
         else:
             return r
 
+    def post(self, return_json=True):
+        return self._send('POST', return_json=return_json)
+
+    def get(self, return_json=True):
+        # for Evaluate and Interpret queries, get() can be used as an alternative to post()
+        return self._send('GET', return_json=return_json)
+
 
     # def assign_query_type(qt):
     #     qt = qt.lower()
@@ -111,14 +159,17 @@ class EvaluateQuery(MAGQuery):
 
     """Docstring for EvaluateQuery. """
 
-    URL = MAGConf.BASE_URL + '/evaluate'
+    PATH = '/evaluate'
+    URL = MAGConf.BASE_URL + PATH
     def __init__(self, expr=None,
                     attributes=None,
                     count=None,
                     offset=None,
-                    model=None):
+                    model=None,
+                    session=None,
+                    cache=None):
         """TODO: to be defined1. """
-        MAGQuery.__init__(self)
+        MAGQuery.__init__(self, session=session, cache=cache)
 
         self.query_type = MAGQueryType.EVALUATE
 
@@ -139,8 +190,41 @@ class EvaluateQuery(MAGQuery):
         expr = "Or({})".format(id_exprs)
         return cls(expr)
 
-    def get_url(self):
-        return self.URL
+    @classmethod
+    def from_id_list_chunked(cls, id_list, max_ids=None, max_url_length=None, attributes=None, model=None):
+        """Construct EvaluateQuery objects for any number of paper ids, splitting them into as few expressions as possible
+
+        Each expression has at most max_ids ids, and the GET request URL for each query (the base URL with all of the
+        percent-encoded parameters) has at most max_url_length characters.
+        Each query's count is the number of ids in it, so one page of results has all of them.
+
+        :id_list: iterable of paper ids (read lazily)
+        :max_ids: maximum number of ids per expression. Default: MAGConf.ID_LIST_LIMITS['max_ids']
+        :max_url_length: maximum length of the request URL. Default: MAGConf.ID_LIST_LIMITS['max_url_length']
+        :returns: generator of EvaluateQuery
+
+        """
+        max_ids = max_ids or MAGConf.ID_LIST_LIMITS['max_ids']
+        max_url_length = max_url_length or MAGConf.ID_LIST_LIMITS['max_url_length']
+        # percent-encoding works character by character, so the length of the URL is the length of the URL
+        # for a one-character expression, minus one, plus the encoded length of the expression.
+        # the count is set to max_ids, which has at least as many digits as the count of any chunk
+        base_length = len(cls('x', count=max_ids, attributes=attributes, model=model).get_prepared_url()) - 1
+        overhead = len(quote_plus("Or(")) + len(quote_plus(")"))
+        sep_length = len(quote_plus(","))
+        id_exprs = []
+        length = base_length + overhead
+        for x in id_list:
+            id_expr = "Id={}".format(x)
+            id_length = len(quote_plus(id_expr))
+            if id_exprs and (len(id_exprs) >= max_ids or length + sep_length + id_length > max_url_length):
+                yield cls("Or({})".format(",".join(id_exprs)), count=len(id_exprs), attributes=attributes, model=model)
+                id_exprs = []
+                length = base_length + overhead
+            length += id_length + (sep_length if id_exprs else 0)
+            id_exprs.append(id_expr)
+        if id_exprs:
+            yield cls("Or({})".format(",".join(id_exprs)), count=len(id_exprs), attributes=attributes, model=model)
 
     def get_body(self):
         if not self.expr:
@@ -155,17 +239,23 @@ class EvaluateQuery(MAGQuery):
         }
         return args
     
+# marks a get_first_expr() result that is not in the memory cache (None is a valid result)
+_NOT_CACHED = object()
+
 class InterpretQuery(MAGQuery):
 
     """Docstring for InterpretQuery. """
 
-    URL = MAGConf.BASE_URL + '/interpret'
+    PATH = '/interpret'
+    URL = MAGConf.BASE_URL + PATH
     def __init__(self, query=None,
             complete=None,
             count=None,
             offset=None,
             timeout=None,
-            model=None):
+            model=None,
+            session=None,
+            cache=None):
         """
 
         :query: TODO
@@ -174,9 +264,11 @@ class InterpretQuery(MAGQuery):
         :offset: TODO
         :timeout: TODO
         :model: TODO
+        :session: (optional) MAGSession to send the query with
+        :cache: (optional) ResponseCache for the responses, or False to turn off caching
 
         """
-        MAGQuery.__init__(self)
+        MAGQuery.__init__(self, session=session, cache=cache)
 
         self.query_type = MAGQueryType.INTERPRET
 
@@ -187,9 +279,6 @@ class InterpretQuery(MAGQuery):
         self.timeout = timeout or MAGConf.INTERPET_QUERY_DEFAULTS['timeout']
         self.model = model or MAGConf.INTERPET_QUERY_DEFAULTS['model']
 
-    def get_url(self):
-        return self.URL
-
     def get_body(self):
         if not self.query:
             raise RuntimeError("the interpret query needs a query")
@@ -211,24 +300,35 @@ class InterpretQuery(MAGQuery):
         """
         if query:
             self.query = query
+        # with a response cache, the expressions are also kept in its memory cache
+        cache = self.get_cache()
+        if cache is not None:
+            key = _cache.make_cache_key('GET', self.get_url(), self.get_body())
+            expr = cache.memory_cache.get(key, _NOT_CACHED)
+            if expr is not _NOT_CACHED:
+                return expr
         # j = self.post()
         # POST method has been giving me trouble. use GET instead
         j = self.get()
         interpretations = j.get('interpretations')
         if not interpretations:
-            return None
-        rules = interpretations[0]['rules']
-        first_result = rules[0]['output']
-        if first_result['type'] != 'query':
-            raise RuntimeError("unexpected---first result is not type: query (type: {})".format(first_result['type']))
-        return first_result.get('value')
+            expr = None
+        else:
+            rules = interpretations[0]['rules']
+            first_result = rules[0]['output']
+            if first_result['type'] != 'query':
+                raise RuntimeError("unexpected---first result is not type: query (type: {})".format(first_result['type']))
+            expr = first_result.get('value')
+        if cache is not None:
+            cache.memory_cache.set(key, expr)
+        return expr
         
 
         
-def get_first_result_from_query(query, attributes=None):
-    expr = InterpretQuery().get_first_expr(query)
+def get_first_result_from_query(query, attributes=None, session=None):
+    expr = InterpretQuery(session=session).get_first_expr(query)
     if expr:
-        q = EvaluateQuery(expr, count=1, attributes=attributes)
+        q = EvaluateQuery(expr, count=1, attributes=attributes, session=session)
         # j = q.post()
         # POST method has been giving me trouble. use GET instead
         j = q.get()
@@ -236,10 +336,10 @@ def get_first_result_from_query(query, attributes=None):
             return j['entities'][0]
     return None
 
-def get_top_results_from_query(query, n=10, attributes=None):
-    expr = InterpretQuery().get_first_expr(query)
+def get_top_results_from_query(query, n=10, attributes=None, session=None):
+    expr = InterpretQuery(session=session).get_first_expr(query)
     if expr:
-        q = EvaluateQuery(expr, count=n, attributes=attributes)
+        q = EvaluateQuery(expr, count=n, attributes=attributes, session=session)
         # j = q.post()
         # POST method has been giving me trouble. use GET instead
         j = q.get()
@@ -258,41 +358,31 @@ def convert_inverted_abstract_to_abstract_words(inverted_abstract, index_length=
     """
     if index_length is None:
         # if the number of words is not provided, find it
-        indices = set()
-        for v in itervalues(inverted_abstract):
-            for idx in v:
-                indices.add(idx)
-        index_length = max(indices) + 1
-
-    # reverse the inverted abstract
-    iabs_rev = {}
-    for k, v in iteritems(inverted_abstract):
+        index_length = max(idx for v in inverted_abstract.values() for idx in v) + 1
+
+    # fill in the words by position. positions outside of the index length are left out,
+    # and if two words have the same position, the last one wins
+    words = [None] * index_length
+    for k, v in inverted_abstract.items():
         for idx in v:
-            iabs_rev[idx] = k
-    # reconstruct the abstract
-    abs_words = []
-    for i in range(index_length):
-        try:
-            abs_words.append(iabs_rev[i])
-        except KeyError:
-            pass
-    return abs_words
+            if 0 <= idx < index_length:
+                words[idx] = k
+    # reconstruct the abstract, skipping positions that have no word
+    return [w for w in words if w is not None]
 
 class GraphSearchQuery(MAGQuery):
 
     """Docstring for GraphSearchQuery. """
 
-    URL = MAGConf.BASE_URL + '/graph/search?json'
-    def __init__(self, json_body=None):
+    PATH = '/graph/search?json'
+    URL = MAGConf.BASE_URL + PATH
+    def __init__(self, json_body=None, session=None, cache=None):
         """TODO: to be defined1. """
-        MAGQuery.__init__(self)
+        MAGQuery.__init__(self, session=session, cache=cache)
         self.json_body = json_body
 
         self.query_type = MAGQueryType.GRAPH_TRAVERSAL
 
-    def get_url(self):
-        return self.URL
-
     def get_body(self):
         if not self.json_body:
             raise RuntimeError("the GraphSearch query needs a json_body")
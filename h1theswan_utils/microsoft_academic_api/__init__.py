@@ -1 +1,7 @@
 from .MicrosoftAcademic import *
+from .session import MAGSession, TokenBucket, get_session, set_session
+from .batch import *
+from .cache import ResponseCache, LRUCache, get_cache, set_cache
+from .crawler import CitationCrawler, CompactIdSet, crawl_citations
+from .abstracts import convert_inverted_abstracts, abstracts_from_jsonl
+from .projection import Projection, ProjectedEvaluateQuery, get_records_for_ids
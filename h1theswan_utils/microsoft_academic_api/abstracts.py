@@ -0,0 +1,122 @@
+"""
+Rebuild paper abstracts from Microsoft Academic inverted abstracts.
+
+The API returns abstracts inverted (the IA attribute): {'IndexLength': <number of words>,
+'InvertedIndex': {word: [positions]}}. convert_inverted_abstracts() rebuilds many of them at once, and
+abstracts_from_jsonl() streams over a JSON Lines dump of entities with a process pool, writing
+one line of text per paper as it goes.
+
+The words are the same as from convert_inverted_abstract_to_abstract_words().
+"""
+
+import json
+import logging
+from itertools import islice, repeat
+
+from ..lazy import LazyModule
+from .MicrosoftAcademic import convert_inverted_abstract_to_abstract_words
+
+multiprocessing = LazyModule('multiprocessing')
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+
+def get_inverted_abstract(entity, ia_key='IA'):
+    """Get the inverted index and the index length from an entity
+
+    :entity: dict (an entity from an Evaluate query), with the inverted abstract under ia_key
+    :returns: (inverted index dict, index length), or (None, None) if the entity has no abstract
+
+    """
+    ia = entity.get(ia_key)
+    if not ia or not ia.get('InvertedIndex'):
+        return None, None
+    return ia['InvertedIndex'], ia.get('IndexLength')
+
+def convert_inverted_abstracts(inverted_abstracts, index_lengths=None):
+    """Rebuild many abstracts (see convert_inverted_abstract_to_abstract_words())
+
+    :inverted_abstracts: iterable of inverted abstracts (dicts of word -> list of positions).
+                         Entries can also be entity IA dicts ({'IndexLength': ..., 'InvertedIndex': ...})
+    :index_lengths: (optional) iterable of the number of words in each abstract (None to find it)
+    :returns: list of lists of words
+
+    """
+    if index_lengths is None:
+        index_lengths = repeat(None)
+    out = []
+    for inverted_abstract, index_length in zip(inverted_abstracts, index_lengths):
+        if isinstance(inverted_abstract.get('InvertedIndex'), dict):
+            if index_length is None:
+                index_length = inverted_abstract.get('IndexLength')
+            inverted_abstract = inverted_abstract['InvertedIndex']
+        out.append(convert_inverted_abstract_to_abstract_words(inverted_abstract, index_length=index_length))
+    return out
+
+def _clean_word(word):
+    # keep one abstract per line and one tab between the fields
+    return ' '.join(word.split())
+
+def _abstract_lines(args):
+    """Rebuild the abstracts for a chunk of JSON lines. Runs in a worker process
+
+    :returns: (text to write, number of abstracts in it)
+
+    """
+    lines, id_key, ia_key, sep = args
+    out = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        entity = json.loads(line)
+        inverted_abstract, index_length = get_inverted_abstract(entity, ia_key=ia_key)
+        if inverted_abstract is None:
+            continue
+        words = convert_inverted_abstract_to_abstract_words(inverted_abstract, index_length=index_length)
+        text = sep.join(_clean_word(w) for w in words)
+        out.append(u"{}\t{}\n".format(entity.get(id_key), text))
+    return u"".join(out), len(out)
+
+def abstracts_from_jsonl(input_fname, output_fname, processes=None, chunksize=10000, id_key='Id', ia_key='IA', sep=' '):
+    """Stream over a JSON Lines file of entities and write their abstracts
+
+    Each line of the output is "<id>\\t<abstract>", in input order. Entities without an abstract are skipped.
+    The input is read in chunks of lines, which are rebuilt in a process pool, so only a few chunks
+    are in memory at a time.
+
+    :input_fname: JSON Lines file: one entity (dict) per line, e.g. from Evaluate queries with attributes 'Id,IA'
+    :output_fname: filename for the output text
+    :processes: number of worker processes. Default: the number of CPUs. With processes=1, no pool is used
+    :chunksize: number of lines sent to a worker at a time
+    :id_key: key of the entity id
+    :ia_key: key of the inverted abstract
+    :sep: string to join the words with
+    :returns: number of abstracts written
+
+    """
+    processes = processes or multiprocessing.cpu_count()
+    num_written = 0
+    with open(input_fname, 'r') as f, open(output_fname, 'w') as outf:
+        chunks = iter(lambda: list(islice(f, chunksize)), [])
+        tasks = ((lines, id_key, ia_key, sep) for lines in chunks)
+        if processes == 1:
+            for text, n in map(_abstract_lines, tasks):
+                outf.write(text)
+                num_written += n
+        else:
+            pool = multiprocessing.Pool(processes=processes)
+            try:
+                while True:
+                    # pool.imap reads its input eagerly, so hand it a few chunks at a time
+                    batch = list(islice(tasks, 2 * processes))
+                    if not batch:
+                        break
+                    for text, n in pool.imap(_abstract_lines, batch):
+                        outf.write(text)
+                        num_written += n
+            finally:
+                pool.close()
+                pool.join()
+    logger.debug("wrote {} abstracts to {}".format(num_written, output_fname))
+    return num_written
@@ -0,0 +1,167 @@
+"""
+Run many Microsoft Academic API queries concurrently.
+
+Queries run in a bounded thread pool, and the results are streamed back in input order
+(or as they finish).
+An exception from one query is captured in its result instead of stopping the batch.
+The request rate is limited by the session (see MAGSession's rate_limit).
+"""
+
+import logging
+from collections import deque, namedtuple
+
+from ..lazy import LazyModule
+from .MicrosoftAcademic import MAGQuery, EvaluateQuery, get_first_result_from_query, get_top_results_from_query
+from .session import MAGSession
+
+futures = LazyModule('concurrent.futures')
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+BatchResult = namedtuple('BatchResult', ['index', 'item', 'result', 'error'])
+BatchResult.__doc__ = """Result for one item of a batch: result is None and error is the exception if the item failed"""
+
+
+def _call(func, item):
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+def run_batch(func, items, max_workers=10, max_pending=None, ordered=True):
+    """Call a function on each item in a thread pool, and yield the results
+
+    Items are read from the iterable lazily, so it can be a generator over millions of items.
+
+    :func: function of one item
+    :items: iterable of items
+    :max_workers: number of threads
+    :max_pending: maximum number of items submitted but not yet yielded. Default: 2 * max_workers
+    :ordered: if True, yield the results in input order. Otherwise, yield them as they finish
+    :returns: generator of BatchResult
+
+    """
+    max_pending = max_pending or 2 * max_workers
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if ordered is True:
+            pending = deque()
+            for i, item in enumerate(items):
+                pending.append((i, item, executor.submit(_call, func, item)))
+                if len(pending) >= max_pending:
+                    i, item, future = pending.popleft()
+                    yield BatchResult(i, item, *future.result())
+            while pending:
+                i, item, future = pending.popleft()
+                yield BatchResult(i, item, *future.result())
+        else:
+            pending = {}
+            items = iter(enumerate(items))
+            while True:
+                for i, item in items:
+                    pending[executor.submit(_call, func, item)] = (i, item)
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                done, not_done = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    i, item = pending.pop(future)
+                    yield BatchResult(i, item, *future.result())
+
+def _get_batch_session(session=None, rate_limit=None, max_workers=10):
+    if session is not None:
+        return session
+    return MAGSession(pool_maxsize=max_workers, rate_limit=rate_limit)
+
+def run_queries(queries, method='get', max_workers=10, rate_limit=None, session=None, max_pending=None, ordered=True):
+    """Run MAGQuery objects concurrently
+
+    Queries that do not have their own session are sent with the batch's session.
+
+    :queries: iterable of MAGQuery objects (e.g., EvaluateQuery)
+    :method: 'get' or 'post'
+    :max_workers: number of threads
+    :rate_limit: maximum number of requests per second. Default: MAGConf.SESSION_DEFAULTS['rate_limit']
+    :session: (optional) MAGSession to use instead of creating one for the batch
+    :ordered: if True, yield the results in input order. Otherwise, yield them as they finish
+    :returns: generator of BatchResult. result is the response JSON
+
+    """
+    if method not in ['get', 'post']:
+        raise ValueError("unknown method: {}. method must be one of 'get', 'post'".format(method))
+    session = _get_batch_session(session, rate_limit=rate_limit, max_workers=max_workers)
+    def run(query):
+        if not isinstance(query, MAGQuery):
+            raise TypeError("expected a MAGQuery, got {}".format(type(query)))
+        if query.session is None:
+            query.session = session
+        return getattr(query, method)()
+    return run_batch(run, queries, max_workers=max_workers, max_pending=max_pending, ordered=ordered)
+
+def get_first_results_from_queries(queries, attributes=None, max_workers=10, rate_limit=None, session=None, max_pending=None):
+    """Concurrent version of get_first_result_from_query()
+
+    :queries: iterable of query strings (e.g., paper titles)
+    :returns: generator of BatchResult, in input order. result is the first entity (dict) or None
+
+    """
+    session = _get_batch_session(session, rate_limit=rate_limit, max_workers=max_workers)
+    def run(query):
+        if not isinstance(query, str):
+            raise TypeError("expected a query string, got {}".format(type(query)))
+        return get_first_result_from_query(query, attributes=attributes, session=session)
+    return run_batch(run, queries, max_workers=max_workers, max_pending=max_pending)
+
+def get_top_results_from_queries(queries, n=10, attributes=None, max_workers=10, rate_limit=None, session=None, max_pending=None):
+    """Concurrent version of get_top_results_from_query()
+
+    :queries: iterable of query strings (e.g., paper titles)
+    :returns: generator of BatchResult, in input order. result is a list of entities (dicts) or None
+
+    """
+    session = _get_batch_session(session, rate_limit=rate_limit, max_workers=max_workers)
+    def run(query):
+        if not isinstance(query, str):
+            raise TypeError("expected a query string, got {}".format(type(query)))
+        return get_top_results_from_query(query, n=n, attributes=attributes, session=session)
+    return run_batch(run, queries, max_workers=max_workers, max_pending=max_pending)
+
+def get_entities_for_ids(ids, attributes=None, max_workers=10, rate_limit=None, session=None, method='get', errors='raise'):
+    """Fetch the entities for any number of paper ids, concurrently
+
+    The ids are deduplicated and split into as few queries as possible (see EvaluateQuery.from_id_list_chunked()),
+    and the entities are yielded as the queries finish (not in input order). Each entity is yielded once.
+
+    :ids: iterable of paper ids (read lazily)
+    :attributes: attributes to request. Should include 'Id' if the entities are to be deduplicated
+    :max_workers: number of threads
+    :rate_limit: maximum number of requests per second
+    :session: (optional) MAGSession to use instead of creating one
+    :method: 'get' or 'post'
+    :errors: 'raise' to raise the error from a failed query, or 'ignore' to log it and skip its ids
+    :returns: generator of entities (dicts)
+
+    """
+    if errors not in ['raise', 'ignore']:
+        raise ValueError("unknown errors: {}. errors must be one of 'raise', 'ignore'".format(errors))
+    seen_ids = set()
+    def iter_new_ids():
+        for x in ids:
+            if x not in seen_ids:
+                seen_ids.add(x)
+                yield x
+    seen_entities = set()
+    queries = EvaluateQuery.from_id_list_chunked(iter_new_ids(), attributes=attributes)
+    for r in run_queries(queries, method=method, max_workers=max_workers, rate_limit=rate_limit, session=session, ordered=False):
+        if r.error is not None:
+            if errors == 'raise':
+                raise r.error
+            logger.warning("query {} failed: {}".format(r.item.expr, r.error))
+            continue
+        for entity in r.result.get('entities', []):
+            entity_id = entity.get('Id')
+            if entity_id is not None:
+                if entity_id in seen_entities:
+                    continue
+                seen_entities.add(entity_id)
+            yield entity
@@ -0,0 +1,212 @@
+"""
+Response cache for Microsoft Academic API queries.
+
+ResponseCache stores response JSON in a SQLite file, keyed on the method, URL, and canonicalized
+parameters of the query (not the subscription key). Entries can expire after a time to live, and the
+least recently used entries are evicted when there are more than max_entries. The database is in WAL mode,
+so several processes (and threads) can use the same file.
+
+LRUCache is a small thread-safe in-memory cache. Each ResponseCache has one on top (memory_cache),
+with the same time to live, for InterpretQuery.get_first_expr().
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from ..lazy import LazyModule
+from .config import MAGConf
+
+sqlite3 = LazyModule('sqlite3')
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+
+def make_cache_key(method, url, params):
+    """Canonical cache key for a query: a hash of the method, URL, and parameters (with sorted keys)
+
+    :params: dictionary of parameters, or a request body (string)
+    :returns: key (string)
+
+    """
+    if not isinstance(params, str):
+        params = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    s = json.dumps([method.upper(), url, params], separators=(',', ':'))
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+
+    """Persistent cache of query responses in a SQLite file"""
+
+    def __init__(self, path, ttl=None, max_entries=None, timeout=30, evict_every=100, memory_size=None):
+        """
+        :path: filename for the SQLite database. Created if it does not exist
+        :ttl: time to live for entries, in seconds. None for no expiry
+        :max_entries: maximum number of entries. The least recently used entries are evicted. None for no limit
+        :timeout: how long to wait for a lock held by another process or thread, in seconds
+        :evict_every: check the number of entries after this many writes
+        :memory_size: number of entries in the in-memory cache (memory_cache). Default: MAGConf.FIRST_EXPR_CACHE_SIZE
+
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._num_writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_cache = LRUCache(maxsize=memory_size or MAGConf.FIRST_EXPR_CACHE_SIZE, ttl=ttl)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        conn.commit()
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads or processes, so each thread gets its own,
+        # and a forked child process opens new ones (the parent's are left alone)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """:returns: the cached value for key, or None if it is not cached (or has expired)"""
+        conn = self._connect()
+        row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            with conn:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Cache a value (anything that can be serialized to JSON)"""
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value), now, now))
+        with self._lock:
+            self._num_writes += 1
+            evict = self.max_entries is not None and self._num_writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete expired entries, and the least recently used entries over max_entries"""
+        conn = self._connect()
+        with conn:
+            if self.ttl is not None:
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_entries is not None:
+                conn.execute("DELETE FROM responses WHERE key IN "
+                            "(SELECT key FROM responses ORDER BY accessed ASC LIMIT max(0, (SELECT count(*) FROM responses) - ?))",
+                            (self.max_entries,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT count(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        """:returns: dictionary of hits and misses (in this process) and the number of entries"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def clear(self):
+        """Delete all entries, and clear the in-memory cache"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+        self.memory_cache.clear()
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+
+
+class LRUCache(object):
+
+    """Thread-safe in-memory least recently used cache"""
+
+    def __init__(self, maxsize=10000, ttl=None):
+        """
+        :maxsize: maximum number of entries
+        :ttl: time to live for entries, in seconds. None for no expiry
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value, created = self.data.pop(key)
+            except KeyError:
+                return default
+            if self._expired(created):
+                return default
+            self.data[key] = (value, created)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = (value, time.time())
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            return item is not None and not self._expired(item[1])
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_default_cache = None
+
+def get_cache():
+    """Get the ResponseCache used by queries that are not given one (None if caching is off)"""
+    return _default_cache
+
+def set_cache(cache):
+    """Set the ResponseCache used by queries that are not given one. None turns caching off"""
+    global _default_cache
+    _default_cache = cache
@@ -1,8 +1,22 @@
 import os
 
+class EnvSetting(object):
+
+    """Class attribute that is read from an environment variable when it is used (not on import)"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        try:
+            return os.environ[self.name]
+        except KeyError:
+            raise RuntimeError("the {} environment variable is not set".format(self.name))
+
 class MAGConf(object):
     BASE_URL = 'https://api.labs.cognitive.microsoft.com/academic/v1.0'
-    SUBSCRIPTION_KEY = os.environ['MICROSOFT_ACADEMIC_KEY']
+    # set MAGConf.SUBSCRIPTION_KEY to use a key that is not in the environment
+    SUBSCRIPTION_KEY = EnvSetting('MICROSOFT_ACADEMIC_KEY')
     EVALUATE_QUERY_DEFAULTS = {
             'attributes': '*',
             'count': 50,
@@ -16,3 +30,21 @@ class MAGConf(object):
             'timeout': 1000,
             'model': 'latest'
     }
+    # default number of InterpretQuery.get_first_expr() results to keep in the memory cache of each ResponseCache
+    FIRST_EXPR_CACHE_SIZE = 100000
+    # limits for the Or(Id=...) expressions built by EvaluateQuery.from_id_list_chunked()
+    # (max_url_length is for the whole encoded GET request URL, under the usual 2048 character limit)
+    ID_LIST_LIMITS = {
+            'max_ids': 100,
+            'max_url_length': 2000
+    }
+    SESSION_DEFAULTS = {
+            'pool_connections': 10,
+            'pool_maxsize': 10,
+            'max_retries': 5,
+            'backoff_factor': 0.5,
+            'backoff_max': 60,
+            'retry_statuses': [429, 500, 502, 503, 504],
+            'timeout': (10, 120),
+            'rate_limit': None  # requests per second
+    }
@@ -0,0 +1,252 @@
+"""
+Breadth-first citation crawler.
+
+Starting from seed papers, the crawler fetches each paper's references (RId) with batched,
+concurrent Evaluate queries, writes the citation edges (paper -> referenced paper) into a PajekFactory
+as it goes, and adds the references it has not seen before to the next level of the crawl.
+
+With a checkpoint directory, the PajekFactory's node and edge streams are files in that directory,
+and the state of the crawl (frontier, visited ids, stream offsets) is saved every checkpoint_every papers,
+so an interrupted crawl can be resumed by running it again with the same checkpoint directory.
+"""
+
+import json
+import logging
+import os
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+from .MicrosoftAcademic import EvaluateQuery
+from .batch import get_entities_for_ids
+from .session import MAGSession
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+class CompactIdSet(object):
+
+    """Set of int64 ids, stored as a sorted NumPy array (8 bytes per id)"""
+
+    def __init__(self, ids=None):
+        self.ids = np.unique(np.asarray(ids, dtype=np.int64)) if ids is not None else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, x):
+        pos = np.searchsorted(self.ids, x)
+        return bool(pos < len(self.ids) and self.ids[pos] == x)
+
+    def add_new(self, ids):
+        """Add ids to the set
+
+        :ids: sequence of ids
+        :returns: sorted array of the ids that were not in the set before
+
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if len(self.ids) and len(ids):
+            pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+            ids = ids[self.ids[pos] != ids]
+        if len(ids):
+            self.ids = np.union1d(self.ids, ids)
+        return ids
+
+
+class CitationCrawler(object):
+
+    """Breadth-first crawler of the citation graph, writing into a PajekFactory"""
+
+    def __init__(self,
+                max_depth=1,
+                max_papers=None,
+                max_workers=10,
+                rate_limit=None,
+                session=None,
+                checkpoint_dir=None,
+                checkpoint_every=10000,
+                seed_count=1000,
+                temp_dir=None):
+        """
+        :max_depth: number of levels of references to follow. With max_depth=1, only the seeds' references are fetched
+        :max_papers: maximum number of papers whose references are fetched. None for no limit
+        :max_workers: number of concurrent requests
+        :rate_limit: maximum number of requests per second
+        :session: (optional) MAGSession to use instead of creating one
+        :checkpoint_dir: (optional) directory for the node and edge streams and the checkpoint. If it has a checkpoint, the crawl resumes from it
+        :checkpoint_every: number of papers to fetch between checkpoints (also the number of ids passed to each batch of queries)
+        :seed_count: maximum number of papers to take from each seed expression
+        :temp_dir: directory for the PajekFactory's temporary files (if there is no checkpoint_dir)
+
+        """
+        self.max_depth = max_depth
+        self.max_papers = max_papers
+        self.max_workers = max_workers
+        self.session = session or MAGSession(pool_maxsize=max_workers, rate_limit=rate_limit)
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.seed_count = seed_count
+        self.temp_dir = temp_dir
+
+        self.pjk = None
+        self.visited = CompactIdSet()
+        self.depth = 0
+        self.frontier = np.zeros(0, dtype=np.int64)
+        self.position = 0
+        self.next_frontier = []
+        self.num_fetched = 0
+        self.done = False
+
+    def _checkpoint_fname(self):
+        return os.path.join(self.checkpoint_dir, 'checkpoint.npz')
+
+    def _open_pajekfactory(self):
+        from ..network_data import PajekFactory
+        if self.checkpoint_dir is None:
+            return PajekFactory(temp_dir=self.temp_dir, compact_ids=True)
+        if not os.path.exists(self.checkpoint_dir):
+            os.makedirs(self.checkpoint_dir)
+        node_stream = open(os.path.join(self.checkpoint_dir, 'nodes.txt'), 'a+')
+        edge_stream = open(os.path.join(self.checkpoint_dir, 'edges.txt'), 'a+')
+        return PajekFactory(node_stream=node_stream, edge_stream=edge_stream, compact_ids=True)
+
+    def save_checkpoint(self):
+        """Save the state of the crawl. The checkpoint file is replaced atomically"""
+        for stream in [self.pjk.node_stream, self.pjk.edge_stream]:
+            stream.flush()
+            stream.seek(0, os.SEEK_END)
+        meta = {
+            'version': CHECKPOINT_VERSION,
+            'depth': self.depth,
+            'position': self.position,
+            'num_fetched': self.num_fetched,
+            'done': self.done,
+            'node_offset': self.pjk.node_stream.tell(),
+            'edge_offset': self.pjk.edge_stream.tell(),
+            'edge_count': self.pjk.edge_count,
+            'num_ids': len(self.pjk.ids),
+        }
+        next_frontier = np.concatenate(self.next_frontier) if self.next_frontier else np.zeros(0, dtype=np.int64)
+        self.next_frontier = [next_frontier]
+        tmp_fname = self._checkpoint_fname() + '.tmp'
+        with open(tmp_fname, 'wb') as outf:
+            np.savez(outf, meta=np.array(json.dumps(meta)), frontier=self.frontier, next_frontier=next_frontier, visited=self.visited.ids)
+        os.replace(tmp_fname, self._checkpoint_fname())
+        logger.debug("saved checkpoint: depth {}, {} of {} in frontier, {} papers fetched".format(self.depth, self.position, len(self.frontier), self.num_fetched))
+
+    def load_checkpoint(self):
+        """Restore the state of the crawl from the checkpoint, and truncate the node and edge streams to the checkpoint"""
+        with np.load(self._checkpoint_fname()) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != CHECKPOINT_VERSION:
+                raise ValueError("unsupported checkpoint version: {}".format(meta.get('version')))
+            self.frontier = data['frontier']
+            self.next_frontier = [data['next_frontier']]
+            self.visited = CompactIdSet()
+            self.visited.ids = data['visited']
+        self.depth = meta['depth']
+        self.position = meta['position']
+        self.num_fetched = meta['num_fetched']
+        self.done = meta['done']
+
+        # lines written after the checkpoint are dropped
+        for stream, offset in [(self.pjk.node_stream, meta['node_offset']), (self.pjk.edge_stream, meta['edge_offset'])]:
+            stream.flush()
+            stream.seek(offset)
+            stream.truncate()
+        # rebuild the name -> id map from the node lines ('<id> "<name>"')
+        self.pjk.node_stream.seek(0)
+        names = [line.rstrip('\n').split(' ', 1)[1][1:-1] for line in self.pjk.node_stream]
+        if len(names) != meta['num_ids']:
+            raise ValueError("the node stream does not match the checkpoint")
+        self.pjk.ids.extend(names)
+        self.pjk.node_stream.seek(0, os.SEEK_END)
+        self.pjk.edge_count = meta['edge_count']
+        logger.debug("resumed from checkpoint: depth {}, {} of {} in frontier, {} papers fetched".format(self.depth, self.position, len(self.frontier), self.num_fetched))
+
+    def resolve_seeds(self, seeds):
+        """Convert seeds (paper ids, or expressions for Evaluate queries) to an array of paper ids"""
+        ids = []
+        for seed in seeds:
+            if isinstance(seed, (int, np.integer)):
+                ids.append(int(seed))
+            else:
+                j = EvaluateQuery(seed, attributes='Id', count=self.seed_count, session=self.session).get()
+                ids.extend(entity['Id'] for entity in j.get('entities', []))
+        return np.array(ids, dtype=np.int64)
+
+    def _fetch(self, ids):
+        """Fetch the references of some papers, write the edges, and add the new references to the next frontier"""
+        entities = sorted(get_entities_for_ids(ids.tolist(), attributes='Id,RId', max_workers=self.max_workers, session=self.session),
+                            key=lambda entity: entity['Id'])
+        sources = []
+        targets = []
+        for entity in entities:
+            refs = entity.get('RId') or []
+            sources.extend([str(entity['Id'])] * len(refs))
+            targets.extend(str(rid) for rid in refs)
+        self.pjk.add_edges(sources, targets)
+        if targets:
+            self.next_frontier.append(self.visited.add_new(np.array(targets, dtype=np.int64)))
+        self.num_fetched += len(ids)
+
+    def crawl(self, seeds=None):
+        """Run the crawl (or resume it, if the checkpoint directory has a checkpoint)
+
+        :seeds: iterable of paper ids (ints) or expressions for Evaluate queries (e.g., "Ti='some title'").
+                Not needed when resuming
+        :returns: PajekFactory with the citation network. Vertex names are paper ids
+
+        """
+        self.pjk = self._open_pajekfactory()
+        if self.checkpoint_dir is not None and os.path.exists(self._checkpoint_fname()):
+            self.load_checkpoint()
+        else:
+            if seeds is None:
+                raise ValueError("seeds are needed to start a crawl")
+            self.frontier = self.visited.add_new(self.resolve_seeds(seeds))
+            self.depth = 0
+            self.position = 0
+            self.next_frontier = []
+
+        while not self.done and self.depth < self.max_depth:
+            while self.position < len(self.frontier):
+                if self.max_papers is not None and self.num_fetched >= self.max_papers:
+                    break
+                end = min(self.position + self.checkpoint_every, len(self.frontier))
+                if self.max_papers is not None:
+                    end = min(end, self.position + self.max_papers - self.num_fetched)
+                self._fetch(self.frontier[self.position:end])
+                self.position = end
+                if self.checkpoint_dir is not None:
+                    self.save_checkpoint()
+            if self.max_papers is not None and self.num_fetched >= self.max_papers:
+                break
+            logger.debug("finished depth {}: {} papers fetched, {} edges".format(self.depth, self.num_fetched, self.pjk.edge_count))
+            self.frontier = np.concatenate(self.next_frontier) if self.next_frontier else np.zeros(0, dtype=np.int64)
+            self.next_frontier = []
+            self.position = 0
+            self.depth += 1
+            if len(self.frontier) == 0:
+                break
+        self.done = True
+        if self.checkpoint_dir is not None:
+            self.save_checkpoint()
+        return self.pjk
+
+
+def crawl_citations(seeds, max_depth=1, max_papers=None, **kwargs):
+    """Crawl the citation graph breadth-first from some seed papers (see CitationCrawler)
+
+    :seeds: iterable of paper ids (ints) or expressions for Evaluate queries
+    :max_depth: number of levels of references to follow
+    :max_papers: maximum number of papers whose references are fetched
+    :kwargs: other options for CitationCrawler (e.g., checkpoint_dir, max_workers, rate_limit)
+    :returns: PajekFactory with the citation network
+
+    """
+    return CitationCrawler(max_depth=max_depth, max_papers=max_papers, **kwargs).crawl(seeds)
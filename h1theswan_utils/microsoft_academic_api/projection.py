@@ -0,0 +1,235 @@
+"""
+Attribute projection for Evaluate queries.
+
+A Projection is the list of attributes a caller needs (e.g., ['Id', 'Ti', 'Y', 'AA.AuN']).
+These are the attributes requested from the API, so the responses only carry those fields.
+The entities are decoded into compact records (objects with __slots__, one slot per field)
+or into columns (NumPy arrays), instead of being held as nested dicts.
+
+ProjectedEvaluateQuery sends an Evaluate query for a projection. If ijson is installed, the entities of
+a page can be parsed incrementally from the response stream, so a very large page is never held in memory as a whole.
+"""
+
+import logging
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+from .MicrosoftAcademic import EvaluateQuery, QueryTimeoutError
+from .batch import get_entities_for_ids
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+# attributes decoded into int64 and float64 columns (the others are object columns)
+INT_ATTRIBUTES = set(['Id', 'Y', 'CC', 'ECC', 'J.JId', 'C.CId'])
+FLOAT_ATTRIBUTES = set(['logprob', 'prob'])
+
+
+class EntityRecord(object):
+
+    """Base class for the records of a Projection. Subclasses have one slot per field"""
+
+    __slots__ = ()
+    fields = ()
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    def __iter__(self):
+        for slot in self.__slots__:
+            yield getattr(self, slot)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join("{}={!r}".format(slot, value) for slot, value in zip(self.__slots__, self)))
+
+    def as_dict(self):
+        return dict(zip(self.fields, self))
+
+
+def field_to_slot(field):
+    """Name of the record slot for a field (e.g., 'AA.AuN' -> 'AA_AuN')"""
+    return field.replace('.', '_')
+
+def make_record_class(fields, name='Record'):
+    """Create an EntityRecord subclass with a slot for each field"""
+    fields = tuple(fields)
+    return type(str(name), (EntityRecord,), {'__slots__': tuple(field_to_slot(f) for f in fields), 'fields': fields})
+
+def get_field(entity, field):
+    """Get a field from an entity. A composite field (e.g., 'AA.AuN') gives a list, with one value per item
+
+    :returns: the value, or None if the entity does not have it
+
+    """
+    if '.' not in field:
+        return entity.get(field)
+    name, sub = field.split('.', 1)
+    items = entity.get(name)
+    if items is None:
+        return None
+    if isinstance(items, dict):
+        # single-valued composite attributes (e.g., J.JN) are objects, not lists
+        return items.get(sub)
+    return [item.get(sub) for item in items]
+
+
+class Projection(object):
+
+    """Fields to request from the API and decode from the entities"""
+
+    def __init__(self, fields, name='Record'):
+        """
+        :fields: list of attribute names (e.g., ['Id', 'Ti', 'Y', 'AA.AuN']), or a comma-separated string
+        :name: name of the record class
+
+        """
+        if not isinstance(fields, (list, tuple)):
+            fields = [f.strip() for f in fields.split(',')]
+        if not fields:
+            raise ValueError("a projection needs at least one field")
+        self.fields = tuple(fields)
+        self.record_class = make_record_class(self.fields, name=name)
+
+    @property
+    def attributes(self):
+        """The attributes parameter for Evaluate queries"""
+        return ','.join(self.fields)
+
+    def record(self, entity):
+        """Decode one entity (dict) into a record"""
+        return self.record_class(*[get_field(entity, f) for f in self.fields])
+
+    def records(self, entities):
+        """:returns: list of records"""
+        return [self.record(entity) for entity in entities]
+
+    def columns(self, entities, missing_int=-1):
+        """Decode entities into columns
+
+        :entities: iterable of entities (dicts)
+        :missing_int: value for missing values in int columns (missing floats are NaN, other missing values are None)
+        :returns: dictionary of record slot name -> NumPy array
+
+        """
+        values = [[] for _ in self.fields]
+        for entity in entities:
+            for i, f in enumerate(self.fields):
+                values[i].append(get_field(entity, f))
+        out = {}
+        for f, column in zip(self.fields, values):
+            slot = field_to_slot(f)
+            if f in INT_ATTRIBUTES:
+                out[slot] = np.array([missing_int if x is None else x for x in column], dtype=np.int64)
+            elif f in FLOAT_ATTRIBUTES:
+                out[slot] = np.array([np.nan if x is None else x for x in column], dtype=np.float64)
+            else:
+                arr = np.empty(len(column), dtype=object)
+                arr[:] = column
+                out[slot] = arr
+        return out
+
+
+def _parse_json_events(stream):
+    try:
+        return ijson.parse(stream, use_float=True)
+    except TypeError:
+        # older ijson: floats are Decimals
+        return ijson.parse(stream)
+
+def _check_aborted(events):
+    for prefix, event, value in events:
+        if prefix == 'aborted' and value:
+            raise QueryTimeoutError("The query request encountered a timeout and aborted")
+        yield prefix, event, value
+
+def iter_response_entities(stream):
+    """Parse the entities of an Evaluate response incrementally (needs ijson)
+
+    :stream: file-like object with the response JSON (bytes)
+    :returns: generator of entities (dicts)
+
+    """
+    return ijson.items(_check_aborted(_parse_json_events(stream)), 'entities.item')
+
+
+class ProjectedEvaluateQuery(EvaluateQuery):
+
+    """Evaluate query for the fields of a Projection, with the entities decoded into records or columns"""
+
+    def __init__(self, expr=None,
+                    projection=None,
+                    count=None,
+                    offset=None,
+                    model=None,
+                    session=None,
+                    cache=None,
+                    stream=None):
+        """
+        :expr: query expression
+        :projection: Projection, or a list of fields
+        :stream: parse the response incrementally (needs ijson). Default: if ijson is installed and no response cache is used.
+                 Responses that are parsed incrementally are not cached
+
+        """
+        if projection is None:
+            raise ValueError("a ProjectedEvaluateQuery needs a projection")
+        self.projection = projection if isinstance(projection, Projection) else Projection(projection)
+        EvaluateQuery.__init__(self, expr, attributes=self.projection.attributes, count=count, offset=offset, model=model,
+                                    session=session, cache=cache)
+        if stream and ijson is None:
+            raise ImportError("streaming responses needs ijson")
+        self.stream = stream
+
+    def use_stream(self):
+        if self.stream is None:
+            return ijson is not None and self.get_cache() is None
+        return self.stream
+
+    def iter_entities(self, method='GET'):
+        """Send the query and yield the entities (dicts)"""
+        if not self.use_stream():
+            for entity in self._send(method).get('entities', []):
+                yield entity
+            return
+        r = self._request(method, stream=True)
+        try:
+            r.raw.decode_content = True
+            for entity in iter_response_entities(r.raw):
+                yield entity
+        finally:
+            r.close()
+
+    def get_records(self, method='GET'):
+        """:returns: list of records"""
+        return self.projection.records(self.iter_entities(method))
+
+    def get_columns(self, method='GET', missing_int=-1):
+        """:returns: dictionary of record slot name -> NumPy array (see Projection.columns())"""
+        return self.projection.columns(self.iter_entities(method), missing_int=missing_int)
+
+
+def get_records_for_ids(ids, fields, **kwargs):
+    """Fetch the records for any number of paper ids, concurrently (see get_entities_for_ids())
+
+    :ids: iterable of paper ids
+    :fields: Projection, or a list of fields. Should include 'Id'
+    :kwargs: other options for get_entities_for_ids() (e.g., max_workers, rate_limit, session)
+    :returns: generator of records (not in input order)
+
+    """
+    projection = fields if isinstance(fields, Projection) else Projection(fields)
+    for entity in get_entities_for_ids(ids, attributes=projection.attributes, **kwargs):
+        yield projection.record(entity)
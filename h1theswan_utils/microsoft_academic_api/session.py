@@ -0,0 +1,185 @@
+"""
+Shared HTTP session for Microsoft Academic API queries.
+
+A MAGSession keeps a pool of keep-alive connections (a requests.Session), and retries requests
+that fail with a connection error, a timeout, or a retryable status code (429 and 5xx by default),
+with exponential backoff and jitter. If the response has a Retry-After header, it is honored.
+Requests can be rate limited with a TokenBucket.
+"""
+
+import logging
+import random
+import threading
+import time
+from timeit import default_timer as timer
+
+from ..lazy import LazyModule
+from .config import MAGConf
+
+requests = LazyModule('requests')
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header: either a number of seconds, or an HTTP date
+
+    :returns: number of seconds to wait (float), or None if the header is missing or invalid
+
+    """
+    if not value:
+        return None
+    from email.utils import parsedate_tz, mktime_tz
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+
+    """Thread-safe token bucket rate limiter
+
+    Tokens are added at a constant rate, up to the capacity. Each request takes one token,
+    and waits if there are none left. The capacity is the largest burst of requests allowed.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :rate: tokens per second (e.g., the number of requests per second allowed by the subscription)
+        :capacity: maximum number of tokens. Default: max(1, rate)
+
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.last = timer()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take tokens from the bucket, waiting until they are available"""
+        while True:
+            with self.lock:
+                now = timer()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class MAGSession(object):
+
+    """Pooled HTTP session with retries, backoff, and timeouts"""
+
+    def __init__(self,
+                pool_connections=None,
+                pool_maxsize=None,
+                max_retries=None,
+                backoff_factor=None,
+                backoff_max=None,
+                retry_statuses=None,
+                timeout=None,
+                rate_limit=None):
+        """Any option that is not given is taken from MAGConf.SESSION_DEFAULTS
+
+        :pool_connections: number of connection pools (hosts) to cache
+        :pool_maxsize: maximum number of connections to keep alive per host
+        :max_retries: number of times to retry a failed request
+        :backoff_factor: the delay before retry number i (starting from 0) is random between 0 and backoff_factor * 2**i seconds
+        :backoff_max: maximum delay between retries, in seconds
+        :retry_statuses: HTTP status codes to retry
+        :timeout: timeout for each request, in seconds: a number, or a (connect timeout, read timeout) tuple
+        :rate_limit: maximum number of requests per second (including retries), or a TokenBucket to share between sessions.
+                     None for no limit
+
+        """
+        defaults = MAGConf.SESSION_DEFAULTS
+        self.pool_connections = pool_connections if pool_connections is not None else defaults['pool_connections']
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else defaults['pool_maxsize']
+        self.max_retries = max_retries if max_retries is not None else defaults['max_retries']
+        self.backoff_factor = backoff_factor if backoff_factor is not None else defaults['backoff_factor']
+        self.backoff_max = backoff_max if backoff_max is not None else defaults['backoff_max']
+        self.retry_statuses = set(retry_statuses if retry_statuses is not None else defaults['retry_statuses'])
+        self.timeout = timeout if timeout is not None else defaults['timeout']
+        rate_limit = rate_limit if rate_limit is not None else defaults['rate_limit']
+        if rate_limit is None or isinstance(rate_limit, TokenBucket):
+            self.rate_limiter = rate_limit
+        else:
+            self.rate_limiter = TokenBucket(rate_limit)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_backoff(self, attempt, response=None):
+        """Delay (in seconds) before retrying after a failed attempt (numbered from 0)"""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying on connection errors, timeouts, and retryable status codes
+
+        :method: HTTP method, e.g. 'GET' or 'POST'
+        :url: URL
+        :kwargs: passed to requests.Session.request() (e.g., params, data, headers)
+        :returns: requests.Response. After the last retry, a response with a retryable status code is returned as is
+
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.get_backoff(attempt)
+                logger.debug("{} {} failed ({}). retrying in {:.2f} seconds".format(method, url, e, delay))
+            else:
+                if r.status_code not in self.retry_statuses or attempt >= self.max_retries:
+                    return r
+                delay = self.get_backoff(attempt, response=r)
+                logger.debug("{} {} returned status code {}. retrying in {:.2f} seconds".format(method, url, r.status_code, delay))
+                r.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def get_session():
+    """Get the shared MAGSession used by queries that are not given one (created on first use)"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = MAGSession()
+        return _default_session
+
+def set_session(session):
+    """Replace the shared MAGSession (e.g., to change the pool size or retry settings)"""
+    global _default_session
+    with _default_session_lock:
+        _default_session = session
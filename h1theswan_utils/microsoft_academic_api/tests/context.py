@@ -2,6 +2,9 @@
 
 import sys
 import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 
-import microsoft_academic_api
+# queries send the subscription key from the environment. the tests only query a local server
+os.environ.setdefault('MICROSOFT_ACADEMIC_KEY', 'test-key')
+
+from h1theswan_utils import microsoft_academic_api
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP server that stands in for the Microsoft Academic API in tests"""
+
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockMAGServer(object):
+
+    """Serve responses from a function, and record the requests
+
+    The function is called as respond(method, path, params) with the query (or form) parameters
+    as a dict of strings, and returns (status, body) or (status, body, headers). The body is sent as JSON.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.client_ports = set()
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def handle_request(self, method):
+                parsed = urlparse(self.path)
+                params = parse_qs(parsed.query)
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    params.update(parse_qs(self.rfile.read(length).decode('utf-8')))
+                params = {k: v[0] for k, v in params.items()}
+                with server.lock:
+                    server.requests.append((method, parsed.path, params))
+                    server.client_ports.add(self.client_address[1])
+                result = server.respond(method, parsed.path, params)
+                status, body = result[:2]
+                headers = result[2] if len(result) > 2 else {}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_request('GET')
+
+            def do_POST(self):
+                self.handle_request('POST')
+
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
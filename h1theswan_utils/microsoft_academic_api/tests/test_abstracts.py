@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+
+import io
+import json
+import os
+import random
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from h1theswan_utils.microsoft_academic_api import convert_inverted_abstract_to_abstract_words, convert_inverted_abstracts, abstracts_from_jsonl
+
+
+def reference_convert(inverted_abstract, index_length=None):
+    """The original implementation: a reverse dict and a walk over every position"""
+    if index_length is None:
+        iabs_indices = set()
+        for v in inverted_abstract.values():
+            iabs_indices.update(v)
+        index_length = max(iabs_indices) + 1
+    iabs_rev = {}
+    for k, v in inverted_abstract.items():
+        for idx in v:
+            iabs_rev[idx] = k
+    abstract_words = []
+    for i in range(index_length):
+        try:
+            abstract_words.append(iabs_rev[i])
+        except KeyError:
+            pass
+    return abstract_words
+
+
+def random_inverted_abstract(rng):
+    n = rng.randint(1, 60)
+    words = ['w{}'.format(rng.randint(0, 20)) for _ in range(n)]
+    inverted = {}
+    for i, w in enumerate(words):
+        if rng.random() < 0.1:
+            continue  # a missing position
+        inverted.setdefault(w, []).append(i)
+    if not inverted:
+        inverted['w0'] = [0]
+    return inverted, n
+
+
+class AbstractsTestSuite(unittest.TestCase):
+    """Inverted abstract test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_same_as_reference(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            inverted, n = random_inverted_abstract(rng)
+            for index_length in [None, n, n // 2, n + 5]:
+                self.assertEqual(convert_inverted_abstract_to_abstract_words(inverted, index_length=index_length),
+                                    reference_convert(inverted, index_length=index_length))
+        # two words at the same position: the last one wins
+        self.assertEqual(convert_inverted_abstract_to_abstract_words({'a': [0, 1], 'b': [1]}), ['a', 'b'])
+
+    def test_batch(self):
+        rng = random.Random(1)
+        cases = [random_inverted_abstract(rng) for _ in range(50)]
+        expected = [reference_convert(inverted, n) for inverted, n in cases]
+        self.assertEqual(convert_inverted_abstracts([inverted for inverted, n in cases], [n for inverted, n in cases]), expected)
+        ias = [{'IndexLength': n, 'InvertedIndex': inverted} for inverted, n in cases]
+        self.assertEqual(convert_inverted_abstracts(ias), expected)
+
+    def test_jsonl(self):
+        rng = random.Random(2)
+        input_fname = os.path.join(self.tempdir, 'entities.jsonl')
+        expected = []
+        with io.open(input_fname, 'w') as outf:
+            for i in range(250):
+                entity = {'Id': i}
+                if i % 7 != 0:
+                    inverted, n = random_inverted_abstract(rng)
+                    entity['IA'] = {'IndexLength': n, 'InvertedIndex': inverted}
+                    expected.append(u"{}\t{}".format(i, ' '.join(reference_convert(inverted, n))))
+                outf.write(json.dumps(entity) + u'\n')
+        for processes in [1, 2]:
+            output_fname = os.path.join(self.tempdir, 'abstracts{}.txt'.format(processes))
+            num_written = abstracts_from_jsonl(input_fname, output_fname, processes=processes, chunksize=16)
+            self.assertEqual(num_written, len(expected))
+            with io.open(output_fname) as f:
+                self.assertEqual(f.read().splitlines(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
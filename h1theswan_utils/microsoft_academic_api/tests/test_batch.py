@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+from .mock_server import MockMAGServer
+
+import time
+import unittest
+
+from h1theswan_utils.microsoft_academic_api import (EvaluateQuery, MAGSession, QueryGetError, TokenBucket,
+                                                    run_batch, run_queries, get_first_results_from_queries, get_entities_for_ids)
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+
+
+def respond(method, path, params):
+    """Interpret a title as Id=<title>, and evaluate Id=<n> to one entity. Title 'missing' has no interpretation"""
+    if path == '/interpret':
+        if params['query'] == 'missing':
+            return 200, {'interpretations': []}
+        return 200, {'interpretations': [{'rules': [{'output': {'type': 'query', 'value': 'Id={}'.format(params['query'])}}]}]}
+    paper_id = int(params['expr'].split('=')[1])
+    if paper_id < 0:
+        return 400, {}
+    # later ids come back sooner, so results finish out of order
+    time.sleep(0.01 * (5 - paper_id % 5))
+    return 200, {'entities': [{'Id': paper_id}]}
+
+
+class BatchTestSuite(unittest.TestCase):
+    """Concurrent batch query test cases."""
+
+    def setUp(self):
+        self.base_url = MAGConf.BASE_URL
+        self.session = MAGSession(backoff_factor=0.01)
+
+    def tearDown(self):
+        MAGConf.BASE_URL = self.base_url
+        self.session.close()
+
+    def test_run_batch_keeps_order(self):
+        results = list(run_batch(lambda x: 10 // x, [5, 2, 0, 1], max_workers=3, max_pending=2))
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual([r.result for r in results], [2, 5, None, 10])
+        self.assertIsInstance(results[2].error, ZeroDivisionError)
+
+    def test_run_queries(self):
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            queries = [EvaluateQuery('Id={}'.format(i)) for i in [1, 2, 3, -1, 4, 5, 6]]
+            results = list(run_queries(queries, max_workers=4, session=self.session))
+        self.assertEqual([r.item for r in results], queries)
+        self.assertEqual([r.result['entities'][0]['Id'] for r in results if r.error is None], [1, 2, 3, 4, 5, 6])
+        self.assertIsInstance(results[3].error, QueryGetError)
+
+    def test_get_first_results_from_queries(self):
+        titles = ['{}'.format(i) for i in range(20)] + ['missing']
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            results = list(get_first_results_from_queries(titles, max_workers=5, session=self.session))
+        self.assertEqual([r.result['Id'] for r in results[:-1]], list(range(20)))
+        self.assertEqual((results[-1].result, results[-1].error), (None, None))
+        self.assertEqual(len(server.requests), 41)
+
+    def test_run_batch_unordered(self):
+        results = list(run_batch(lambda x: time.sleep(x) or x, [0.05, 0.0, 0.02], max_workers=3, ordered=False))
+        self.assertEqual([r.result for r in results], [0.0, 0.02, 0.05])
+        self.assertEqual([r.index for r in results], [1, 2, 0])
+
+    def test_from_id_list_chunked(self):
+        queries = list(EvaluateQuery.from_id_list_chunked(range(250)))
+        self.assertEqual([q.count for q in queries], [100, 100, 50])
+        self.assertEqual(queries[0].expr, "Or({})".format(",".join("Id={}".format(i) for i in range(100))))
+        max_url_length = len(EvaluateQuery("Or(Id=123456789,Id=123456789)", count=10).get_prepared_url())
+        queries = list(EvaluateQuery.from_id_list_chunked([123456789] * 10, max_ids=10, max_url_length=max_url_length))
+        self.assertEqual([q.count for q in queries], [2] * 5)
+        self.assertEqual(list(EvaluateQuery.from_id_list_chunked([])), [])
+
+    def test_from_id_list_chunked_url_length(self):
+        attributes = ','.join(['Id', 'Ti', 'Y', 'D', 'CC', 'ECC', 'AA.AuN', 'AA.AuId', 'AA.AfN', 'AA.AfId', 'AA.S',
+                                'F.FN', 'F.FId', 'J.JN', 'J.JId', 'C.CN', 'C.CId', 'RId', 'W', 'E', 'IA', 'DOI', 'VFN'])
+        ids = [2000000000 + i * 7919 for i in range(1000)]
+        for max_url_length in [2048, 1000]:
+            queries = list(EvaluateQuery.from_id_list_chunked(ids, attributes=attributes, max_url_length=max_url_length))
+            self.assertEqual(sum(q.count for q in queries), len(ids))
+            lengths = [len(q.get_prepared_url()) for q in queries]
+            self.assertLessEqual(max(lengths), max_url_length)
+            # the chunks are full: another id would not fit
+            self.assertGreater(lengths[0] + len("%2CId%3D2000000000"), max_url_length)
+
+    def test_get_entities_for_ids(self):
+        def respond_or(method, path, params):
+            ids = [int(x[3:]) for x in params['expr'][3:-1].split(',')]
+            # id 7 is also returned for every query, to check the deduplication
+            return 200, {'entities': [{'Id': i} for i in ids if i % 10 != 0] + [{'Id': 7}]}
+        ids = list(range(1, 1001)) + list(range(1, 500))
+        with MockMAGServer(respond_or) as server:
+            MAGConf.BASE_URL = server.url
+            entities = list(get_entities_for_ids(ids, max_workers=4, session=self.session))
+        self.assertEqual(len(server.requests), 10)
+        self.assertEqual([params['count'] for method, path, params in server.requests], ['100'] * 10)
+        self.assertEqual(sorted(e['Id'] for e in entities), [i for i in range(1, 1001) if i % 10 != 0])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.time()
+        for i in range(6):
+            bucket.acquire()
+        # the first token is there already; the other 5 take 1/50 s each
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
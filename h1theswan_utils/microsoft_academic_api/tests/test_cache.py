@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+from .mock_server import MockMAGServer
+
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import unittest
+from multiprocessing import Process
+from tempfile import mkdtemp
+
+from h1theswan_utils.microsoft_academic_api import EvaluateQuery, InterpretQuery, MAGSession, ResponseCache, set_cache
+from h1theswan_utils.microsoft_academic_api.cache import LRUCache, make_cache_key
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+
+
+def _write_entries(path, prefix, n):
+    cache = ResponseCache(path)
+    for i in range(n):
+        cache.set('{}{}'.format(prefix, i), {'i': i})
+
+def _write_entries_after_fork(cache, prefix, n):
+    inherited = cache._local.conn
+    for i in range(n):
+        cache.set('{}{}'.format(prefix, i), {'i': i})
+    # the connection inherited from the parent process must not be used
+    sys.exit(1 if cache._local.conn is inherited else 0)
+
+
+class ResponseCacheTestSuite(unittest.TestCase):
+    """Response cache test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.path = os.path.join(self.tempdir, 'cache.sqlite')
+        self.base_url = MAGConf.BASE_URL
+        self.session = MAGSession(backoff_factor=0.01)
+
+    def tearDown(self):
+        MAGConf.BASE_URL = self.base_url
+        set_cache(None)
+        self.session.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_make_cache_key(self):
+        key = make_cache_key('get', 'http://x/evaluate', {'expr': 'Id=1', 'count': 1})
+        self.assertEqual(key, make_cache_key('GET', 'http://x/evaluate', {'count': 1, 'expr': 'Id=1'}))
+        self.assertNotEqual(key, make_cache_key('POST', 'http://x/evaluate', {'count': 1, 'expr': 'Id=1'}))
+        self.assertNotEqual(key, make_cache_key('GET', 'http://x/evaluate', {'count': 2, 'expr': 'Id=1'}))
+
+    def test_ttl_and_eviction(self):
+        cache = ResponseCache(self.path, ttl=0.2)
+        cache.set('a', {'x': [1, 2]})
+        self.assertEqual(cache.get('a'), {'x': [1, 2]})
+        self.assertEqual(cache.get('b'), None)
+        time.sleep(0.3)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'entries': 0})
+
+        cache = ResponseCache(self.path, max_entries=3, evict_every=1)
+        for key in ['a', 'b', 'c']:
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')  # now b is the least recently used
+        cache.set('d', 'd')
+        self.assertEqual([cache.get(key) for key in ['a', 'b', 'c', 'd']], ['a', None, 'c', 'd'])
+
+    def test_memory_cache_ttl(self):
+        memory = LRUCache(maxsize=2, ttl=0.2)
+        memory.set('a', None)
+        memory.set('b', 'b')
+        self.assertIn('a', memory)
+        self.assertEqual(memory.get('a', 'missing'), None)
+        memory.set('c', 'c')  # a was used more recently than b
+        self.assertEqual([memory.get(key) for key in ['a', 'b', 'c']], [None, None, 'c'])
+        time.sleep(0.3)
+        self.assertNotIn('c', memory)
+        self.assertEqual(memory.get('c', 'missing'), 'missing')
+        self.assertEqual(ResponseCache(self.path, ttl=5).memory_cache.ttl, 5)
+
+    def test_multiple_processes(self):
+        ResponseCache(self.path)
+        processes = [Process(target=_write_entries, args=(self.path, prefix, 50)) for prefix in ['x', 'y', 'z']]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        self.assertEqual([p.exitcode for p in processes], [0, 0, 0])
+        cache = ResponseCache(self.path)
+        self.assertEqual(len(cache), 150)
+        self.assertEqual(cache.get('y49'), {'i': 49})
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "needs the fork start method")
+    def test_forked_process(self):
+        cache = ResponseCache(self.path)
+        conn = cache._connect()
+        p = multiprocessing.get_context('fork').Process(target=_write_entries_after_fork, args=(cache, 'f', 20))
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertIs(cache._connect(), conn)
+        self.assertEqual(cache.get('f19'), {'i': 19})
+
+    def test_query_cache(self):
+        def respond(method, path, params):
+            if path == '/interpret':
+                return 200, {'interpretations': [{'rules': [{'output': {'type': 'query', 'value': "Ti='{}'".format(params['query'])}}]}]}
+            return 200, {'entities': [{'Id': 1}]}
+        cache = ResponseCache(self.path)
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            for i in range(3):
+                self.assertEqual(EvaluateQuery('Id=1', cache=cache, session=self.session).get(), {'entities': [{'Id': 1}]})
+            self.assertEqual(len(server.requests), 1)
+            EvaluateQuery('Id=1', cache=False, session=self.session).get()
+            self.assertEqual(len(server.requests), 2)
+
+            set_cache(cache)
+            self.assertEqual(InterpretQuery(session=self.session).get_first_expr('a title'), "Ti='a title'")
+            self.assertEqual(len(server.requests), 3)
+            # the expression is also kept in memory
+            self.assertEqual(InterpretQuery(session=self.session).get_first_expr('a title'), "Ti='a title'")
+            self.assertEqual(len(server.requests), 3)
+            # and clear() clears it too
+            cache.clear()
+            self.assertEqual(InterpretQuery(session=self.session).get_first_expr('a title'), "Ti='a title'")
+            self.assertEqual(len(server.requests), 4)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
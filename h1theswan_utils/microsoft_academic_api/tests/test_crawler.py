@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+from .mock_server import MockMAGServer
+
+import os
+import shutil
+import unittest
+from io import StringIO
+from tempfile import mkdtemp
+
+from h1theswan_utils.microsoft_academic_api import CitationCrawler, CompactIdSet, MAGSession, QueryGetError, crawl_citations
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+
+
+def citation_graph(method, path, params):
+    """Paper i cites papers 2i and 2i+1, up to paper 100. Title 'seed' is paper 1"""
+    if params['expr'] == "Ti='seed'":
+        return 200, {'entities': [{'Id': 1}]}
+    ids = [int(x[3:]) for x in params['expr'][3:-1].split(',')]
+    return 200, {'entities': [{'Id': i, 'RId': [r for r in (2 * i, 2 * i + 1) if r <= 100]} for i in ids]}
+
+
+def get_edges(pjk):
+    outf = StringIO()
+    pjk.write(outf)
+    lines = outf.getvalue().splitlines()
+    names = {}
+    edges = []
+    for line in lines:
+        if line.startswith('*'):
+            continue
+        items = line.split(' ')
+        if items[1].startswith('"'):
+            names[items[0]] = int(items[1].strip('"'))
+        else:
+            edges.append((names[items[0]], names[items[1]]))
+    return sorted(edges)
+
+
+class CitationCrawlerTestSuite(unittest.TestCase):
+    """Citation crawler test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.base_url = MAGConf.BASE_URL
+        self.session = MAGSession(backoff_factor=0.01, max_retries=0)
+
+    def tearDown(self):
+        MAGConf.BASE_URL = self.base_url
+        self.session.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_compact_id_set(self):
+        ids = CompactIdSet([5, 3])
+        self.assertEqual(ids.add_new([3, 9, 1, 9]).tolist(), [1, 9])
+        self.assertEqual(ids.ids.tolist(), [1, 3, 5, 9])
+        self.assertIn(5, ids)
+        self.assertNotIn(4, ids)
+
+    def test_crawl(self):
+        with MockMAGServer(citation_graph) as server:
+            MAGConf.BASE_URL = server.url
+            pjk = crawl_citations(["Ti='seed'"], max_depth=3, session=self.session)
+        expected = [(i, j) for i in range(1, 8) for j in (2 * i, 2 * i + 1)]
+        self.assertEqual(get_edges(pjk), expected)
+
+        with MockMAGServer(citation_graph) as server:
+            MAGConf.BASE_URL = server.url
+            pjk = crawl_citations([1], max_depth=10, max_papers=5, session=self.session)
+        self.assertEqual(get_edges(pjk), [(i, j) for i in range(1, 6) for j in (2 * i, 2 * i + 1)])
+
+    def test_resume(self):
+        expected = [(i, j) for i in range(1, 51) for j in (2 * i, 2 * i + 1) if j <= 100]
+        checkpoint_dir = os.path.join(self.tempdir, 'crawl')
+        num_requests = []
+        def flaky(method, path, params):
+            num_requests.append(1)
+            if len(num_requests) > 6:
+                return 400, {}
+            return citation_graph(method, path, params)
+        with MockMAGServer(flaky) as server:
+            MAGConf.BASE_URL = server.url
+            crawler = CitationCrawler(max_depth=10, checkpoint_dir=checkpoint_dir, checkpoint_every=4, session=self.session, max_workers=1)
+            with self.assertRaises(QueryGetError):
+                crawler.crawl([1])
+            # edges from the batch that failed may have been written after the last checkpoint
+            crawler.pjk.edge_stream.write('999 999\n')
+            crawler.pjk.edge_stream.close()
+            crawler.pjk.node_stream.close()
+        with MockMAGServer(citation_graph) as server:
+            MAGConf.BASE_URL = server.url
+            pjk = CitationCrawler(max_depth=10, checkpoint_dir=checkpoint_dir, checkpoint_every=4, session=self.session).crawl()
+        self.assertEqual(get_edges(pjk), expected)
+        self.assertEqual(pjk.edge_count, len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+from .mock_server import MockMAGServer
+
+import unittest
+
+import numpy as np
+
+from h1theswan_utils.microsoft_academic_api import MAGSession, Projection, ProjectedEvaluateQuery, QueryTimeoutError, get_records_for_ids
+from h1theswan_utils.microsoft_academic_api import projection as projection_module
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+
+
+def paper(i):
+    return {'Id': i, 'Ti': 'title {}'.format(i), 'Y': 2000 + i, 'logprob': -1.5 * i,
+            'AA': [{'AuN': 'author {}'.format(i), 'AuId': 10 * i}], 'J': {'JN': 'journal'}}
+
+def respond(method, path, params):
+    """Evaluate Or(Id=...,Id=...) to those papers, with only the requested attributes. Id=0 aborts"""
+    ids = [int(x[3:]) for x in params['expr'].replace('Or(', '').rstrip(')').split(',')]
+    if 0 in ids:
+        return 200, {'expr': params['expr'], 'aborted': True, 'entities': []}
+    attributes = set(a.split('.')[0] for a in params['attributes'].split(','))
+    entities = [dict((k, v) for k, v in paper(i).items() if k in attributes) for i in ids if i < 100]
+    return 200, {'expr': params['expr'], 'entities': entities}
+
+
+class ProjectionTestSuite(unittest.TestCase):
+    """Attribute projection test cases."""
+
+    def setUp(self):
+        self.base_url = MAGConf.BASE_URL
+        self.session = MAGSession(backoff_factor=0.01)
+        self.projection = Projection(['Id', 'Ti', 'Y', 'logprob', 'AA.AuN', 'J.JN'])
+
+    def tearDown(self):
+        MAGConf.BASE_URL = self.base_url
+        self.session.close()
+
+    def test_records_and_columns(self):
+        self.assertEqual(self.projection.attributes, 'Id,Ti,Y,logprob,AA.AuN,J.JN')
+        record = self.projection.record(paper(3))
+        self.assertEqual((record.Id, record.Ti, record.AA_AuN, record.J_JN), (3, 'title 3', ['author 3'], 'journal'))
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.as_dict()['AA.AuN'], ['author 3'])
+        self.assertEqual(self.projection.record({'Id': 4}).Ti, None)
+
+        columns = self.projection.columns([paper(1), {'Id': 2}])
+        self.assertEqual(columns['Y'].dtype, np.int64)
+        self.assertEqual(columns['Y'].tolist(), [2001, -1])
+        self.assertTrue(np.isnan(columns['logprob'][1]))
+        self.assertEqual(columns['Ti'].tolist(), ['title 1', None])
+
+    def _query(self, stream):
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            q = ProjectedEvaluateQuery('Or(Id=1,Id=2)', projection=self.projection, count=2, session=self.session, cache=False, stream=stream)
+            records = q.get_records()
+            columns = q.get_columns()
+            with self.assertRaises(QueryTimeoutError):
+                ProjectedEvaluateQuery('Id=0', projection=self.projection, session=self.session, cache=False, stream=stream).get_records()
+        self.assertEqual(server.requests[0][2]['attributes'], 'Id,Ti,Y,logprob,AA.AuN,J.JN')
+        self.assertEqual(records, [self.projection.record(paper(1)), self.projection.record(paper(2))])
+        self.assertEqual(columns['Id'].tolist(), [1, 2])
+        self.assertEqual(columns['logprob'].tolist(), [-1.5, -3.0])
+
+    def test_query(self):
+        self._query(stream=False)
+
+    @unittest.skipIf(projection_module.ijson is None, "ijson is not installed")
+    def test_query_stream(self):
+        self._query(stream=True)
+
+    def test_records_for_ids(self):
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            records = list(get_records_for_ids(range(1, 250), ['Id', 'Y'], max_workers=3, session=self.session))
+        self.assertEqual(sorted((r.Id, r.Y) for r in records), [(i, 2000 + i) for i in range(1, 100)])
+
+
+if __name__ == '__main__':
+    unittest.main()
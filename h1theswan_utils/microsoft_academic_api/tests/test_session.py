@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from .context import microsoft_academic_api
+from .mock_server import MockMAGServer
+
+import unittest
+
+from h1theswan_utils.microsoft_academic_api import EvaluateQuery, InterpretQuery, MAGSession, QueryGetError
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+from h1theswan_utils.microsoft_academic_api.session import parse_retry_after
+
+
+class MAGSessionTestSuite(unittest.TestCase):
+    """Session, retry, and backoff test cases."""
+
+    def setUp(self):
+        self.base_url = MAGConf.BASE_URL
+        self.session = MAGSession(backoff_factor=0.01, max_retries=3)
+
+    def tearDown(self):
+        MAGConf.BASE_URL = self.base_url
+        self.session.close()
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after(None), None)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)  # in the past
+        self.assertEqual(parse_retry_after('soon'), None)
+
+    def test_connections_are_reused(self):
+        respond = lambda method, path, params: (200, {'expr': params['expr'], 'entities': []})
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            for i in range(5):
+                j = EvaluateQuery('Id={}'.format(i), session=self.session).get()
+                self.assertEqual(j['expr'], 'Id={}'.format(i))
+        self.assertEqual([path for method, path, params in server.requests], ['/evaluate'] * 5)
+        self.assertEqual(len(server.client_ports), 1)
+
+    def test_retry(self):
+        statuses = [503, 429, 200]
+        def respond(method, path, params):
+            status = statuses.pop(0)
+            return status, {'interpretations': []}, {'Retry-After': '0'} if status == 429 else {}
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            self.assertEqual(InterpretQuery('some title', session=self.session).get_first_expr(), None)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_retries_run_out(self):
+        respond = lambda method, path, params: (500, {})
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            with self.assertRaises(QueryGetError):
+                EvaluateQuery('Id=1', session=self.session).get()
+        self.assertEqual(len(server.requests), 4)
+
+    def test_no_retry_for_client_errors(self):
+        respond = lambda method, path, params: (400, {})
+        with MockMAGServer(respond) as server:
+            MAGConf.BASE_URL = server.url
+            with self.assertRaises(QueryGetError):
+                EvaluateQuery('Id=1', session=self.session).get()
+        self.assertEqual(len(server.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+from array import array
 from collections import defaultdict
 from functools import partial
 
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
 def invert_dict(d):
     return dict(zip(d.values(), d.keys()))
 
@@ -29,8 +34,30 @@ class AutoID(object):
     def finalize(self):
         self.ids = dict(self.ids)
 
+    def extend(self, names):
+        """Assign sequential ids to a sequence of names, all at once.
+
+        The names must be unique and must not already be in the AutoID.
+        """
+        num_before = len(self.ids)
+        self.ids.update(zip(names, range(self._next_id, self._next_id + len(names))))
+        if len(self.ids) != num_before + len(names):
+            raise ValueError("names passed to extend() must be unique and new")
+        self._next_id += len(names)
+
+    def get_ids(self, names):
+        """Get the ids for a batch of names, assigning new ids in order of first appearance
+
+        Returns:
+            NumPy int64 array of ids
+        """
+        return np.array([self.ids[name] for name in names], dtype=np.int64)
+
     def lookup_id(self, id):
-        raise "Not implemented"
+        """Get the name for an id. The inverted dictionary is rebuilt when ids have been added since the last lookup."""
+        if len(self.invert) != len(self.ids):
+            self.invert = invert_dict(self.ids)
+        return self.invert[id]
 
     def values(self):
         return self.ids.values()
@@ -53,3 +80,283 @@ class AutoID(object):
     def __len__(self):
         return len(self.ids)
 
+
+class CompactAutoID(object):
+    """A memory-compact AutoID.
+
+    Names are encoded and interned in one contiguous buffer, with an offsets
+    array marking where each name starts. An open-addressing hash table of
+    positions maps names to ids, and ids map back to names by reading the
+    buffer by position. The hashes are not stored: when the table grows, they
+    are recomputed from the buffer and the table is rebuilt with NumPy.
+
+    Looking up one name at a time probes the table in Python, which is a few
+    times slower than AutoID. get_ids() and extend() probe and insert a whole
+    batch of names at once, with NumPy.
+
+    Names are stored as text: ``ids[5]`` and ``ids['5']`` are the same node,
+    and keys() returns strings.
+    """
+
+    def __init__(self, first_id=0, capacity=1024, encoding='utf-8'):
+        """Initialize a CompactAutoID
+
+        Args:
+            first_id: The first id to use
+            capacity: Initial number of slots in the hash table (rounded up to a power of two)
+            encoding: Encoding used to store names in the buffer
+
+        Returns:
+            A CompactAutoID, a dictionary like object.
+
+        """
+        self.first_id = first_id
+        self.encoding = encoding
+        self._buf = bytearray()
+        self._offsets = array('Q', [0])
+        size = 8
+        while size < capacity:
+            size *= 2
+        self._table = array('q', [-1]) * size
+        self._mask = size - 1
+        self._frozen = False
+
+    def key(self, key):
+        """The text a name is stored as (e.g., 5 -> '5'). Names with the same text are the same node"""
+        if isinstance(key, bytes):
+            return key.decode(self.encoding)
+        return str(key)
+
+    def _probe(self, key):
+        """Return (slot, position, encoded key) for a name (str). position is -1 if the name is not present,
+        and slot is then the empty slot to insert it in."""
+        table = self._table
+        mask = self._mask
+        offsets = self._offsets
+        buf = self._buf
+        data = key.encode(self.encoding)
+        n = len(data)
+        slot = hash(key) & mask
+        pos = table[slot]
+        while pos != -1:
+            start = offsets[pos]
+            if offsets[pos + 1] - start == n and buf.startswith(data, start):
+                break
+            slot = (slot + 1) & mask
+            pos = table[slot]
+        return slot, pos, data
+
+    def _name_hashes(self, first, last):
+        """Hashes of the names at positions first to last - 1, recomputed from the buffer"""
+        offsets = self._offsets[first:last + 1].tolist()
+        data = bytes(self._buf[offsets[0]:offsets[-1]])
+        text = data.decode(self.encoding)
+        slices = map(slice, [offset - offsets[0] for offset in offsets[:-1]], [offset - offsets[0] for offset in offsets[1:]])
+        if len(text) == len(data):
+            # one byte per character, so the byte offsets are also character offsets
+            names = map(text.__getitem__, slices)
+        else:
+            names = map(partial(str, encoding=self.encoding), map(data.__getitem__, slices))
+        return np.fromiter(map(hash, names), dtype=np.int64, count=last - first)
+
+    @staticmethod
+    def _place(table, mask, hashes, positions):
+        """Insert positions into a table (NumPy view) by linear probing, a round of probes at a time"""
+        slots = hashes & mask
+        while len(positions):
+            free = np.flatnonzero(table[slots] == -1)
+            # the first of the positions that probe the same free slot takes it, the others move on
+            _, first = np.unique(slots[free], return_index=True)
+            placed = free[first]
+            table[slots[placed]] = positions[placed]
+            waiting = np.ones(len(positions), dtype=bool)
+            waiting[placed] = False
+            positions = positions[waiting]
+            slots = (slots[waiting] + 1) & mask
+
+    def _resize(self, size, chunksize=2**18):
+        """Rebuild the hash table with size slots, recomputing the hashes from the buffer a chunk of names at a time"""
+        table = array('q', [-1]) * size
+        mask = size - 1
+        view = np.frombuffer(table, dtype=np.int64)
+        for first in range(0, len(self), chunksize):
+            last = min(first + chunksize, len(self))
+            self._place(view, mask, self._name_hashes(first, last), np.arange(first, last, dtype=np.int64))
+        del view
+        self._table = table
+        self._mask = mask
+
+    def _reserve(self, num_names):
+        """Grow the table so that it is at most half full with num_names names"""
+        size = len(self._table)
+        while 2 * num_names > size:
+            size *= 2
+        if size != len(self._table):
+            self._resize(size)
+
+    def _probe_many(self, hashes, data, data_offsets):
+        """Probe the table for a batch of encoded names, with NumPy
+
+        :hashes: int64 array of the hashes of the names
+        :data: uint8 array of the encoded names, concatenated
+        :data_offsets: int64 array: name i is data[data_offsets[i]:data_offsets[i + 1]]
+        :returns: int64 array of positions (-1 for names that are not present)
+
+        """
+        table = np.frombuffer(self._table, dtype=np.int64)
+        offsets = np.frombuffer(self._offsets, dtype=np.uint64)
+        buf = np.frombuffer(self._buf, dtype=np.uint8)
+        lengths = np.diff(data_offsets)
+        out = np.full(len(hashes), -1, dtype=np.int64)
+        active = np.arange(len(hashes))
+        slots = hashes & self._mask
+        while len(active):
+            pos = table[slots]
+            found = pos != -1
+            active, slots, pos = active[found], slots[found], pos[found]
+            starts = offsets[pos].astype(np.int64)
+            match = (offsets[pos + 1].astype(np.int64) - starts) == lengths[active]
+            if match.any():
+                # compare the bytes of the candidates that have the right length
+                n = lengths[active[match]]
+                owner = np.repeat(np.arange(len(n)), n)
+                within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+                same = buf[starts[match][owner] + within] == data[data_offsets[active[match]][owner] + within]
+                match[match] = np.bincount(owner[~same], minlength=len(n)) == 0
+            out[active[match]] = pos[match]
+            active = active[~match]
+            slots = (slots[~match] + 1) & self._mask
+        return out
+
+    def get_ids(self, names):
+        """Get the ids for a batch of names, assigning new ids in order of first appearance
+
+        The result is the same as [ids[name] for name in names], but the names are looked up and inserted with NumPy.
+
+        Args:
+            names: Sequence of names
+
+        Returns:
+            NumPy int64 array of ids
+        """
+        keys = [key if type(key) is str else self.key(key) for key in names]
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        encoded = [key.encode(self.encoding) for key in keys]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=data_offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        hashes = np.fromiter(map(hash, keys), dtype=np.int64, count=len(keys))
+        positions = self._probe_many(hashes, data, data_offsets)
+
+        missing = np.flatnonzero(positions == -1)
+        if len(missing):
+            if self._frozen:
+                raise KeyError(keys[missing[0]])
+            # the first occurrence of each new name gets the next position
+            new = {}
+            for i in missing.tolist():
+                new.setdefault(keys[i], i)
+            first = np.fromiter(new.values(), dtype=np.int64, count=len(new))
+            num_before = len(self)
+            new_positions = np.arange(num_before, num_before + len(first), dtype=np.int64)
+            buf_size = len(self._buf)
+            self._buf += b''.join(encoded[i] for i in first.tolist())
+            self._offsets.extend((buf_size + np.cumsum(lengths[first])).tolist())
+            if 2 * len(self) > len(self._table):
+                self._reserve(len(self))
+            else:
+                self._place(np.frombuffer(self._table, dtype=np.int64), self._mask, hashes[first], new_positions)
+            position_of = dict(zip(new, new_positions.tolist()))
+            positions[missing] = [position_of[keys[i]] for i in missing.tolist()]
+        return positions + self.first_id
+
+    def finalize(self):
+        """Stop assigning new ids. Looking up an unknown name raises KeyError afterwards."""
+        self._frozen = True
+
+    def extend(self, names):
+        """Assign sequential ids to a sequence of names.
+
+        The names must be unique and must not already be in the CompactAutoID.
+        """
+        num_before = len(self)
+        self.get_ids(names)
+        if len(self) != num_before + len(names):
+            raise ValueError("names passed to extend() must be unique and new")
+
+    def get(self, key, default=None):
+        """Get the id for a name without assigning a new one"""
+        pos = self._probe(key if type(key) is str else self.key(key))[1]
+        if pos == -1:
+            return default
+        return pos + self.first_id
+
+    def lookup_id(self, id):
+        """Get the name for an id"""
+        pos = id - self.first_id
+        if pos < 0 or pos >= len(self):
+            raise KeyError(id)
+        return self._buf[self._offsets[pos]:self._offsets[pos + 1]].decode(self.encoding)
+
+    def nbytes(self):
+        """Number of bytes used by the buffer, offsets and hash table"""
+        return (len(self._buf)
+                + self._offsets.itemsize * len(self._offsets)
+                + self._table.itemsize * len(self._table))
+
+    def bytes_per_node(self):
+        """Average number of bytes used per node"""
+        if len(self) == 0:
+            return 0.0
+        return float(self.nbytes()) / len(self)
+
+    def values(self):
+        return range(self.first_id, self.first_id + len(self))
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def keys(self):
+        return (self.lookup_id(id) for id in self.values())
+
+    def __getitem__(self, key):
+        if type(key) is not str:
+            key = self.key(key)
+        slot, pos, data = self._probe(key)
+        if pos == -1:
+            if self._frozen:
+                raise KeyError(key)
+            pos = len(self)
+            self._buf += data
+            self._offsets.append(len(self._buf))
+            self._table[slot] = pos
+            if 2 * (pos + 1) > len(self._table):
+                self._resize(2 * len(self._table))
+        return pos + self.first_id
+
+    def __getstate__(self):
+        # the table slots come from hash(), which is salted per process,
+        # so the table is rebuilt when unpickled instead of being pickled
+        state = self.__dict__.copy()
+        del state['_table'], state['_mask']
+        state['_table_size'] = len(self._table)
+        return state
+
+    def __setstate__(self, state):
+        size = state.pop('_table_size')
+        self.__dict__.update(state)
+        self._resize(size)
+
+    def __setitem__(self, key, value):
+        raise TypeError("CompactAutoID assigns ids sequentially and does not support item assignment")
+
+    def __contains__(self, item):
+        return self._probe(item if type(item) is str else self.key(item))[1] != -1
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        return self.keys()
@@ -1,7 +1,66 @@
-from .AutoID import AutoID
+from .AutoID import AutoID, CompactAutoID
+from itertools import islice, repeat
 from shutil import copyfileobj
 from tempfile import TemporaryFile
 
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+def _iter_batches(values, batch_size):
+    """Yield successive batches of at most batch_size items from a sequence, array, or iterable"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    if isinstance(values, (list, tuple, np.ndarray)):
+        for start in range(0, len(values), batch_size):
+            yield values[start:start+batch_size]
+    else:
+        it = iter(values)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _as_list(values):
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+# dtypes whose tolist() values are formatted the same way as their NumPy scalars
+_TOLIST_DTYPE_KINDS = 'biuUSO'
+_TOLIST_DTYPES = ('float64', 'complex128')
+
+def _as_name_objects(values):
+    """Names as a list or object array that formats each name the same way add_edge() does.
+    Arrays of other dtypes (e.g., float32, where tolist() gives 0.10000000149011612 for 0.1) keep their NumPy scalars"""
+    if isinstance(values, np.ndarray) and values.dtype.kind not in _TOLIST_DTYPE_KINDS and values.dtype.name not in _TOLIST_DTYPES:
+        out = np.empty(len(values), dtype=object)
+        out[:] = list(values)
+        return out
+    return values
+
+def _format_node_lines(ids, names):
+    """Format vertex lines the same way as PajekFactory.add_edge()"""
+    fields = [None] * (2 * len(ids))
+    fields[0::2] = _as_list(ids)
+    fields[1::2] = _as_list(names)
+    return ('%s "%s"\n' * len(ids)) % tuple(fields)
+
+def _format_edge_lines(source_ids, dest_ids, weights=None):
+    """Format edge lines the same way as PajekFactory.add_edge(). Weights are formatted with str()"""
+    n = len(source_ids)
+    if weights is None:
+        fields = [None] * (2 * n)
+        fields[0::2] = _as_list(source_ids)
+        fields[1::2] = _as_list(dest_ids)
+        return ("%s %s\n" * n) % tuple(fields)
+    fields = [None] * (3 * n)
+    fields[0::3] = _as_list(source_ids)
+    fields[1::3] = _as_list(dest_ids)
+    fields[2::3] = list(weights)  # keep NumPy scalars, so that e.g. float32 weights are formatted the same as in add_edge()
+    return ("%s %s %s\n" * n) % tuple(fields)
+
 
 class PajekFactory(object):
     """Factory to build a Pajek file"""
@@ -12,7 +71,8 @@ class PajekFactory(object):
                     weighted=False,
                     temp_dir=None, 
                     vertices_label='Vertices', 
-                    edges_label='Arcs'):
+                    edges_label='Arcs',
+                    compact_ids=False):
         """Build a Pajek Writer.
 
         Args:
@@ -22,8 +82,12 @@ class PajekFactory(object):
             temp_dir: If provided, the directory to write temporary files to.
             vertices_label: label to use for the Vertices section of the output file. Default: 'Vertices'
             edges_label: label to use for the Edges section fo the output file. Note: directed graphs should use 'Arcs'. Undirected graphs should use 'Edges'. Default: 'Arcs'
+            compact_ids: If True, store node names in a CompactAutoID, which uses much less memory for large networks. Names are stored as text. Default: False
         """
-        self.ids = AutoID(first_id=1)
+        if compact_ids is True:
+            self.ids = CompactAutoID(first_id=1)
+        else:
+            self.ids = AutoID(first_id=1)
         self.edge_stream = edge_stream
         self.node_stream = node_stream
         self.weighted = weighted
@@ -72,6 +136,93 @@ class PajekFactory(object):
             self.edge_stream.write("%s %s\n" % (sid, did))
         self.edge_count += 1
 
+    def add_edges(self, sources, dests, weights=None, batch_size=1000000):
+        """Add many edges at once.
+
+        The output is byte-identical to calling add_edge() for each edge in order,
+        but ids are assigned for a whole batch at a time (using pandas.factorize),
+        and node and edge lines are written in one chunk per batch.
+
+        Names, **not** ids should be used here.
+
+        Args:
+            sources: Names of the source nodes (iterable or NumPy array)
+            dests: Names of the destination nodes (iterable or NumPy array), same length as sources
+            weights: (optional) Edge weights (iterable or NumPy array). If not provided, every edge has weight 1
+            batch_size: Number of edges to process at a time
+
+        Returns:
+            None
+        """
+        source_batches = _iter_batches(sources, batch_size)
+        dest_batches = _iter_batches(dests, batch_size)
+        if weights is None:
+            weight_batches = repeat(None)
+        else:
+            weight_batches = _iter_batches(weights, batch_size)
+        for source_batch in source_batches:
+            dest_batch = next(dest_batches, None)
+            weight_batch = next(weight_batches, None)
+            if dest_batch is None or len(dest_batch) != len(source_batch) \
+                    or (weights is not None and (weight_batch is None or len(weight_batch) != len(source_batch))):
+                raise ValueError("sources, dests, and weights must all have the same length")
+            self._add_edge_batch(source_batch, dest_batch, weight_batch)
+        if next(dest_batches, None) is not None or (weights is not None and next(weight_batches, None) is not None):
+            raise ValueError("sources, dests, and weights must all have the same length")
+
+    def _add_edge_batch(self, sources, dests, weights=None):
+        n = len(sources)
+        if n == 0:
+            return
+        if weights is not None:
+            weights = list(weights)
+            if self.weighted is False:
+                for weight in weights:
+                    if weight != 1:
+                        raise ValueError("Illegal `weight` argument given: {}. This should be an unweighted network. For a weighted network, set PajekFactory.weighted to True".format(weight))
+
+        # interleave sources and dests so that new ids are assigned in the same order as add_edge()
+        names = np.empty(2 * n, dtype=object)
+        names[0::2] = _as_name_objects(sources)
+        names[1::2] = _as_name_objects(dests)
+        if isinstance(self.ids, CompactAutoID):
+            # a CompactAutoID keys names by their text (5 and '5' are the same node), so factorize the text
+            keys = np.empty(2 * n, dtype=object)
+            keys[:] = [self.ids.key(name) for name in names]
+            codes, uniques = pd.factorize(keys)
+        else:
+            codes, uniques = pd.factorize(names)
+        if (codes < 0).any():
+            # factorize() gives missing names (None, NaN) no code. add_edge() keys them as they are,
+            # so add this batch one edge at a time to get the same ids and lines
+            if weights is None:
+                weights = repeat(1)
+            for source, dest, weight in zip(sources, dests, weights):
+                self.add_edge(source, dest, weight=weight)
+            return
+
+        # ids are assigned sequentially, so the names that are new to this batch get the highest ids
+        num_ids_before = len(self.ids)
+        unique_ids = self.ids.get_ids(uniques)
+        num_new = len(self.ids) - num_ids_before
+        if num_new > 0:
+            is_new = unique_ids > unique_ids.max() - num_new
+            if isinstance(self.ids, CompactAutoID):
+                # write each new node with its first name in the batch, as add_edge() does
+                first = np.unique(codes, return_index=True)[1]
+                self.node_stream.write(_format_node_lines(unique_ids[is_new], names[first[is_new]]))
+            else:
+                self.node_stream.write(_format_node_lines(unique_ids[is_new], uniques[is_new]))
+
+        edge_ids = unique_ids[codes]
+        if self.weighted is True:
+            if weights is None:
+                weights = [1] * n
+            self.edge_stream.write(_format_edge_lines(edge_ids[0::2], edge_ids[1::2], weights))
+        else:
+            self.edge_stream.write(_format_edge_lines(edge_ids[0::2], edge_ids[1::2]))
+        self.edge_count += n
+
     def write(self, output, vertices_label=None, edges_label=None):
         """Write pajek file to output"""
         self.edge_stream.seek(0)
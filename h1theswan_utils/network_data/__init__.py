@@ -4,3 +4,6 @@ PajekFactory and AutoID are modified from: https://github.com/jevinw/rec_utiliti
 
 from .PajekFactory import *
 from .network_utils import *
+from .csr_graph import *
+from .pajek_index import PajekIndex
+from .cluster_graph import *
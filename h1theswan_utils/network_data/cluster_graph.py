@@ -0,0 +1,116 @@
+"""
+Coarse (cluster-level) networks from a Pajek file and its Infomap treefile.
+
+Every node is mapped to its cluster at a chosen depth of the hierarchy, and the edges are
+aggregated into cluster -> cluster edges. The edges are streamed in chunks, so memory is
+bounded by the number of cluster pairs rather than the number of edges.
+"""
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+from ..treefiles import Treefile
+from .PajekFactory import PajekFactory
+from .network_utils import iter_pajek_edges, logger
+
+# aggregate into dense arrays (num_clusters ** 2) up to this many cluster pairs
+DENSE_CLUSTER_PAIRS_LIMIT = 2**24
+
+
+def _merge_pair_counts(keys, counts, weights, new_keys, new_counts, new_weights):
+    """Merge two sets of (sorted, unique) cluster pair keys with their edge counts and weights"""
+    keys = np.concatenate([keys, new_keys])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([counts, new_counts]), minlength=len(keys)).astype(np.int64)
+    weights = np.bincount(inverse, weights=np.concatenate([weights, new_weights]), minlength=len(keys))
+    return keys, counts, weights
+
+def aggregate_cluster_edges(fname_pjk, node_codes, num_clusters, weighted=None, chunksize=10000000, dense=None):
+    """Aggregate the edges of a Pajek file into edges between clusters
+
+    :fname_pjk: filename for the pajek file (.net or .pjk)
+    :node_codes: int64 array indexed by vertex id, with the cluster code (0..num_clusters-1) of each vertex, or -1 to leave the vertex out
+    :num_clusters: number of clusters
+    :weighted: read the edge weights. Default: detect from the first edge line
+    :chunksize: number of edges to process at a time
+    :dense: aggregate into dense arrays of size num_clusters ** 2. Default: if that is at most DENSE_CLUSTER_PAIRS_LIMIT
+    :returns: pandas DataFrame with columns source, target (cluster codes), num_edges, and weight (sum of the edge weights, or num_edges if unweighted),
+              sorted by source and target. Includes intra-cluster edges (source == target)
+
+    """
+    node_codes = np.asarray(node_codes, dtype=np.int64)
+    if dense is None:
+        dense = num_clusters ** 2 <= DENSE_CLUSTER_PAIRS_LIMIT
+    if dense is True:
+        counts = np.zeros(num_clusters ** 2, dtype=np.int64)
+        weights = np.zeros(num_clusters ** 2, dtype=np.float64)
+    else:
+        keys = np.zeros(0, dtype=np.int64)
+        counts = np.zeros(0, dtype=np.int64)
+        weights = np.zeros(0, dtype=np.float64)
+    num_skipped = 0
+    for chunk in iter_pajek_edges(fname_pjk, chunksize=chunksize, weighted=weighted):
+        sources = chunk[0].to_numpy()
+        targets = chunk[1].to_numpy()
+        in_range = (sources < len(node_codes)) & (targets < len(node_codes))
+        source_codes = np.full(len(sources), -1, dtype=np.int64)
+        target_codes = np.full(len(targets), -1, dtype=np.int64)
+        source_codes[in_range] = node_codes[sources[in_range]]
+        target_codes[in_range] = node_codes[targets[in_range]]
+        keep = (source_codes >= 0) & (target_codes >= 0)
+        num_skipped += len(keep) - int(keep.sum())
+        chunk_keys = source_codes[keep] * num_clusters + target_codes[keep]
+        chunk_weights = chunk[2].to_numpy()[keep] if 2 in chunk.columns else None
+        if dense is True:
+            counts += np.bincount(chunk_keys, minlength=len(counts))
+            weights += np.bincount(chunk_keys, weights=chunk_weights, minlength=len(weights))
+        else:
+            chunk_keys, inverse = np.unique(chunk_keys, return_inverse=True)
+            chunk_counts = np.bincount(inverse, minlength=len(chunk_keys))
+            chunk_weights = np.bincount(inverse, weights=chunk_weights, minlength=len(chunk_keys))
+            keys, counts, weights = _merge_pair_counts(keys, counts, weights, chunk_keys, chunk_counts, chunk_weights)
+    if num_skipped:
+        logger.debug("skipped {} edges with vertices that are not in any cluster".format(num_skipped))
+    if dense is True:
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+        weights = weights[keys]
+    return pd.DataFrame({
+        'source': keys // num_clusters,
+        'target': keys % num_clusters,
+        'num_edges': counts,
+        'weight': weights,
+    })
+
+def cluster_graph_from_pajek(fname_pjk, treefile, depth=1, value='weight', self_loops=True, weighted=None, chunksize=10000000, temp_dir=None):
+    """Build the cluster -> cluster network for a Pajek file and its Infomap treefile
+
+    :fname_pjk: filename for the pajek file (.net or .pjk)
+    :treefile: Treefile, or filename for the treefile. Its node column must be the vertex ids of the pajek file
+    :depth: depth of the clusters in the hierarchy (1 for top-level clusters)
+    :value: edge weight for the cluster network: 'weight' (sum of the edge weights) or 'count' (number of edges)
+    :self_loops: include intra-cluster edges as self-loops
+    :weighted: read the edge weights of the pajek file. Default: detect from the first edge line
+    :chunksize: number of edges to process at a time
+    :temp_dir: directory for the PajekFactory's temporary files
+    :returns: PajekFactory (weighted), with the cluster names (e.g., '1:2') as vertex names
+
+    """
+    if value not in ['weight', 'count']:
+        raise ValueError("unknown value: {}. value must be one of 'weight', 'count'".format(value))
+    if isinstance(treefile, str):
+        treefile = Treefile(treefile)
+    node_codes, clusters = treefile.get_node_cluster_codes(depth=depth)
+    edges = aggregate_cluster_edges(fname_pjk, node_codes, len(clusters), weighted=weighted, chunksize=chunksize)
+    if self_loops is False:
+        edges = edges[edges['source'] != edges['target']]
+    logger.debug("{} clusters, {} cluster edges".format(len(clusters), len(edges)))
+
+    clusters = np.array(clusters, dtype=object)
+    pjk = PajekFactory(weighted=True, temp_dir=temp_dir)
+    pjk.add_edges(clusters[edges['source'].to_numpy()],
+                    clusters[edges['target'].to_numpy()],
+                    weights=edges['num_edges' if value == 'count' else 'weight'].to_numpy())
+    return pjk
@@ -0,0 +1,297 @@
+"""
+Binary compressed sparse row (CSR) format for networks.
+
+A CSR graph is stored as a directory of files:
+    meta.json           number of vertices and edges, whether the graph is weighted, and the Pajek section labels
+    offsets.npy         int64 array (num_vertices + 1). The out-edges of vertex i are targets[offsets[i]:offsets[i+1]]
+    targets.npy         int32 (or int64 for very large graphs) array of 0-based target vertex indices
+    weights.npy         float64 array of edge weights (weighted graphs only)
+    names.bin           vertex names, UTF-8 encoded and concatenated
+    name_offsets.npy    int64 array (num_vertices + 1). The name of vertex i is names.bin[name_offsets[i]:name_offsets[i+1]]
+
+Vertex i in the CSR graph is vertex i+1 in the Pajek file.
+The .npy files can be memory-mapped, so loading is effectively instant and the pages are shared between processes.
+"""
+
+import json
+import os
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+from .PajekFactory import _format_node_lines, _format_edge_lines
+from .network_utils import _iter_pajek_vertex_lines, _parse_vertex_line, _pajek_edges_are_weighted, _iter_pajek_edge_chunks, logger
+
+CSR_FORMAT_VERSION = 1
+
+
+class CSRGraph(object):
+
+    """A network in compressed sparse row form, usually memory-mapped from disk"""
+
+    def __init__(self,
+                offsets,
+                targets,
+                weights=None,
+                names=None,
+                name_offsets=None,
+                vertices_label='Vertices',
+                edges_label='Arcs'):
+        """
+        :offsets: array (num_vertices + 1) of offsets into targets
+        :targets: array of 0-based target vertex indices
+        :weights: (optional) array of edge weights
+        :names: (optional) array of bytes: UTF-8 encoded vertex names, concatenated
+        :name_offsets: (optional) array (num_vertices + 1) of offsets into names
+        :vertices_label: label for the Vertices section when writing Pajek
+        :edges_label: label for the Edges section when writing Pajek
+
+        """
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.names = names
+        self.name_offsets = name_offsets
+        self.vertices_label = vertices_label
+        self.edges_label = edges_label
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a CSR graph directory
+
+        :path: directory written by pajek_to_csr() or pajekfactory_to_csr()
+        :mmap: if True (default), memory-map the arrays (read-only) instead of reading them into memory
+        :returns: CSRGraph
+
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != CSR_FORMAT_VERSION:
+            raise ValueError("unsupported CSR format version: {}".format(meta.get('format_version')))
+        mmap_mode = 'r' if mmap is True else None
+        load = lambda fname: np.load(os.path.join(path, fname), mmap_mode=mmap_mode)
+        weights = load('weights.npy') if meta['weighted'] else None
+        names_fname = os.path.join(path, 'names.bin')
+        if os.path.getsize(names_fname) == 0:
+            names = np.empty(0, dtype=np.uint8)
+        elif mmap is True:
+            names = np.memmap(names_fname, dtype=np.uint8, mode='r')
+        else:
+            names = np.fromfile(names_fname, dtype=np.uint8)
+        return cls(load('offsets.npy'),
+                    load('targets.npy'),
+                    weights=weights,
+                    names=names,
+                    name_offsets=load('name_offsets.npy'),
+                    vertices_label=meta['vertices_label'],
+                    edges_label=meta['edges_label'])
+
+    @property
+    def num_vertices(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    @property
+    def weighted(self):
+        return self.weights is not None
+
+    def out_degree(self):
+        """:returns: array of out-degrees"""
+        return np.diff(self.offsets)
+
+    def neighbors(self, i):
+        """:returns: array of the 0-based indices of the targets of vertex i"""
+        return self.targets[self.offsets[i]:self.offsets[i+1]]
+
+    def edge_sources(self, start=0, end=None):
+        """Expand the offsets into an array of 0-based source indices for the edges in [start, end)"""
+        if end is None:
+            end = self.num_edges
+        first = np.searchsorted(self.offsets, start, side='right') - 1
+        last = np.searchsorted(self.offsets, end, side='left')
+        counts = np.diff(np.clip(self.offsets[first:last+1], start, end))
+        return np.repeat(np.arange(first, first + len(counts)), counts)
+
+    def get_name(self, i):
+        """:returns: the name of vertex i"""
+        if self.names is None:
+            raise RuntimeError("this CSR graph has no names")
+        return self.names[self.name_offsets[i]:self.name_offsets[i+1]].tobytes().decode('utf-8')
+
+    def get_names(self, start=0, end=None):
+        """:returns: list of the names of vertices start..end-1"""
+        if self.names is None:
+            raise RuntimeError("this CSR graph has no names")
+        if end is None:
+            end = self.num_vertices
+        buf = self.names[self.name_offsets[start]:self.name_offsets[end]].tobytes()
+        bounds = (self.name_offsets[start:end+1] - self.name_offsets[start]).tolist()
+        return [buf[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def write_pajek(self, output, vertices_label=None, edges_label=None, chunksize=10000000):
+        """Write the graph in Pajek format
+
+        Edges are written grouped by source vertex, and weights are written as floats.
+
+        :output: file object opened for writing (text)
+        :chunksize: number of vertices or edges to format at a time
+
+        """
+        vertices_label = vertices_label or self.vertices_label
+        edges_label = edges_label or self.edges_label
+        output.write("*{} {}\n".format(vertices_label, self.num_vertices))
+        for start in range(0, self.num_vertices, chunksize):
+            end = min(start + chunksize, self.num_vertices)
+            if self.names is not None:
+                names = self.get_names(start, end)
+            else:
+                names = [str(i + 1) for i in range(start, end)]
+            output.write(_format_node_lines(np.arange(start + 1, end + 1), names))
+        output.write("*{} {}\n".format(edges_label, self.num_edges))
+        for start in range(0, self.num_edges, chunksize):
+            end = min(start + chunksize, self.num_edges)
+            sources = self.edge_sources(start, end) + 1
+            targets = np.asarray(self.targets[start:end], dtype=np.int64) + 1
+            weights = self.weights[start:end].tolist() if self.weights is not None else None
+            output.write(_format_edge_lines(sources, targets, weights))
+
+    def to_pajek(self, fname, **kwargs):
+        """Write the graph to a Pajek (.net) file"""
+        with open(fname, 'w') as outf:
+            self.write_pajek(outf, **kwargs)
+
+    def __str__(self):
+        return "<CSRGraph {} vertices, {} edges>".format(self.num_vertices, self.num_edges)
+
+
+def _write_names(path, names):
+    name_offsets = [0]
+    with open(os.path.join(path, 'names.bin'), 'wb') as outf:
+        for name in names:
+            b = name.encode('utf-8')
+            outf.write(b)
+            name_offsets.append(name_offsets[-1] + len(b))
+    np.save(os.path.join(path, 'name_offsets.npy'), np.array(name_offsets, dtype=np.int64))
+
+def _write_csr(path, num_vertices, iter_edge_chunks, weighted=False, vertices_label='Vertices', edges_label='Arcs'):
+    """Write the edge arrays of a CSR graph, in two passes over the edges (count out-degrees, then fill)
+
+    :iter_edge_chunks: function returning a new iterator over DataFrames of edges (1-based source and target ids in columns 0 and 1, weights in column 2)
+
+    """
+    degree = np.zeros(num_vertices, dtype=np.int64)
+    for chunk in iter_edge_chunks():
+        sources = chunk[0].to_numpy()
+        targets = chunk[1].to_numpy()
+        if len(sources) and (min(sources.min(), targets.min()) < 1 or max(sources.max(), targets.max()) > num_vertices):
+            raise ValueError("edge refers to a vertex id that is not between 1 and {}".format(num_vertices))
+        degree += np.bincount(sources - 1, minlength=num_vertices)
+    offsets = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(degree, out=offsets[1:])
+    num_edges = int(offsets[-1])
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+
+    target_dtype = np.int32 if num_vertices < 2**31 else np.int64
+    targets_out = np.lib.format.open_memmap(os.path.join(path, 'targets.npy'), mode='w+', dtype=target_dtype, shape=(num_edges,))
+    if weighted is True:
+        weights_out = np.lib.format.open_memmap(os.path.join(path, 'weights.npy'), mode='w+', dtype=np.float64, shape=(num_edges,))
+    cursor = offsets[:-1].copy()
+    for chunk in iter_edge_chunks():
+        sources = chunk[0].to_numpy() - 1
+        order = np.argsort(sources, kind='stable')
+        sources = sources[order]
+        # position of each edge within its run of equal sources
+        run_starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]]) if len(sources) else np.empty(0, dtype=np.int64)
+        run_lengths = np.diff(np.r_[run_starts, len(sources)])
+        rank = np.arange(len(sources)) - np.repeat(run_starts, run_lengths)
+        positions = cursor[sources] + rank
+        targets_out[positions] = chunk[1].to_numpy()[order] - 1
+        if weighted is True:
+            weights_out[positions] = chunk[2].to_numpy()[order]
+        cursor[sources[run_starts]] += run_lengths
+    targets_out.flush()
+    del targets_out
+    if weighted is True:
+        weights_out.flush()
+        del weights_out
+
+    meta = {
+        'format_version': CSR_FORMAT_VERSION,
+        'num_vertices': num_vertices,
+        'num_edges': num_edges,
+        'weighted': weighted,
+        'vertices_label': vertices_label,
+        'edges_label': edges_label,
+    }
+    with open(os.path.join(path, 'meta.json'), 'w') as outf:
+        json.dump(meta, outf)
+
+def pajek_to_csr(fname_pjk, path, weighted=None, chunksize=10000000):
+    """Convert a Pajek file to a binary CSR graph directory
+
+    The vertices must have ids 1..num_vertices.
+
+    :fname_pjk: filename for the pajek file (.net or .pjk)
+    :path: output directory. Created if it does not exist
+    :weighted: keep edge weights. Default: detect from the first edge line
+    :chunksize: number of edges to process at a time
+    :returns: CSRGraph (memory-mapped)
+
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    section_info = {}
+    with open(fname_pjk, 'rb') as f:
+        names = {}
+        for line in _iter_pajek_vertex_lines(f, section_info):
+            index, name, rest = _parse_vertex_line(line)
+            names[index] = name
+        num_vertices = len(names)
+        if names and (min(names) != 1 or max(names) != num_vertices):
+            raise ValueError("vertex ids must be 1..{}".format(num_vertices))
+        logger.debug("read {} vertices".format(num_vertices))
+        _write_names(path, (names[i] for i in range(1, num_vertices + 1)))
+        del names
+
+        if weighted is None:
+            weighted = _pajek_edges_are_weighted(f)
+        edges_offset = f.tell()
+        def iter_edge_chunks():
+            f.seek(edges_offset)
+            return _iter_pajek_edge_chunks(f, chunksize=chunksize, weighted=weighted)
+        _write_csr(path, num_vertices, iter_edge_chunks,
+                    weighted=weighted,
+                    vertices_label=section_info.get('vertices_label', 'Vertices'),
+                    edges_label=section_info.get('edges_label', 'Arcs'))
+    return CSRGraph.load(path)
+
+def pajekfactory_to_csr(pjk, path, chunksize=10000000):
+    """Convert a PajekFactory to a binary CSR graph directory, without writing the Pajek file
+
+    :pjk: PajekFactory
+    :path: output directory. Created if it does not exist
+    :chunksize: number of edges to process at a time
+    :returns: CSRGraph (memory-mapped)
+
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    num_vertices = len(pjk.ids)
+    _write_names(path, ('%s' % pjk.ids.lookup_id(i) for i in range(1, num_vertices + 1)))
+
+    pjk.edge_stream.flush()
+    def iter_edge_chunks():
+        pjk.edge_stream.seek(0)
+        return _iter_pajek_edge_chunks(pjk.edge_stream, chunksize=chunksize, weighted=pjk.weighted)
+    try:
+        _write_csr(path, num_vertices, iter_edge_chunks,
+                    weighted=pjk.weighted,
+                    vertices_label=pjk.vertices_label,
+                    edges_label=pjk.edges_label)
+    finally:
+        pjk.edge_stream.seek(0, os.SEEK_END)
+    return CSRGraph.load(path)
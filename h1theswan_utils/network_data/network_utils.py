@@ -1,74 +1,271 @@
+import csv
+import os
+import shutil
+from shutil import copyfileobj
+from tempfile import mkdtemp, TemporaryFile
 from timeit import default_timer as timer
-from six import string_types
-try:
-    from humanfriendly import format_timespan
-except ImportError:
-    def format_timespan(seconds):
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+multiprocessing = LazyModule('multiprocessing')
+
+from ..io_utils import line_aligned_byte_ranges, open_byte_range
+
+def format_timespan(seconds):
+    # humanfriendly is optional, and imported on first use
+    try:
+        from humanfriendly import format_timespan as _format_timespan
+    except ImportError:
         return "{:.2f} seconds".format(seconds)
+    return _format_timespan(seconds)
 
 import logging
-logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
-        datefmt="%H:%M:%S",
-        level=logging.INFO)
+# logging is configured by the application (e.g., a script's __main__), not on import
 # logger = logging.getLogger(__name__)
 logger = logging.getLogger('__main__').getChild(__name__)
 
-def extract_subgraph_from_pajek(fname_pjk, names):
+def _parse_vertex_line(line):
+    """Parse a line from the vertex section of a pajek file
+
+    :line: vertex line, without the trailing newline
+    :returns: (index, name, rest) where rest is everything after the index (the quoted name and any other attributes)
+
+    """
+    index, _, rest = line.partition(' ')
+    name = rest.strip()
+    if name[:1] == '"':
+        end = name.find('"', 1)
+        name = name[1:end] if end != -1 else name[1:]
+    else:
+        name = name.split(' ', 1)[0]
+    return int(index), name, rest
+
+def _iter_pajek_vertex_lines(f, section_info=None):
+    """Iterate over the vertex section of a pajek file opened in binary mode
+
+    Yields the vertex lines, decoded and stripped.
+    When the iteration is finished, f is positioned at the first line of the edge section,
+    and section_info (a dict, if provided) has been updated with
+    'vertices_label', 'num_vertices', 'edges_label', 'num_edges', and 'edges_offset' (byte offset of the first edge line).
+
+    """
+    if section_info is None:
+        section_info = {}
+    offset = f.tell()
+    for line in f:
+        offset += len(line)
+        if line[:1] == b'*':
+            items = line[1:].decode('utf-8').split()
+            label = items[0] if items else ''
+            count = int(items[1]) if len(items) > 1 else None
+            if label[:1].lower() == 'v':
+                section_info['vertices_label'] = label
+                section_info['num_vertices'] = count
+            elif label[:1].lower() in ['a', 'e']:  # 'arcs' or 'edges'
+                section_info['edges_label'] = label
+                section_info['num_edges'] = count
+                section_info['edges_offset'] = offset
+                return
+            continue
+        line = line.strip()
+        if line:
+            yield line.decode('utf-8')
+    section_info['edges_offset'] = offset
+
+def _pajek_edges_are_weighted(f):
+    """Peek at the next edge line of a pajek file opened in binary mode. Returns True if it has a weight column"""
+    pos = f.tell()
+    line = f.readline()
+    while line and (not line.strip() or line[:1] == b'*'):
+        line = f.readline()
+    f.seek(pos)
+    return len(line.split()) > 2
+
+def _iter_pajek_edge_chunks(f, chunksize=10000000, weighted=False):
+    """Read the edge section of a pajek file in chunks, starting from the current position of f
+
+    Lines starting with '*' (e.g., a second edge section) are skipped.
+
+    :f: pajek file opened in binary mode, positioned in the edge section
+    :chunksize: number of edges per chunk
+    :weighted: also read the weight column
+    :returns: iterator over DataFrames with int64 columns 0 (source) and 1 (target), and float64 column 2 (weight) if weighted
+
+    """
+    usecols = [0, 1, 2] if weighted is True else [0, 1]
+    dtype = {0: np.int64, 1: np.int64, 2: np.float64}
+    try:
+        for chunk in pd.read_csv(f,
+                                sep=r'\s+',
+                                header=None,
+                                comment='*',
+                                usecols=usecols,
+                                dtype={col: dtype[col] for col in usecols},
+                                chunksize=chunksize):
+            yield chunk
+    except pd.errors.EmptyDataError:
+        return
+
+def iter_pajek_edges(fname_pjk, chunksize=10000000, weighted=None, byte_range=None, use_index=True):
+    """Read the edge section of a pajek file in chunks
+
+    With use_index=True, the sidecar index (see PajekIndex) is used to seek straight to the edge section,
+    and is built first if it does not exist or is out of date.
+
+    :fname_pjk: filename for the pajek file (.net or .pjk)
+    :chunksize: number of edges per chunk
+    :weighted: read the weight column. Default: detect from the first edge line
+    :byte_range: (optional) (start, end) tuple of byte offsets within the edge section to read, e.g. from pajek_edge_byte_ranges()
+    :use_index: use the sidecar index to find the edge section
+    :returns: iterator over DataFrames with int64 columns 0 (source) and 1 (target), and float64 column 2 (weight) if weighted
+
+    """
+    if byte_range is not None:
+        start, end = byte_range
+        f = open_byte_range(fname_pjk, start, end)
+    else:
+        f = open(fname_pjk, 'rb')
+        if use_index is True:
+            from .pajek_index import PajekIndex
+            PajekIndex.open(fname_pjk).seek_edges(f)
+        else:
+            for line in _iter_pajek_vertex_lines(f):
+                pass
+    try:
+        if weighted is None:
+            weighted = _pajek_edges_are_weighted(f)
+        for chunk in _iter_pajek_edge_chunks(f, chunksize=chunksize, weighted=weighted):
+            yield chunk
+    finally:
+        f.close()
+
+def pajek_edge_byte_ranges(fname_pjk, num_ranges):
+    """Split the edge section of a pajek file into line-aligned byte ranges, using the sidecar index (see PajekIndex)
+
+    :returns: list of (start, end) tuples, to pass to iter_pajek_edges() as byte_range
+
+    """
+    from .pajek_index import PajekIndex
+    return PajekIndex.open(fname_pjk).edge_byte_ranges(num_ranges)
+
+def get_pajek_vertex_names(fname_pjk, ids):
+    """Get the names of vertices by id, using the sidecar index (see PajekIndex) to avoid scanning the whole file
+
+    :returns: dictionary: id -> name
+
+    """
+    from .pajek_index import PajekIndex
+    return PajekIndex.open(fname_pjk).get_vertex_names(ids)
+
+class _SubgraphIdMap(object):
+    """Maps old vertex ids to new (1-based) vertex ids, or 0 for vertices not in the subgraph
+
+    With dense=True, a lookup array covering every old id is used (fastest).
+    With dense=False, the subgraph's old ids are kept in a sorted array and looked up by binary search,
+    so memory is proportional to the number of vertices in the subgraph.
+    """
+
+    def __init__(self, old_ids, size=0, dense=True):
+        """
+        :old_ids: old ids of the vertices in the subgraph, in order of their new ids
+        :size: largest old id to cover with the dense lookup array (e.g., the number of vertices in the original network)
+        :dense: use a dense lookup array
+
+        """
+        old_ids = np.asarray(old_ids, dtype=np.int64)
+        self.dense = dense
+        if dense is True:
+            size = max(size, int(old_ids.max()) if len(old_ids) else 0)
+            self.lookup = np.zeros(size + 1, dtype=np.int64)
+            self.lookup[old_ids] = np.arange(1, len(old_ids) + 1)
+        else:
+            order = np.argsort(old_ids)
+            self.old_sorted = old_ids[order]
+            self.new_sorted = order + 1
+
+    def map(self, ids):
+        """:returns: array of new ids (0 for ids not in the subgraph)"""
+        new_ids = np.zeros(len(ids), dtype=np.int64)
+        if self.dense is True:
+            in_range = (ids >= 0) & (ids < len(self.lookup))
+            new_ids[in_range] = self.lookup[ids[in_range]]
+        elif len(self.old_sorted):
+            j = np.minimum(np.searchsorted(self.old_sorted, ids), len(self.old_sorted) - 1)
+            found = self.old_sorted[j] == ids
+            new_ids[found] = self.new_sorted[j[found]]
+        return new_ids
+
+
+class _LineList(list):
+    """A list of lines with a file-like write() method"""
+
+    def write(self, text):
+        self.extend(text.splitlines(True))
+
+
+def _extract_subgraph(fname_pjk, names, vertex_stream, edge_stream, chunksize=10000000, dense=True):
+    """Write the vertex and edge lines of a subgraph to two streams
+
+    :vertex_stream: file-like object that vertex lines are written to
+    :edge_stream: file-like object that edge lines are written to
+    :dense: use a dense old -> new id lookup array (see _SubgraphIdMap)
+    :returns: (number of vertices, number of edges)
+
+    """
+    from .PajekFactory import _format_edge_lines
+    if not isinstance(names, (set, frozenset, dict)):
+        names = set(names)
+
+    section_info = {}
+    with open(fname_pjk, 'rb') as f:
+        logger.debug("starting to process vertices")
+        old_ids = []
+        for line in _iter_pajek_vertex_lines(f, section_info):
+            this_index, this_name, rest = _parse_vertex_line(line)
+            if this_name in names:
+                old_ids.append(this_index)
+                vertex_stream.write('{} {}\n'.format(len(old_ids), rest))  # we want the new idx to start at 1
+        num_vertices = len(old_ids)
+        id_map = _SubgraphIdMap(old_ids, section_info.get('num_vertices') or 0, dense=dense)
+        del old_ids
+
+        logger.debug("starting to process edges. {} vertices in subgraph".format(num_vertices))
+        num_edges = 0
+        num_edges_read = 0
+        for chunk in _iter_pajek_edge_chunks(f, chunksize=chunksize):
+            # we only care if both source and target are in the subgraph
+            source_new = id_map.map(chunk[0].to_numpy())
+            target_new = id_map.map(chunk[1].to_numpy())
+            mask = (source_new > 0) & (target_new > 0)
+            if mask.any():
+                edge_stream.write(_format_edge_lines(source_new[mask], target_new[mask]))
+                num_edges += int(mask.sum())
+            num_edges_read += len(chunk)
+            logger.debug("read {} edges. currently in subgraph: {} vertices and {} edges".format(num_edges_read, num_vertices, num_edges))
+    return num_vertices, num_edges
+
+def extract_subgraph_from_pajek(fname_pjk, names, chunksize=10000000):
     """Extract the relevant lines from a pajek file (subgraph using a list of <names> that is a subset of the original network)
 
+    The names are put in a set for membership tests, and the edge section is read in chunks
+    and filtered with vectorized lookups on the integer vertex ids.
+
     :fname_pjk: filename for the pajek file (.net or .pjk)
-    :names: list of node names to extract
+    :names: collection of node names to extract (list, set, etc.)
+    :chunksize: number of edges to read at a time
     :returns: dictionary: vertices -> list of lines representing the vertices;
                             'edges' -> list of lines representing the edges
 
     """
     lines = {
-        'vertices': [],
-        'edges': []
+        'vertices': _LineList(),
+        'edges': _LineList()
     }
-    indices = []
-
-    with open(fname_pjk, 'r') as f:
-        mode = ''
-        new_idx = 0
-        old_new_idx_dict = {}
-        for i, line in enumerate(f):
-            if i in [10, 100, 1000, 10000, 100000, 1000000] or i % 5000000 == 0:
-                logger.debug("reading line {}. currently in subgraph: {} vertices and {} edges".format(i, len(lines['vertices']), len(lines['edges'])))
-            if line[0] == '*':
-                if line[1].lower() == 'v':  # this should happen on the very first line
-                    mode = 'v'
-                    logger.debug("starting to process vertices. {}".format(line.strip()))
-                elif line[1].lower() in ['a', 'e']:  # 'arcs' or 'edges'
-                    indices = set(indices)
-                    mode = 'e'
-                    logger.debug("starting to process edges. {}".format(line.strip()))
-                continue
-
-            if mode == 'v':
-                items = line.strip().split(' ')
-                this_index = items[0]
-                this_name = items[1].strip('"')
-                if this_name in names:
-                    new_idx += 1   # we want the new idx to start at 1
-                    indices.append(this_index)
-                    old_new_idx_dict[this_index] = new_idx
-                    output_line = ' '.join([str(new_idx)] + items[1:])
-                    output_line = output_line + '\n'
-                    lines['vertices'].append(output_line)
-            elif mode == 'e':
-                # edges
-                items = line.strip().split(' ')
-                source_index = items[0]
-                # we only care if both source and target are in this line
-                if source_index in indices:
-                    target_index = items[1]
-                    if target_index in indices:
-                        source_index_new = old_new_idx_dict[source_index]
-                        target_index_new = old_new_idx_dict[target_index]
-                        output_line = ' '.join([str(source_index_new), str(target_index_new)])
-                        output_line = output_line + '\n'
-                        lines['edges'].append(output_line)
+    _extract_subgraph(fname_pjk, names, lines['vertices'], lines['edges'], chunksize=chunksize)
+    lines['vertices'] = list(lines['vertices'])
+    lines['edges'] = list(lines['edges'])
     return lines
 
 def write_pajek_from_full_lines(lines, outfname, vertices_label='vertices', edges_label='arcs'):
@@ -98,11 +295,169 @@ def extract_subgraph_from_pajek_and_write_to_pajek(input_fname,
                                                     subset_names, 
                                                     output_fname, 
                                                     vertices_label='vertices', 
-                                                    edges_label='arcs'):
-    lines = extract_subgraph_from_pajek(input_fname, subset_names)
-    write_pajek_from_full_lines(lines, output_fname, vertices_label=vertices_label, edges_label=edges_label)
+                                                    edges_label='arcs',
+                                                    streaming=True,
+                                                    temp_dir=None,
+                                                    chunksize=10000000):
+    """Extract a subgraph from a pajek file and write it to a new pajek file
+
+    :input_fname: filename for the pajek file (.net or .pjk)
+    :subset_names: collection of node names to extract
+    :output_fname: filename for the output pajek (.net)
+    :streaming: if True (default), vertex and edge lines are spooled to temporary files instead of being collected in memory,
+                so peak memory is proportional to the number of selected vertices, not the number of edges.
+                The output is the same either way.
+    :temp_dir: (optional) directory for the temporary files used when streaming
+    :chunksize: number of edges to read at a time
 
-def edgelist_to_pajek(f, sep='\t', header=True, temp_dir=None, weighted=False):
+    """
+    if streaming is not True:
+        lines = extract_subgraph_from_pajek(input_fname, subset_names, chunksize=chunksize)
+        write_pajek_from_full_lines(lines, output_fname, vertices_label=vertices_label, edges_label=edges_label)
+        return
+
+    with TemporaryFile("w+", dir=temp_dir) as vertex_stream, TemporaryFile("w+", dir=temp_dir) as edge_stream:
+        num_vertices, num_edges = _extract_subgraph(input_fname, subset_names, vertex_stream, edge_stream, chunksize=chunksize, dense=False)
+        vertex_stream.seek(0)
+        edge_stream.seek(0)
+        with open(output_fname, 'w') as outf:
+            logger.debug('writing {} {}...'.format(num_vertices, vertices_label))
+            outf.write('*{} {}\n'.format(vertices_label, num_vertices))
+            copyfileobj(vertex_stream, outf)
+            logger.debug('writing {} {}...'.format(num_edges, edges_label))
+            outf.write('*{} {}\n'.format(edges_label, num_edges))
+            copyfileobj(edge_stream, outf)
+
+def extract_subgraphs_from_pajek_and_write_to_pajek(input_fname,
+                                                    subsets,
+                                                    output_fnames,
+                                                    vertices_label='vertices',
+                                                    edges_label='arcs',
+                                                    chunksize=10000000,
+                                                    temp_dir=None):
+    """Extract many subgraphs from one pajek file in a single pass, and write each one to its own pajek file
+
+    The vertex section and the edge section are each read once, no matter how many subgraphs there are.
+    Each edge is routed to every subgraph that contains both of its endpoints.
+    Vertex lines are kept in memory, and edge lines are spooled to one temporary file per subgraph.
+    Each subgraph is the same as what extract_subgraph_from_pajek_and_write_to_pajek() would write for it.
+
+    :input_fname: filename for the pajek file (.net or .pjk)
+    :subsets: dictionary: subgraph label -> collection of node names
+    :output_fnames: dictionary: subgraph label -> output filename,
+                    or a format string with a '{}' placeholder for the label (e.g., 'subgraph_{}.net')
+    :chunksize: number of edges to read at a time
+    :temp_dir: (optional) directory for the temporary edge files
+    :returns: dictionary: subgraph label -> (number of vertices, number of edges)
+
+    """
+    from .PajekFactory import _format_edge_lines
+    labels = list(subsets.keys())
+    if isinstance(output_fnames, str):
+        output_fnames = {label: output_fnames.format(label) for label in labels}
+
+    # name -> list of indices of the subgraphs that contain it
+    membership = {}
+    for i, label in enumerate(labels):
+        for name in set(subsets[label]):
+            membership.setdefault(name, []).append(i)
+
+    vertex_lines = [[] for _ in labels]
+    edge_files = [None for _ in labels]
+    num_edges = [0 for _ in labels]
+    section_info = {}
+    try:
+        with open(input_fname, 'rb') as f:
+            logger.debug("starting to process vertices for {} subgraphs".format(len(labels)))
+            # one row per (vertex, subgraph) membership
+            m_old, m_label, m_new = [], [], []
+            for line in _iter_pajek_vertex_lines(f, section_info):
+                this_index, this_name, rest = _parse_vertex_line(line)
+                for i in membership.get(this_name, ()):
+                    new_idx = len(vertex_lines[i]) + 1
+                    vertex_lines[i].append('{} {}\n'.format(new_idx, rest))
+                    m_old.append(this_index)
+                    m_label.append(i)
+                    m_new.append(new_idx)
+            del membership
+            m_old = np.array(m_old, dtype=np.int64)
+            m_label = np.array(m_label, dtype=np.int64)
+            m_new = np.array(m_new, dtype=np.int64)
+            size = max(section_info.get('num_vertices') or 0, int(m_old.max()) if len(m_old) else 0) + 1
+
+            # memberships grouped by old id (CSR-style), to expand the subgraphs of each source vertex
+            order = np.argsort(m_old, kind='stable')
+            src_label = m_label[order]
+            src_new = m_new[order]
+            num_memberships = np.bincount(m_old, minlength=size)
+            membership_offsets = np.concatenate([[0], np.cumsum(num_memberships)])
+            # sorted (subgraph, old id) keys, to look up target vertices
+            keys = m_label * size + m_old
+            order = np.argsort(keys)
+            keys = keys[order]
+            key_new = m_new[order]
+            del m_old, m_label, m_new, order
+
+            logger.debug("starting to process edges. {} vertex memberships".format(len(keys)))
+            num_edges_read = 0
+            for chunk in _iter_pajek_edge_chunks(f, chunksize=chunksize):
+                sources = chunk[0].to_numpy()
+                targets = chunk[1].to_numpy()
+                num_edges_read += len(chunk)
+                in_range = (sources >= 0) & (sources < size) & (targets >= 0) & (targets < size)
+                keep = in_range.copy()
+                keep[in_range] = (num_memberships[sources[in_range]] > 0) & (num_memberships[targets[in_range]] > 0)
+                if not keep.any():
+                    continue
+                sources = sources[keep]
+                targets = targets[keep]
+
+                # expand each edge into one row per subgraph that contains its source
+                counts = num_memberships[sources]
+                edge_idx = np.repeat(np.arange(len(sources)), counts)
+                first = np.repeat(np.cumsum(counts) - counts, counts)
+                pos = membership_offsets[sources][edge_idx] + np.arange(len(edge_idx)) - first
+                row_label = src_label[pos]
+                row_source_new = src_new[pos]
+
+                # keep the rows where the subgraph also contains the target
+                target_keys = row_label * size + targets[edge_idx]
+                j = np.minimum(np.searchsorted(keys, target_keys), len(keys) - 1)
+                found = keys[j] == target_keys
+                row_label = row_label[found]
+                row_source_new = row_source_new[found]
+                row_target_new = key_new[j[found]]
+
+                order = np.argsort(row_label, kind='stable')  # keeps edges in file order within each subgraph
+                row_label = row_label[order]
+                bounds = np.flatnonzero(np.r_[True, row_label[1:] != row_label[:-1], True]) if len(row_label) else []
+                for a, b in zip(bounds[:-1], bounds[1:]):
+                    i = row_label[a]
+                    if edge_files[i] is None:
+                        edge_files[i] = TemporaryFile("w+", dir=temp_dir)
+                    edge_files[i].write(_format_edge_lines(row_source_new[order[a:b]], row_target_new[order[a:b]]))
+                    num_edges[i] += int(b - a)
+                logger.debug("read {} edges".format(num_edges_read))
+
+        counts = {}
+        for i, label in enumerate(labels):
+            with open(output_fnames[label], 'w') as outf:
+                outf.write('*{} {}\n'.format(vertices_label, len(vertex_lines[i])))
+                outf.writelines(vertex_lines[i])
+                outf.write('*{} {}\n'.format(edges_label, num_edges[i]))
+                if edge_files[i] is not None:
+                    edge_files[i].seek(0)
+                    copyfileobj(edge_files[i], outf)
+            counts[label] = (len(vertex_lines[i]), num_edges[i])
+            vertex_lines[i] = None
+            logger.debug("wrote subgraph {} to {}: {} vertices, {} edges".format(label, output_fnames[label], *counts[label]))
+    finally:
+        for edge_file in edge_files:
+            if edge_file is not None:
+                edge_file.close()
+    return counts
+
+def edgelist_to_pajek(f, sep='\t', header=True, temp_dir=None, weighted=False, engine='python', chunksize=1000000, processes=None, first_seen=False):
     """Convert an edgelist file to Pajek form.
     Takes a file containing an edgelist, and return a PajekFactory object.
     To write the pajek (.net) file, call write() on the PajekFactory, e.g.:
@@ -115,12 +470,29 @@ def edgelist_to_pajek(f, sep='\t', header=True, temp_dir=None, weighted=False):
     :header: boolean. Does the edgelist file contain a header row
     :temp_dir: (optional) Directory for a temporary file used by the PajekFactory
     :weighted: boolean. Denotes a weighted network. If the network is unweighted, the input file should have two columns. If weighted, the input edgelist should have three columns.
+    :engine: 'python' (default) reads the file line by line and adds one edge at a time.
+             'pandas' reads the file in chunks with the pandas C parser and adds each chunk with PajekFactory.add_edges(). Much faster for large files.
+             'parallel' splits the file into line-aligned byte ranges and parses them in a process pool (f must be a filename).
+             By default, the 'parallel' engine numbers the vertices in sorted order of their names, which lets the
+             per-shard name tables be merged in one vectorized step. Pass first_seen=True to number vertices in the order
+             they first appear, as the other engines do.
+             All engines produce the same edges, except that the 'pandas' and 'parallel' engines do not strip whitespace around fields.
+    :chunksize: number of rows per chunk for the 'pandas' engine
+    :processes: number of worker processes for the 'parallel' engine. Default: number of CPUs
+    :first_seen: boolean. For the 'parallel' engine, number vertices in order of first appearance, so that the output is identical to the 'pandas' engine
     :returns: PajekFactory object
 
     """
+    if engine == 'pandas':
+        return _edgelist_to_pajek_pandas(f, sep=sep, header=header, temp_dir=temp_dir, weighted=weighted, chunksize=chunksize)
+    elif engine == 'parallel':
+        return _edgelist_to_pajek_parallel(f, sep=sep, header=header, temp_dir=temp_dir, weighted=weighted, processes=processes, first_seen=first_seen)
+    elif engine != 'python':
+        raise ValueError("unknown engine: {}. engine must be one of 'python', 'pandas', 'parallel'".format(engine))
+
     from . import PajekFactory
     pjk = PajekFactory(temp_dir=temp_dir, weighted=weighted)
-    if isinstance(f, string_types):
+    if isinstance(f, str):
         f = open(f, 'r')
         close_at_end = True
     else:
@@ -141,3 +513,148 @@ def edgelist_to_pajek(f, sep='\t', header=True, temp_dir=None, weighted=False):
     if close_at_end:
         f.close()
     return pjk
+
+def _read_edgelist_csv(f, sep='\t', weighted=False, skiprows=0, chunksize=None):
+    """Read an edgelist with the pandas C parser.
+    Everything is read as strings so that names and weights are written exactly as they appear in the input
+    """
+    return pd.read_csv(f,
+                        sep=sep,
+                        header=None,
+                        skiprows=skiprows,
+                        usecols=[0, 1, 2] if weighted is True else [0, 1],
+                        dtype=str,
+                        na_filter=False,
+                        quoting=csv.QUOTE_NONE,
+                        chunksize=chunksize)
+
+def _edgelist_to_pajek_pandas(f, sep='\t', header=True, temp_dir=None, weighted=False, chunksize=1000000):
+    """Chunked, vectorized engine for edgelist_to_pajek()"""
+    from . import PajekFactory
+    pjk = PajekFactory(temp_dir=temp_dir, weighted=weighted)
+    reader = _read_edgelist_csv(f, sep=sep, weighted=weighted, skiprows=1 if header is True else 0, chunksize=chunksize)
+    rownum = 0
+    for chunk in reader:
+        if weighted is True:
+            pjk.add_edges(chunk[0].to_numpy(), chunk[1].to_numpy(), weights=chunk[2].to_numpy(), batch_size=len(chunk))
+        else:
+            pjk.add_edges(chunk[0].to_numpy(), chunk[1].to_numpy(), batch_size=len(chunk))
+        rownum += len(chunk)
+        logger.debug('{} edges added'.format(rownum))
+    logger.debug("done. {} edges added".format(rownum))
+    return pjk
+
+# target size in bytes for each shard of the 'parallel' engine
+PARALLEL_SHARD_SIZE = 2**28
+# number of vertex lines to format at a time
+VERTEX_WRITE_BATCH = 1000000
+
+def _parse_edgelist_shard(args):
+    """Worker for the 'parallel' engine: parse one byte range of an edgelist and factorize its names.
+    Saves the local codes (and weights) to the shard directory.
+
+    :returns: array of the unique names in this shard, in order of first appearance
+    """
+    fname, start, end, sep, weighted, shard_prefix = args
+    with open_byte_range(fname, start, end) as f:
+        try:
+            df = _read_edgelist_csv(f, sep=sep, weighted=weighted)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame({0: [], 1: [], 2: []}, dtype=object)
+    n = len(df)
+    names = np.empty(2 * n, dtype=object)
+    names[0::2] = df[0].to_numpy()
+    names[1::2] = df[1].to_numpy()
+    codes, uniques = pd.factorize(names)
+    np.save(shard_prefix + '.codes.npy', codes.astype(np.int64))
+    if weighted is True:
+        np.save(shard_prefix + '.weights.npy', df[2].to_numpy().astype(str))
+    return uniques
+
+def _write_edgelist_shard(args):
+    """Worker for the 'parallel' engine: map one shard's local codes to global ids and write its edge lines
+
+    :returns: number of edges written
+    """
+    from .PajekFactory import _format_edge_lines
+    shard_prefix, local_to_global, weighted = args
+    edge_ids = local_to_global[np.load(shard_prefix + '.codes.npy')]
+    weights = np.load(shard_prefix + '.weights.npy') if weighted is True else None
+    with open(shard_prefix + '.edges', 'w') as outf:
+        outf.write(_format_edge_lines(edge_ids[0::2], edge_ids[1::2], weights))
+    return len(edge_ids) // 2
+
+def _edgelist_to_pajek_parallel(fname, sep='\t', header=True, temp_dir=None, weighted=False, processes=None, first_seen=False):
+    """Multi-process engine for edgelist_to_pajek()
+
+    1. The file is split into byte ranges aligned to line boundaries, and each range is parsed and factorized in a process pool.
+    2. The per-shard name tables are merged into one global id space:
+        - by default, vertices are numbered in sorted order of their names (vectorized merge)
+        - with first_seen=True, vertices are numbered in order of first appearance (sequential merge over the shards in file order)
+    3. Each shard's edges are remapped to the global ids and written out in the process pool, then concatenated in order.
+    """
+    from .PajekFactory import PajekFactory, _format_node_lines
+    if not isinstance(fname, str):
+        raise ValueError("the 'parallel' engine needs a filename, not a file object")
+    processes = processes or multiprocessing.cpu_count()
+    pjk = PajekFactory(temp_dir=temp_dir, weighted=weighted)
+
+    start = 0
+    if header is True:
+        with open(fname, 'rb') as f:
+            f.readline()
+            start = f.tell()
+    end = os.path.getsize(fname)
+    num_shards = max(processes, (end - start) // PARALLEL_SHARD_SIZE + 1)
+    byte_ranges = line_aligned_byte_ranges(fname, num_shards, start=start, end=end)
+
+    shard_dir = mkdtemp(dir=temp_dir)
+    try:
+        shard_prefixes = [os.path.join(shard_dir, 'shard{:06d}'.format(i)) for i in range(len(byte_ranges))]
+        pool = multiprocessing.Pool(processes)
+        try:
+            start_time = timer()
+            shard_uniques = pool.map(_parse_edgelist_shard,
+                                    [(fname, a, b, sep, weighted, prefix) for (a, b), prefix in zip(byte_ranges, shard_prefixes)],
+                                    chunksize=1)
+            logger.debug("parsed {} shards in {}".format(len(byte_ranges), format_timespan(timer() - start_time)))
+
+            start_time = timer()
+            local_to_global = []
+            if first_seen is True:
+                for uniques in shard_uniques:
+                    num_ids_before = len(pjk.ids)
+                    unique_ids = np.array([pjk.ids[name] for name in uniques], dtype=np.int64)
+                    num_new = len(pjk.ids) - num_ids_before
+                    if num_new > 0:
+                        is_new = unique_ids > unique_ids.max() - num_new
+                        pjk.node_stream.write(_format_node_lines(unique_ids[is_new], uniques[is_new]))
+                    local_to_global.append(unique_ids)
+            else:
+                all_names = np.concatenate(shard_uniques) if shard_uniques else np.empty(0, dtype=object)
+                codes, global_names = pd.factorize(all_names, sort=True)
+                codes = codes + 1  # pajek ids start at 1
+                pjk.ids.extend(global_names)
+                for i in range(0, len(global_names), VERTEX_WRITE_BATCH):
+                    chunk = global_names[i:i + VERTEX_WRITE_BATCH]
+                    pjk.node_stream.write(_format_node_lines(np.arange(i + 1, i + 1 + len(chunk)), chunk))
+                offsets = np.cumsum([0] + [len(uniques) for uniques in shard_uniques])
+                local_to_global = [codes[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+            del shard_uniques
+            logger.debug("merged name tables ({} vertices) in {}".format(len(pjk.ids), format_timespan(timer() - start_time)))
+
+            start_time = timer()
+            for prefix, num_edges in zip(shard_prefixes,
+                                        pool.imap(_write_edgelist_shard,
+                                                [(prefix, l2g, weighted) for prefix, l2g in zip(shard_prefixes, local_to_global)])):
+                with open(prefix + '.edges', 'r') as shard_f:
+                    copyfileobj(shard_f, pjk.edge_stream)
+                os.remove(prefix + '.edges')
+                pjk.edge_count += num_edges
+            logger.debug("wrote {} edges in {}".format(pjk.edge_count, format_timespan(timer() - start_time)))
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    return pjk
@@ -0,0 +1,219 @@
+"""
+Byte-offset sidecar index for Pajek files.
+
+The index records where the vertex and edge sections start, and a sparse table of
+vertex id -> byte offset (every `stride`-th vertex line). It is saved next to the
+Pajek file as <fname>.idx.npz, and rebuilt automatically when the Pajek file's size
+or modification time changes.
+"""
+
+import json
+import os
+import zipfile
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+from ..io_utils import line_aligned_byte_ranges
+from .network_utils import _parse_vertex_line, logger
+
+PAJEK_INDEX_VERSION = 1
+
+
+def _file_signature(fname):
+    st = os.stat(fname)
+    return st.st_size, st.st_mtime_ns
+
+
+class PajekIndex(object):
+
+    """Byte-offset index for a Pajek file"""
+
+    def __init__(self, fname, meta, vertex_ids, vertex_offsets):
+        """Use PajekIndex.open() (or PajekIndex.build()) instead of calling this directly
+
+        :fname: filename for the pajek file
+        :meta: dictionary of section offsets, labels, and counts
+        :vertex_ids: array of the ids of every stride-th vertex line
+        :vertex_offsets: array of the byte offsets of those lines
+
+        """
+        self.fname = fname
+        self.meta = meta
+        self.vertex_ids = vertex_ids
+        self.vertex_offsets = vertex_offsets
+
+    @staticmethod
+    def sidecar_fname(fname):
+        return fname + '.idx.npz'
+
+    @classmethod
+    def build(cls, fname, stride=1024):
+        """Scan the vertex section of a pajek file and build its index
+
+        :fname: filename for the pajek file (.net or .pjk)
+        :stride: record the byte offset of every stride-th vertex line
+        :returns: PajekIndex
+
+        """
+        size, mtime_ns = _file_signature(fname)
+        meta = {
+            'version': PAJEK_INDEX_VERSION,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'stride': stride,
+            'vertices_label': None,
+            'num_vertices': None,
+            'vertices_offset': None,
+            'vertices_sorted': True,
+            'edges_label': None,
+            'num_edges': None,
+            'edges_offset': size,
+        }
+        vertex_ids = []
+        vertex_offsets = []
+        with open(fname, 'rb') as f:
+            offset = 0
+            i = 0
+            last_id = None
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                if line[:1] == b'*':
+                    items = line[1:].decode('utf-8').split()
+                    label = items[0] if items else ''
+                    count = int(items[1]) if len(items) > 1 else None
+                    if label[:1].lower() == 'v':
+                        meta.update(vertices_label=label, num_vertices=count, vertices_offset=offset)
+                    elif label[:1].lower() in ['a', 'e']:  # 'arcs' or 'edges'
+                        meta.update(edges_label=label, num_edges=count, edges_offset=offset)
+                        break
+                    continue
+                if not line.strip():
+                    continue
+                this_id = int(line.split(None, 1)[0])
+                if last_id is not None and this_id <= last_id:
+                    meta['vertices_sorted'] = False
+                last_id = this_id
+                if i % stride == 0:
+                    vertex_ids.append(this_id)
+                    vertex_offsets.append(line_offset)
+                i += 1
+        logger.debug("built index for {}: {} vertices, edges start at byte {}".format(fname, i, meta['edges_offset']))
+        return cls(fname, meta, np.array(vertex_ids, dtype=np.int64), np.array(vertex_offsets, dtype=np.int64))
+
+    @classmethod
+    def load(cls, fname):
+        """Load the sidecar index for a pajek file, without checking whether it is up to date"""
+        with np.load(cls.sidecar_fname(fname)) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(fname, meta, data['vertex_ids'], data['vertex_offsets'])
+
+    def save(self):
+        """Save the index to the sidecar file. The index is written to a temporary file first, so readers never see a partial sidecar"""
+        sidecar_fname = self.sidecar_fname(self.fname)
+        tmp_fname = '{}.{}.tmp'.format(sidecar_fname, os.getpid())
+        try:
+            with open(tmp_fname, 'wb') as outf:
+                np.savez(outf, meta=np.array(json.dumps(self.meta)), vertex_ids=self.vertex_ids, vertex_offsets=self.vertex_offsets)
+            os.replace(tmp_fname, sidecar_fname)
+        finally:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+
+    def is_current(self):
+        """:returns: True if the pajek file has not changed (size and mtime) since the index was built"""
+        size, mtime_ns = _file_signature(self.fname)
+        return self.meta.get('version') == PAJEK_INDEX_VERSION and self.meta['size'] == size and self.meta['mtime_ns'] == mtime_ns
+
+    @classmethod
+    def open(cls, fname, stride=1024, save=True):
+        """Get the index for a pajek file, loading it from the sidecar file if it is up to date, or building it otherwise
+
+        :fname: filename for the pajek file (.net or .pjk)
+        :stride: stride to use if the index needs to be built
+        :save: save a newly built index to the sidecar file. Errors while saving (e.g., in a read-only directory) are ignored
+        :returns: PajekIndex
+
+        """
+        if os.path.exists(cls.sidecar_fname(fname)):
+            try:
+                index = cls.load(fname)
+                if index.is_current():
+                    return index
+                logger.debug("index for {} is stale. rebuilding".format(fname))
+            except (ValueError, KeyError, IOError, OSError, zipfile.BadZipFile):
+                logger.debug("could not read index for {}. rebuilding".format(fname))
+        index = cls.build(fname, stride=stride)
+        if save is True:
+            try:
+                index.save()
+            except (IOError, OSError):
+                logger.debug("could not save index for {}".format(fname))
+        return index
+
+    @property
+    def edges_offset(self):
+        """Byte offset of the first line of the edge section"""
+        return self.meta['edges_offset']
+
+    @property
+    def num_vertices(self):
+        return self.meta['num_vertices']
+
+    @property
+    def num_edges(self):
+        return self.meta['num_edges']
+
+    def seek_edges(self, f):
+        """Move a file object (opened in binary mode) to the start of the edge section"""
+        f.seek(self.edges_offset)
+        return f
+
+    def get_vertex_names(self, ids):
+        """Get the names of vertices by id, reading only the parts of the vertex section that are needed
+
+        :ids: iterable of vertex ids
+        :returns: dictionary: id -> name. Ids that are not found are left out
+
+        """
+        ids = np.unique(np.asarray(list(ids), dtype=np.int64))
+        names = {}
+        if len(ids) == 0 or self.meta['vertices_offset'] is None:
+            return names
+        if self.meta['vertices_sorted'] is True:
+            # the vertex lines are in order of id, so each id can only be in one block of the sparse table
+            blocks = np.searchsorted(self.vertex_ids, ids, side='right') - 1
+            block_bounds = np.append(self.vertex_offsets, self.edges_offset)
+            to_read = [(block_bounds[k], block_bounds[k + 1], set(ids[blocks == k].tolist())) for k in np.unique(blocks[blocks >= 0])]
+        else:
+            # no usable sparse table: scan the whole vertex section once
+            to_read = [(self.meta['vertices_offset'], self.edges_offset, set(ids.tolist()))]
+        with open(self.fname, 'rb') as f:
+            for start, end, wanted in to_read:
+                f.seek(start)
+                while wanted and f.tell() < end:
+                    line = f.readline().strip()
+                    if not line or line[:1] == b'*':
+                        continue
+                    this_id, name, rest = _parse_vertex_line(line.decode('utf-8'))
+                    if this_id in wanted:
+                        names[this_id] = name
+                        wanted.discard(this_id)
+        return names
+
+    def get_vertex_name(self, id):
+        """:returns: the name of the vertex with this id"""
+        names = self.get_vertex_names([id])
+        if id not in names:
+            raise KeyError(id)
+        return names[id]
+
+    def edge_byte_ranges(self, num_ranges):
+        """Split the edge section into line-aligned byte ranges, e.g. for parallel processing
+
+        :returns: list of (start, end) tuples of byte offsets
+
+        """
+        return line_aligned_byte_ranges(self.fname, num_ranges, start=self.edges_offset, end=self.meta['size'])
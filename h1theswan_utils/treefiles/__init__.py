@@ -1 +1,2 @@
 from .treefile_utils import *
+from .compare import *
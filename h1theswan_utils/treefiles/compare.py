@@ -0,0 +1,146 @@
+"""
+Compare the partitions in two treefiles (e.g., Infomap runs with different seeds).
+
+The nodes of the two treefiles are aligned with a hash join on `name` or `node`, and the
+contingency table is built in sparse (coordinate) form from integer cluster codes, so the
+scores are computed with vectorized reductions over the nonzero cells only.
+"""
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+from .treefile_utils import Treefile
+
+
+def align_treefiles(treefile1, treefile2, on='name', depth=1):
+    """Match up the nodes of two treefiles and get their cluster codes
+
+    Nodes that are only in one of the treefiles are left out.
+
+    :treefile1: Treefile, or filename for a treefile
+    :treefile2: Treefile, or filename for a treefile
+    :on: column to match the nodes on: 'name' or 'node'
+    :depth: depth of the clusters to compare (1 for top-level clusters)
+    :returns: (codes1, codes2, clusters1, clusters2): int64 arrays of the cluster codes of each common node in each treefile,
+              and lists of the cluster names, indexed by code
+
+    """
+    if isinstance(treefile1, str):
+        treefile1 = Treefile(treefile1)
+    if isinstance(treefile2, str):
+        treefile2 = Treefile(treefile2)
+    treefile1.load_df()
+    treefile2.load_df()
+    codes1, clusters1 = treefile1._get_hierarchy().cluster_codes(depth)
+    codes2, clusters2 = treefile2._get_hierarchy().cluster_codes(depth)
+    keys2 = pd.Index(treefile2.df[on].to_numpy())
+    if not keys2.is_unique:
+        raise ValueError("the values in column '{}' of the second treefile are not unique".format(on))
+    # hash join: position of each row of treefile1 in treefile2 (-1 if not there)
+    matches = keys2.get_indexer(treefile1.df[on].to_numpy())
+    found = matches >= 0
+    return codes1[found], codes2[matches[found]], clusters1, clusters2
+
+def contingency_table(codes1, codes2):
+    """Build the contingency table of two partitions in sparse (coordinate) form
+
+    :codes1: int64 array of cluster codes
+    :codes2: int64 array of cluster codes, same length as codes1
+    :returns: (rows, cols, counts): the nonzero cells. counts[k] nodes are in cluster rows[k] of the first partition and cluster cols[k] of the second.
+              Sorted by row, then column
+
+    """
+    codes1 = np.asarray(codes1, dtype=np.int64)
+    codes2 = np.asarray(codes2, dtype=np.int64)
+    if len(codes1) != len(codes2):
+        raise ValueError("codes1 and codes2 must have the same length")
+    num_cols = int(codes2.max()) + 1 if len(codes2) else 1
+    keys, counts = np.unique(codes1 * num_cols + codes2, return_counts=True)
+    return keys // num_cols, keys % num_cols, counts
+
+def _entropy(counts, n):
+    p = counts[counts > 0] / float(n)
+    return -np.sum(p * np.log(p))
+
+def _comb2(x):
+    x = np.asarray(x, dtype=np.float64)
+    return x * (x - 1) / 2.0
+
+def partition_scores(rows, cols, counts):
+    """Compute normalized mutual information and the adjusted Rand index from a sparse contingency table
+
+    NMI is normalized by the arithmetic mean of the two entropies.
+
+    :returns: dictionary with keys 'nmi', 'ari', and 'num_nodes'
+
+    """
+    n = counts.sum()
+    if n == 0:
+        return {'nmi': np.nan, 'ari': np.nan, 'num_nodes': 0}
+    row_sums = np.bincount(rows, weights=counts)
+    col_sums = np.bincount(cols, weights=counts)
+
+    h1 = _entropy(row_sums, n)
+    h2 = _entropy(col_sums, n)
+    mi = np.sum(counts / float(n) * (np.log(counts * float(n)) - np.log(row_sums[rows]) - np.log(col_sums[cols])))
+    if h1 + h2 == 0:
+        nmi = 1.0
+    else:
+        nmi = max(mi, 0.0) / ((h1 + h2) / 2.0)
+
+    sum_cells = _comb2(counts).sum()
+    sum_rows = _comb2(row_sums).sum()
+    sum_cols = _comb2(col_sums).sum()
+    expected = sum_rows * sum_cols / _comb2(n)
+    max_index = (sum_rows + sum_cols) / 2.0
+    if max_index == expected:
+        ari = 1.0
+    else:
+        ari = (sum_cells - expected) / (max_index - expected)
+    return {'nmi': float(nmi), 'ari': float(ari), 'num_nodes': int(n)}
+
+def best_matches(rows, cols, counts):
+    """For every cluster in the first partition, find the cluster in the second partition with the highest Jaccard similarity
+
+    :returns: pandas DataFrame with columns cluster, best_match (cluster codes), jaccard, and num_common (nodes in both clusters).
+              Ties go to the lowest code
+
+    """
+    row_sums = np.bincount(rows, weights=counts)
+    col_sums = np.bincount(cols, weights=counts)
+    jaccard = counts / (row_sums[rows] + col_sums[cols] - counts)
+    # sort by row, then by jaccard (descending); keep the first cell of each row
+    sorter = np.lexsort((-jaccard, rows))
+    rows_sorted = rows[sorter]
+    first = sorter[np.r_[True, rows_sorted[1:] != rows_sorted[:-1]]] if len(rows) else sorter
+    return pd.DataFrame({
+        'cluster': rows[first],
+        'best_match': cols[first],
+        'jaccard': jaccard[first],
+        'num_common': counts[first],
+    })
+
+def compare_treefiles(treefile1, treefile2, on='name', depth=1):
+    """Compare the partitions in two treefiles at a given depth
+
+    :treefile1: Treefile, or filename for a treefile
+    :treefile2: Treefile, or filename for a treefile
+    :on: column to match the nodes on: 'name' or 'node'
+    :depth: depth of the clusters to compare (1 for top-level clusters)
+    :returns: dictionary with keys:
+              'nmi', 'ari': scores for the nodes that are in both treefiles
+              'num_nodes': number of nodes in both treefiles
+              'best_matches': pandas DataFrame with the best match (by Jaccard similarity) in treefile2 of each cluster in treefile1
+                              (columns cluster, best_match, jaccard, num_common; cluster names, e.g. '1:2')
+
+    """
+    codes1, codes2, clusters1, clusters2 = align_treefiles(treefile1, treefile2, on=on, depth=depth)
+    rows, cols, counts = contingency_table(codes1, codes2)
+    result = partition_scores(rows, cols, counts)
+    matches = best_matches(rows, cols, counts)
+    matches['cluster'] = np.array(clusters1, dtype=object)[matches['cluster'].to_numpy()]
+    matches['best_match'] = np.array(clusters2, dtype=object)[matches['best_match'].to_numpy()]
+    result['best_matches'] = matches
+    return result
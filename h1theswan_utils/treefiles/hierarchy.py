@@ -0,0 +1,237 @@
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+def _split_paths_bytes(paths, cluster_sep):
+    """Vectorized version of split_paths() for a single-character separator: parse the digits of all paths at once"""
+    n = len(paths)
+    try:
+        buf = np.frombuffer(('\n'.join(paths) + '\n').encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError("could not parse treefile paths")
+    is_sep = buf == ord(cluster_sep)
+    is_end = buf == ord('\n')
+    is_digit = (buf >= ord('0')) & (buf <= ord('9'))
+    is_boundary = is_sep | is_end
+    if not (is_boundary | is_digit).all():
+        raise ValueError("could not parse treefile paths")
+    boundaries = np.flatnonzero(is_boundary)
+    token_lengths = np.diff(np.r_[-1, boundaries]) - 1
+    if (token_lengths == 0).any():
+        raise ValueError("could not parse treefile paths")
+    # number of levels in each path: separators per line, plus 1
+    line_of_sep = np.cumsum(is_end)[is_sep]
+    depth = np.bincount(line_of_sep, minlength=n)[:n] + 1
+    # value of each level: sum of digit * 10 ** (digits to the right of it in the level)
+    digit_pos = np.flatnonzero(is_digit)
+    token_end = np.repeat(boundaries, token_lengths)
+    contributions = (buf[digit_pos] - ord('0')).astype(np.int64) * 10 ** (token_end - digit_pos - 1)
+    values = np.add.reduceat(contributions, np.cumsum(token_lengths) - token_lengths)
+    return values, depth
+
+def split_paths(paths, cluster_sep=":"):
+    """Split treefile paths into a matrix of integer levels
+
+    :paths: sequence of path strings (e.g., '1:2:3')
+    :cluster_sep: separator between levels
+    :returns: (levels, depth): levels is an int64 array (num_paths x max depth), padded with 0 after the end of each path
+              (Infomap numbers modules from 1). depth is an int64 array of the number of levels in each path
+
+    """
+    paths = list(paths)
+    n = len(paths)
+    if n == 0:
+        return np.zeros((0, 0), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if len(cluster_sep) == 1:
+        values, depth = _split_paths_bytes(paths, cluster_sep)
+    else:
+        depth = np.fromiter((p.count(cluster_sep) + 1 for p in paths), dtype=np.int64, count=n)
+        values = np.array(cluster_sep.join(paths).split(cluster_sep), dtype=np.int64)
+    if len(values) != depth.sum():
+        raise ValueError("could not parse treefile paths")
+    levels = np.zeros((n, int(depth.max())), dtype=np.int64)
+    starts = np.cumsum(depth) - depth
+    rows = np.repeat(np.arange(n), depth)
+    cols = np.arange(len(values)) - np.repeat(starts, depth)
+    levels[rows, cols] = values
+    return levels, depth
+
+
+class HierarchyIndex(object):
+
+    """Index of the cluster hierarchy in a treefile
+
+    The paths are split into integer levels and the rows are sorted lexicographically by level,
+    so the members of any cluster, at any depth, are a contiguous range of rows that can be found by binary search.
+    """
+
+    def __init__(self, paths, cluster_sep=":"):
+        """
+        :paths: sequence of path strings, one per row of the treefile
+        :cluster_sep: separator between levels in the paths
+
+        """
+        self.cluster_sep = cluster_sep
+        levels, depth = split_paths(paths, cluster_sep=cluster_sep)
+        # np.lexsort sorts by the last key first
+        self.order = np.lexsort(levels.T[::-1]) if levels.shape[1] else np.arange(len(levels))
+        self.levels = levels[self.order]
+        self.depth = depth[self.order]
+
+    @property
+    def max_depth(self):
+        return self.levels.shape[1]
+
+    def parse_cluster(self, cluster):
+        """Convert a cluster name ('1:2', '1:2:', 1, or (1, 2)) to a tuple of ints"""
+        if isinstance(cluster, (tuple, list, np.ndarray)):
+            return tuple(int(x) for x in cluster)
+        cluster = str(cluster).rstrip(self.cluster_sep)
+        return tuple(int(x) for x in cluster.split(self.cluster_sep))
+
+    def cluster_range(self, cluster):
+        """Find the rows (in sorted order) of the nodes in a cluster, in O(depth * log n)
+
+        :cluster: cluster name, e.g. '1:2' or (1, 2)
+        :returns: (start, end): the members are self.order[start:end]
+
+        """
+        prefix = self.parse_cluster(cluster)
+        d = len(prefix)
+        if d >= self.max_depth:
+            return 0, 0
+        lo, hi = 0, len(self.levels)
+        for level, value in enumerate(prefix):
+            column = self.levels[lo:hi, level]
+            lo, hi = lo + np.searchsorted(column, value, side='left'), lo + np.searchsorted(column, value, side='right')
+            if lo == hi:
+                return int(lo), int(hi)
+        # leave out a leaf whose path is exactly the prefix (padded with 0)
+        lo += np.searchsorted(self.levels[lo:hi, d], 1, side='left')
+        return int(lo), int(hi)
+
+    def get_rows(self, cluster):
+        """:returns: array of the row numbers (in the original order) of the nodes in a cluster"""
+        start, end = self.cluster_range(cluster)
+        return self.order[start:end]
+
+    def _groups(self, depth):
+        """Split the sorted rows into runs with the same first `depth` levels
+
+        :returns: (starts, is_cluster): the start row of every run (the runs cover all rows),
+                  and whether each run is a cluster (rather than leaves at this depth or above)
+
+        """
+        prefix = self.levels[:, :depth]
+        is_start = np.ones(len(prefix), dtype=bool)
+        is_start[1:] = (prefix[1:] != prefix[:-1]).any(axis=1)
+        starts = np.flatnonzero(is_start)
+        return starts, self.depth[starts] > depth
+
+    def cluster_ranges(self, depth=1):
+        """Find the row ranges of every cluster at a given depth, in one pass
+
+        :depth: depth of the clusters (1 for top-level clusters)
+        :returns: (clusters, starts, ends): clusters is an int64 array (num_clusters x depth) of cluster levels.
+                  The members of cluster i are self.order[starts[i]:ends[i]]
+
+        """
+        if depth < 1 or depth >= self.max_depth or len(self.levels) == 0:
+            return np.zeros((0, depth), dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        starts, is_cluster = self._groups(depth)
+        ends = np.append(starts[1:], len(self.levels))
+        starts, ends = starts[is_cluster], ends[is_cluster]
+        return self.levels[starts, :depth], starts, ends
+
+    def cluster_stats(self, flow, depth=1):
+        """Compute statistics for every cluster at a given depth, with vectorized reductions over the sorted rows
+
+        :flow: array of the flow of each row (in the original order)
+        :depth: depth of the clusters (1 for top-level clusters)
+        :returns: dictionary of arrays, one item per cluster:
+                  clusters (num_clusters x depth levels), num_nodes, flow (total), max_flow,
+                  max_flow_row (row number, in the original order, of the node with the most flow),
+                  subtree_depth (number of levels below the cluster)
+
+        """
+        if depth < 1 or depth >= self.max_depth or len(self.levels) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return {'clusters': np.zeros((0, depth), dtype=np.int64), 'num_nodes': empty, 'flow': np.zeros(0),
+                    'max_flow': np.zeros(0), 'max_flow_row': empty, 'subtree_depth': empty}
+        flow = np.asarray(flow, dtype=np.float64)[self.order]
+        starts, is_cluster = self._groups(depth)
+        counts = np.diff(np.append(starts, len(flow)))
+        total = np.add.reduceat(flow, starts)
+        max_flow = np.maximum.reduceat(flow, starts)
+        # first row in each group that has the group's maximum flow
+        group = np.repeat(np.arange(len(starts)), counts)
+        is_max = np.flatnonzero(flow == max_flow[group])
+        first = np.unique(group[is_max], return_index=True)[1]
+        max_flow_pos = is_max[first]
+        subtree_depth = np.maximum.reduceat(self.depth, starts) - depth
+        return {
+            'clusters': self.levels[starts[is_cluster], :depth],
+            'num_nodes': counts[is_cluster],
+            'flow': total[is_cluster],
+            'max_flow': max_flow[is_cluster],
+            'max_flow_row': self.order[max_flow_pos[is_cluster]],
+            'subtree_depth': subtree_depth[is_cluster],
+        }
+
+    def top_k(self, flow, k=10, depth=1):
+        """Find the k nodes with the most flow in every cluster at a given depth
+
+        :flow: array of the flow of each row (in the original order)
+        :k: number of nodes per cluster
+        :depth: depth of the clusters (1 for top-level clusters)
+        :returns: (cluster_index, rank, rows): for each selected node, the index of its cluster
+                  (into the arrays returned by cluster_ranges()), its rank within the cluster (0 for the most flow),
+                  and its row number in the original order
+
+        """
+        clusters, starts, ends = self.cluster_ranges(depth)
+        counts = ends - starts
+        cluster_index = np.repeat(np.arange(len(starts)), counts)
+        pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        flow = np.asarray(flow, dtype=np.float64)[self.order[pos]]
+        # sort by cluster, then by flow (descending). ties keep hierarchical order
+        sorter = np.lexsort((-flow, cluster_index))
+        pos, cluster_index = pos[sorter], cluster_index[sorter]
+        rank = np.arange(len(pos)) - np.repeat(np.cumsum(counts) - counts, counts)
+        keep = rank < k
+        return cluster_index[keep], rank[keep], self.order[pos[keep]]
+
+    def cluster_codes(self, depth=1):
+        """Assign every row to its cluster at a given depth
+
+        A node whose path is not deeper than `depth` is assigned to its deepest cluster
+        (e.g., at depth 2, the node '1:3' is assigned to cluster '1').
+
+        :depth: depth of the clusters (1 for top-level clusters)
+        :returns: (codes, clusters): codes is an int64 array of cluster codes, one per row (in the original order),
+                  and clusters is a list of the cluster names, indexed by code, in hierarchical order
+
+        """
+        n = len(self.levels)
+        if n == 0 or depth < 1:
+            return np.zeros(n, dtype=np.int64), []
+        depth = min(depth, self.max_depth)
+        prefix = self.levels[:, :depth].copy()
+        prefix[np.arange(depth) >= (self.depth - 1)[:, np.newaxis]] = 0
+        # pack each prefix into one int64 (mixed radix), which keeps the lexicographic order, if it fits
+        radix = prefix.max(axis=0) + 1
+        if np.sum(np.log2(radix.astype(np.float64))) < 62:
+            multipliers = np.r_[np.cumprod(radix[::-1])[::-1][1:], 1]
+            keys, inverse = np.unique(prefix.dot(multipliers), return_inverse=True)
+            uniques = keys[:, np.newaxis] // multipliers % radix
+        else:
+            uniques, inverse = np.unique(prefix, axis=0, return_inverse=True)
+        codes = np.empty(n, dtype=np.int64)
+        codes[self.order] = inverse.ravel()
+        clusters = [self.format_cluster(x for x in cluster if x != 0) for cluster in uniques.tolist()]
+        return codes, clusters
+
+    def format_cluster(self, levels):
+        """Format a sequence of levels as a cluster name, e.g. (1, 2) -> '1:2'"""
+        return self.cluster_sep.join(str(x) for x in levels)
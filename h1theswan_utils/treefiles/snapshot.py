@@ -0,0 +1,139 @@
+"""
+Binary snapshots of parsed treefiles.
+
+A snapshot is a directory of columnar arrays:
+    meta.json       the source file's path, size and mtime, and the parse options
+    flow.npy        float64
+    node.npy        int64 (if the treefile has a node column)
+    path.txt        the paths, joined with newlines
+    name.txt        the names, joined with newlines
+
+The numeric columns are memory-mapped when the snapshot is loaded.
+A snapshot is only used if the source file's size and mtime and the parse options match;
+otherwise it is stale and gets rebuilt.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from tempfile import mkdtemp
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+logger = logging.getLogger('__main__').getChild(__name__)
+
+SNAPSHOT_VERSION = 2
+
+
+def snapshot_path(fname, cache_dir=None):
+    """Location of the snapshot for a treefile: next to the treefile, or in cache_dir if given
+
+    :returns: directory name for the snapshot
+
+    """
+    if cache_dir is None:
+        return fname + '.snapshot'
+    abspath = os.path.abspath(fname)
+    key = hashlib.sha1(abspath.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, '{}-{}.snapshot'.format(os.path.basename(fname), key))
+
+def _source_meta(fname, options):
+    st = os.stat(fname)
+    return {
+        'version': SNAPSHOT_VERSION,
+        'source': os.path.abspath(fname),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'options': options,
+    }
+
+def _write_strings(fname, values):
+    with open(fname, 'w', encoding='utf-8', newline='\n') as outf:
+        outf.write('\n'.join(values))
+
+def _read_strings(fname, num_rows):
+    if num_rows == 0:
+        return []
+    with open(fname, 'r', encoding='utf-8', newline='\n') as f:
+        return f.read().split('\n')
+
+def write_snapshot(df, fname, options=None, cache_dir=None):
+    """Write a snapshot of a parsed treefile
+
+    The snapshot is written to a temporary directory first and then moved into place,
+    so a concurrent reader never sees a partial snapshot.
+
+    :df: DataFrame from read_treefile()
+    :fname: filename of the source treefile
+    :options: dictionary of the parse options (part of the cache key)
+    :cache_dir: (optional) directory for the snapshot, e.g. if the treefile is in a read-only location
+    :returns: directory name of the snapshot, or None if it could not be written
+
+    """
+    path = snapshot_path(fname, cache_dir=cache_dir)
+    meta = _source_meta(fname, options or {})
+    meta['columns'] = df.columns.tolist()
+    meta['num_rows'] = len(df)
+    parent = os.path.dirname(os.path.abspath(path))
+    try:
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        tmp_path = mkdtemp(dir=parent, prefix='.tmp-snapshot-')
+    except (IOError, OSError) as e:
+        logger.debug("could not write treefile snapshot to {}: {}".format(path, e))
+        return None
+    try:
+        np.save(os.path.join(tmp_path, 'flow.npy'), df['flow'].to_numpy(dtype=np.float64))
+        if 'node' in df.columns:
+            np.save(os.path.join(tmp_path, 'node.npy'), df['node'].to_numpy(dtype=np.int64))
+        _write_strings(os.path.join(tmp_path, 'path.txt'), df['path'].tolist())
+        _write_strings(os.path.join(tmp_path, 'name.txt'), df['name'].tolist())
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as outf:
+            json.dump(meta, outf)
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.debug("could not write treefile snapshot to {}: {}".format(path, e))
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return None
+    logger.debug("wrote treefile snapshot to {}".format(path))
+    return path
+
+def load_snapshot(fname, options=None, cache_dir=None, mmap=True):
+    """Load the snapshot of a treefile, if there is one and it is up to date
+
+    :fname: filename of the source treefile
+    :options: dictionary of the parse options. Must match the options the snapshot was written with
+    :cache_dir: (optional) directory for the snapshot
+    :mmap: memory-map the numeric columns
+    :returns: DataFrame, or None if there is no up-to-date snapshot
+
+    """
+    path = snapshot_path(fname, cache_dir=cache_dir)
+    try:
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        expected = _source_meta(fname, options or {})
+        if any(meta.get(k) != v for k, v in expected.items()):
+            logger.debug("treefile snapshot {} is stale".format(path))
+            return None
+        mmap_mode = 'r' if mmap is True else None
+        num_rows = meta['num_rows']
+        columns = {
+            'path': _read_strings(os.path.join(path, 'path.txt'), num_rows),
+            'flow': np.load(os.path.join(path, 'flow.npy'), mmap_mode=mmap_mode),
+            'name': _read_strings(os.path.join(path, 'name.txt'), num_rows),
+        }
+        if 'node' in meta['columns']:
+            columns['node'] = np.load(os.path.join(path, 'node.npy'), mmap_mode=mmap_mode)
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    if any(len(values) != num_rows for values in columns.values()):
+        return None
+    return pd.DataFrame(columns, columns=meta['columns'], copy=False)
@@ -1,5 +1,147 @@
-import pandas as pd
-import numpy as np
+import csv
+import os
+import shutil
+from io import BytesIO
+from tempfile import mkdtemp
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+multiprocessing = LazyModule('multiprocessing')
+
+from ..io_utils import line_aligned_byte_ranges, open_byte_range, skip_lines_starting_with
+from .hierarchy import HierarchyIndex
+from .snapshot import load_snapshot, write_snapshot
+
+TREEFILE_COLUMNS = ['path', 'flow', 'name', 'node']
+# target number of bytes per range for the 'parallel' engine
+PARALLEL_SHARD_SIZE = 2**27
+
+def _count_treefile_fields(f, comment_char="#", field_sep=" "):
+    """Count the fields in the first data line of a treefile opened in binary mode, then go back to where we started"""
+    pos = f.tell()
+    try:
+        for line in f:
+            line = line.decode('utf-8').strip()
+            if line and line[0] != comment_char:
+                return len(next(csv.reader([line], delimiter=field_sep, quotechar='"')))
+        return 0
+    finally:
+        f.seek(pos)
+
+def _read_treefile_csv(f, columns, comment_char="#", field_sep=" ", chunksize=1000000):
+    """Parse treefile rows with known columns into a DataFrame (see read_treefile())
+
+    Only lines that start with comment_char are comments. pandas' comment option would also cut a line
+    at a comment_char in the middle (e.g., in a name), so the comment lines are dropped from the stream instead.
+    """
+    dtype = {'path': str, 'flow': np.float64, 'name': str, 'node': np.int64}
+    if comment_char:
+        f = skip_lines_starting_with(f, comment_char)
+    try:
+        reader = pd.read_csv(f,
+                            sep=field_sep,
+                            header=None,
+                            names=columns,
+                            usecols=list(range(len(columns))),
+                            dtype={col: dtype[col] for col in columns},
+                            quotechar='"',
+                            na_filter=False,
+                            chunksize=chunksize)
+        chunks = list(reader)
+    except pd.errors.EmptyDataError:
+        chunks = []
+    if len(chunks) == 0:
+        return pd.DataFrame({col: pd.Series([], dtype=dtype[col]) for col in columns})
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+def read_treefile(f, comment_char="#", field_sep=" ", chunksize=1000000):
+    """Read a treefile in chunks, straight into typed columns
+
+    :f: filename, or file object opened in binary mode
+    :comment_char: lines starting with this character are skipped
+    :field_sep: field separator (a single character)
+    :chunksize: number of rows to parse at a time
+    :returns: pandas DataFrame with columns path (str), flow (float64), name (str), and node (int64, if the treefile has it)
+
+    Names may be quoted with double quotes, and may contain the field separator if they are.
+
+    """
+    if not hasattr(f, 'read'):
+        with open(f, 'rb') as fh:
+            return read_treefile(fh, comment_char=comment_char, field_sep=field_sep, chunksize=chunksize)
+    num_fields = min(_count_treefile_fields(f, comment_char=comment_char, field_sep=field_sep), len(TREEFILE_COLUMNS))
+    if num_fields == 0:
+        return pd.DataFrame({'path': pd.Series([], dtype=str), 'flow': pd.Series([], dtype=np.float64), 'name': pd.Series([], dtype=str)})
+    return _read_treefile_csv(f, TREEFILE_COLUMNS[:num_fields], comment_char=comment_char, field_sep=field_sep, chunksize=chunksize)
+
+def _parse_treefile_shard(args):
+    """Worker for read_treefile_parallel(): parse one byte range of a treefile.
+    Saves the numeric columns to the shard directory.
+
+    :returns: (number of rows, paths joined with newlines, names joined with newlines)
+    """
+    fname, start, end, columns, comment_char, field_sep, chunksize, shard_prefix = args
+    with open_byte_range(fname, start, end) as f:
+        df = _read_treefile_csv(f, columns, comment_char=comment_char, field_sep=field_sep, chunksize=chunksize)
+    np.save(shard_prefix + '.flow.npy', df['flow'].to_numpy(dtype=np.float64))
+    if 'node' in columns:
+        np.save(shard_prefix + '.node.npy', df['node'].to_numpy(dtype=np.int64))
+    return len(df), '\n'.join(df['path'].tolist()), '\n'.join(df['name'].tolist())
+
+def read_treefile_parallel(fname, comment_char="#", field_sep=" ", chunksize=1000000, processes=None, temp_dir=None):
+    """Read a treefile in parallel. The result is identical to read_treefile()
+
+    The file is split into byte ranges aligned to line boundaries, and each range is parsed in a process pool.
+    The numeric columns of each range are saved to a temporary directory, and concatenated
+    from memory-mapped files; the paths and names come back from the workers as one string per range.
+
+    :fname: filename for the treefile
+    :processes: number of worker processes. Default: number of CPUs
+    :temp_dir: directory for the temporary files
+    :returns: pandas DataFrame (see read_treefile())
+
+    """
+    if not isinstance(fname, str):
+        raise ValueError("the 'parallel' engine needs a filename, not a file object")
+    processes = processes or multiprocessing.cpu_count()
+    with open(fname, 'rb') as f:
+        num_fields = min(_count_treefile_fields(f, comment_char=comment_char, field_sep=field_sep), len(TREEFILE_COLUMNS))
+    if num_fields == 0:
+        return read_treefile(fname, comment_char=comment_char, field_sep=field_sep)
+    columns = TREEFILE_COLUMNS[:num_fields]
+    size = os.path.getsize(fname)
+    num_shards = max(processes, size // PARALLEL_SHARD_SIZE + 1)
+    byte_ranges = line_aligned_byte_ranges(fname, num_shards)
+
+    shard_dir = mkdtemp(dir=temp_dir)
+    try:
+        shard_prefixes = [os.path.join(shard_dir, 'shard{:06d}'.format(i)) for i in range(len(byte_ranges))]
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_parse_treefile_shard,
+                                [(fname, a, b, columns, comment_char, field_sep, chunksize, prefix) for (a, b), prefix in zip(byte_ranges, shard_prefixes)],
+                                chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        nonempty = [i for i, result in enumerate(results) if result[0] > 0]
+        data = {
+            'path': '\n'.join(results[i][1] for i in nonempty).split('\n') if nonempty else [],
+            'flow': np.concatenate([np.load(shard_prefixes[i] + '.flow.npy', mmap_mode='r') for i in nonempty] or [np.zeros(0)]),
+            'name': '\n'.join(results[i][2] for i in nonempty).split('\n') if nonempty else [],
+        }
+        if 'node' in columns:
+            data['node'] = np.concatenate([np.load(shard_prefixes[i] + '.node.npy', mmap_mode='r') for i in nonempty] or [np.zeros(0, dtype=np.int64)])
+        del results
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    if not nonempty:
+        return _read_treefile_csv(BytesIO(), columns)
+    return pd.DataFrame(data, columns=columns)
 
 class Treefile(object):
 
@@ -9,25 +151,59 @@ class Treefile(object):
                 fname=None,
                 comment_char="#",
                 field_sep=" ",
-                cluster_sep=":"):
+                cluster_sep=":",
+                engine='columnar',
+                chunksize=1000000,
+                cache=False,
+                cache_dir=None,
+                processes=None):
         """
         :fname: filename for the treefile
+        :engine: 'columnar' (default) parses the treefile in chunks straight into the typed columns of a DataFrame.
+                 'parallel' does the same in a process pool (see read_treefile_parallel()), with the same result.
+                 'python' parses it line by line into a list of dictionaries (self.d).
+                 With the other engines, self.d is still available: it is built from self.df the first time it is used
+        :chunksize: number of rows to parse at a time with the 'columnar' and 'parallel' engines
+        :cache: if True, keep a binary snapshot of the parsed treefile (see snapshot.py) and load it instead of
+                re-parsing, as long as the treefile's size and mtime have not changed ('columnar' and 'parallel' engines)
+        :cache_dir: (optional) directory for snapshots. Default: next to the treefile
+        :processes: number of worker processes for the 'parallel' engine. Default: number of CPUs
         """
 
         self.fname = fname
         self.comment_char = comment_char
         self.field_sep = field_sep
         self.cluster_sep = cluster_sep
+        self.engine = engine
+        self.chunksize = chunksize
+        self.cache = cache
+        self.cache_dir = cache_dir
+        self.processes = processes
 
         self.d = None
         self.df = None
         self.top_cluster_counts = None
+        self.hierarchy = None
+
+    @property
+    def d(self):
+        """The rows as a list of dictionaries. With the 'columnar' and 'parallel' engines, built from self.df on first use"""
+        if self._d is None and self.df is not None and self.engine in ['columnar', 'parallel']:
+            self._d = self.df.to_dict('records')
+        return self._d
+
+    @d.setter
+    def d(self, d):
+        self._d = d
 
     def parse(self, fname=None):
         """Parse the treefile
 
+        With the 'columnar' and 'parallel' engines, the rows are loaded straight into a DataFrame (self.df),
+        without building a list of dictionaries (self.d builds it from self.df when it is used).
+
         :fname: filename for the treefile
-        :returns: list of dictionaries. each item in the list is a row in the treefile
+        :returns: list of dictionaries ('python' engine; each item in the list is a row in the treefile) or pandas DataFrame ('columnar' and 'parallel' engines)
 
         """
 
@@ -36,6 +212,24 @@ class Treefile(object):
         else:
             fname = self.fname
 
+        self.hierarchy = None
+        if self.engine in ['columnar', 'parallel']:
+            self.d = None
+            snapshot_options = {'comment_char': self.comment_char, 'field_sep': self.field_sep}
+            if self.cache is True:
+                self.df = load_snapshot(fname, options=snapshot_options, cache_dir=self.cache_dir)
+                if self.df is not None:
+                    return self.df
+            if self.engine == 'parallel':
+                self.df = read_treefile_parallel(fname, comment_char=self.comment_char, field_sep=self.field_sep, chunksize=self.chunksize, processes=self.processes)
+            else:
+                self.df = read_treefile(fname, comment_char=self.comment_char, field_sep=self.field_sep, chunksize=self.chunksize)
+            if self.cache is True:
+                write_snapshot(self.df, fname, options=snapshot_options, cache_dir=self.cache_dir)
+            return self.df
+        elif self.engine != 'python':
+            raise ValueError("unknown engine: {}. engine must be one of 'columnar', 'parallel', 'python'".format(self.engine))
+
         d = []
         with open(fname, 'r') as f:
             for line in f:
@@ -50,18 +244,129 @@ class Treefile(object):
                     this_row['node'] = int(line[3])
                 d.append(this_row)
         self.d = d
+        return self.d
 
     def load_df(self):
         """load treefile as a pandas dataframe
         :returns: pandas dataframe
 
         """
+        if self.engine in ['columnar', 'parallel']:
+            if self.df is None:
+                self.parse()
+            return self.df
+
         if not self.d:
             self.parse()
 
         self.df = pd.DataFrame(self.d)
+        self.hierarchy = None
         return self.df
 
+    def build_hierarchy_index(self, df=None):
+        """Build the hierarchy index (see HierarchyIndex) used for cluster queries
+
+        :returns: HierarchyIndex
+
+        """
+        if df is None:
+            df = self.df
+        if df is None:  # if it's still not there, load it (parsing the treefile if necessary)
+            df = self.load_df()
+        self.hierarchy = HierarchyIndex(df['path'].tolist(), cluster_sep=self.cluster_sep)
+        return self.hierarchy
+
+    def _get_hierarchy(self):
+        if self.df is None:
+            self.load_df()
+        if self.hierarchy is None or len(self.hierarchy.order) != len(self.df):
+            self.build_hierarchy_index()
+        return self.hierarchy
+
+    def get_cluster_memberships(self, depth=1, column='name'):
+        """get the members of every cluster at a given depth, in one go
+
+        :depth: depth of the clusters (1 for top-level clusters)
+        :column: column of the dataframe to return for the members (e.g., 'name' or 'node')
+        :returns: dictionary: cluster name (e.g., '1:2') -> array of the members' values
+
+        """
+        hierarchy = self._get_hierarchy()
+        values = self.df[column].to_numpy()[hierarchy.order]
+        clusters, starts, ends = hierarchy.cluster_ranges(depth)
+        return {hierarchy.format_cluster(cluster): values[start:end] for cluster, start, end in zip(clusters.tolist(), starts, ends)}
+
+    def get_node_cluster_codes(self, depth=1):
+        """map node ids to integer cluster codes at a given depth
+
+        Nodes whose path is not deeper than `depth` are assigned to their deepest cluster.
+        Requires the treefile's node column.
+
+        :depth: depth of the clusters (1 for top-level clusters)
+        :returns: (node_codes, clusters): node_codes is an int64 array indexed by node id, with the cluster code
+                  of each node (-1 for ids that are not in the treefile), and clusters is a list of the cluster names, indexed by code
+
+        """
+        hierarchy = self._get_hierarchy()
+        if 'node' not in self.df.columns:
+            raise RuntimeError("the treefile does not have a node column")
+        codes, clusters = hierarchy.cluster_codes(depth)
+        nodes = self.df['node'].to_numpy()
+        node_codes = np.full(int(nodes.max()) + 1 if len(nodes) else 0, -1, dtype=np.int64)
+        node_codes[nodes] = codes
+        return node_codes, clusters
+
+    def get_cluster_stats(self, depth=None):
+        """get statistics for every cluster, computed with vectorized reductions over the hierarchy index
+
+        :depth: depth of the clusters (1 for top-level clusters). Default: every depth
+        :returns: pandas DataFrame with one row per cluster and columns:
+                  cluster (e.g., '1:2'), depth, num_nodes, flow (total flow), max_flow_name (name of the node with the most flow),
+                  max_flow, subtree_depth (number of levels below the cluster)
+
+        """
+        hierarchy = self._get_hierarchy()
+        depths = range(1, hierarchy.max_depth) if depth is None else [depth]
+        names = self.df['name'].to_numpy()
+        flow = self.df['flow'].to_numpy()
+        frames = []
+        for this_depth in depths:
+            stats = hierarchy.cluster_stats(flow, depth=this_depth)
+            frames.append(pd.DataFrame({
+                'cluster': [hierarchy.format_cluster(cluster) for cluster in stats['clusters'].tolist()],
+                'depth': this_depth,
+                'num_nodes': stats['num_nodes'],
+                'flow': stats['flow'],
+                'max_flow_name': names[stats['max_flow_row']],
+                'max_flow': stats['max_flow'],
+                'subtree_depth': stats['subtree_depth'],
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['cluster', 'depth', 'num_nodes', 'flow', 'max_flow_name', 'max_flow', 'subtree_depth'])
+        return pd.concat(frames, ignore_index=True)
+
+    def get_top_nodes_by_flow(self, k=10, depth=1, column='name'):
+        """get the k nodes with the most flow in every cluster at a given depth
+
+        :k: number of nodes per cluster
+        :depth: depth of the clusters (1 for top-level clusters)
+        :column: column of the dataframe to return for the nodes (e.g., 'name' or 'node')
+        :returns: pandas DataFrame with columns cluster, rank (0 for the most flow), <column>, flow.
+                  Sorted by cluster, then by flow (descending)
+
+        """
+        hierarchy = self._get_hierarchy()
+        clusters, starts, ends = hierarchy.cluster_ranges(depth)
+        cluster_names = np.array([hierarchy.format_cluster(cluster) for cluster in clusters.tolist()], dtype=object)
+        flow = self.df['flow'].to_numpy()
+        cluster_index, rank, rows = hierarchy.top_k(flow, k=k, depth=depth)
+        return pd.DataFrame({
+            'cluster': cluster_names[cluster_index],
+            'rank': rank,
+            column: self.df[column].to_numpy()[rows],
+            'flow': flow[rows],
+        })
+
     def add_top_cluster_column_to_df(self, df=None):
         if df is None:
             df = self.df
@@ -85,23 +390,27 @@ class Treefile(object):
     def get_nodes_for_cluster(self, cluster_name=None, df=None):
         """get a list of the node names for one cluster
 
+        Uses the hierarchy index (built on first use), so each query is a binary search plus a slice.
+        The names are returned in hierarchical order, which is file order for treefiles written by Infomap.
+
+        :cluster_name: cluster name, e.g. '1' (top-level cluster) or '1:2'
+        :df: (optional) dataframe to search instead of this treefile's dataframe (scans the dataframe)
         :returns: list of node names
 
         """
         if cluster_name is None:
             raise RuntimeError("must specify cluster_name")
 
-        # TODO: could reimplement this so it doesn't use pandas. might be more efficient
-        if df is None:
-            df = self.df
-        if df is None:  # if it's still not there, load it (parsing the treefile if necessary)
-            df = self.load_df()
+        if df is None or df is self.df:
+            # use the hierarchy index: binary search for the cluster's rows
+            hierarchy = self._get_hierarchy()
+            return self.df['name'].take(hierarchy.get_rows(cluster_name)).tolist()
 
         if self.cluster_sep not in str(cluster_name):
             # assume this is a top-level cluster
             if 'top_cluster' not in df.columns:
-                self.df = add_top_cluster_column_to_df(df=df)
-            subset = df[df['top_cluster']==cluster_name]
+                df = self.add_top_cluster_column_to_df(df=df)
+            subset = df[df['top_cluster']==str(cluster_name)]
 
         else:
             # make sure the cluster separator is the last character in cluster_name
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from .context import h1theswan_utils
+
+import filecmp
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+from benchmarks import generators
+from benchmarks.run import run_benchmark, compare_results
+from benchmarks.suite import get_benchmark
+from h1theswan_utils.network_data import edgelist_to_pajek, iter_pajek_edges
+from h1theswan_utils.treefiles import Treefile
+
+
+class BenchmarkTestSuite(unittest.TestCase):
+    """Benchmark data generator and runner test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def fname(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def test_generators_are_reproducible(self):
+        for name, write in [('edgelist.tsv', generators.write_scale_free_edgelist),
+                            ('network.net', generators.write_scale_free_pajek),
+                            ('clusters.tree', generators.write_treefile)]:
+            write(self.fname('a-' + name), 5000, seed=3)
+            write(self.fname('b-' + name), 5000, seed=3)
+            write(self.fname('c-' + name), 5000, seed=4)
+            self.assertTrue(filecmp.cmp(self.fname('a-' + name), self.fname('b-' + name), shallow=False))
+            self.assertFalse(filecmp.cmp(self.fname('a-' + name), self.fname('c-' + name), shallow=False))
+
+    def test_generated_networks(self):
+        generators.write_scale_free_edgelist(self.fname('edgelist.tsv'), 20000, chunksize=3000)
+        pjk = edgelist_to_pajek(self.fname('edgelist.tsv'), engine='pandas')
+        self.assertEqual(pjk.edge_count, 20000)
+        self.assertLessEqual(len(pjk.ids), 2000)
+
+        generators.write_scale_free_pajek(self.fname('network.net'), 20000, chunksize=3000)
+        edges = np.concatenate([chunk for chunk in iter_pajek_edges(self.fname('network.net'))])
+        self.assertEqual(len(edges), 20000)
+        self.assertTrue((edges >= 1).all() and (edges <= 2000).all())
+        # scale-free: the highest degree is far above the mean
+        degrees = np.bincount(edges.ravel())
+        self.assertGreater(degrees.max(), 10 * degrees[1:].mean())
+
+    def test_generated_treefile(self):
+        generators.write_treefile(self.fname('clusters.tree'), 20000)
+        t = Treefile(self.fname('clusters.tree'))
+        df = t.load_df()
+        self.assertEqual(len(df), 20000)
+        self.assertAlmostEqual(df['flow'].sum(), 1.0, places=4)
+        self.assertEqual(sorted(df['node']), list(range(1, 20001)))
+        # the rows are in hierarchical order
+        self.assertTrue((t._get_hierarchy().order == np.arange(20000)).all())
+        self.assertGreater(len(t.get_cluster_stats(depth=1)), 10)
+
+    def test_autoid_benchmarks(self):
+        lengths = []
+        for name in ['AutoID', 'CompactAutoID', 'AutoID.get_ids', 'CompactAutoID.get_ids']:
+            bench = get_benchmark(name)(2000, self.tempdir)
+            bench.setup()
+            bench.run()
+            lengths.append(len(bench.ids))
+        self.assertEqual(len(set(lengths)), 1)
+        self.assertGreater(lengths[0], 100)
+
+    def test_run_benchmark(self):
+        r = run_benchmark('Treefile.parse', 2000, data_dir=self.tempdir)
+        self.assertEqual((r['benchmark'], r['size'], r['num_elements'], r['unit']), ('Treefile.parse', 2000, 2000, 'nodes'))
+        self.assertGreater(r['throughput'], 0)
+        self.assertGreater(r['peak_rss_mb'], 0)
+
+        baseline = {('Treefile.parse', 2000): dict(r, throughput=r['throughput'] * 2)}
+        self.assertEqual(len(compare_results([r], baseline)), 1)
+        baseline = {('Treefile.parse', 2000): dict(r, peak_rss_mb=r['peak_rss_mb'] / 2)}
+        self.assertEqual(len(compare_results([r], baseline)), 1)
+        self.assertEqual(compare_results([r], {('Treefile.parse', 2000): r}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
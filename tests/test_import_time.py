@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from .context import h1theswan_utils
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# seconds to import all of the subpackages in a fresh interpreter (about 0.07 on a laptop)
+IMPORT_TIME_BUDGET = 0.5
+
+# these are loaded on first use, not on import
+LAZY_MODULES = ['numpy', 'pandas', 'requests', 'six', 'sqlite3', 'concurrent.futures', 'multiprocessing']
+
+IMPORT_SCRIPT = """
+import json, logging, sys, time
+start = time.perf_counter()
+import h1theswan_utils.network_data, h1theswan_utils.treefiles, h1theswan_utils.microsoft_academic_api
+elapsed = time.perf_counter() - start
+from h1theswan_utils.microsoft_academic_api.config import MAGConf
+try:
+    MAGConf.SUBSCRIPTION_KEY
+    key_error = None
+except RuntimeError as e:
+    key_error = str(e)
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': [m for m in %r if m in sys.modules],
+    'root_handlers': len(logging.getLogger().handlers),
+    'key_error': key_error,
+}))
+""" % (LAZY_MODULES, )
+
+
+def run_import_script():
+    env = dict(os.environ)
+    env.pop('MICROSOFT_ACADEMIC_KEY', None)
+    env['PYTHONPATH'] = REPO_ROOT
+    out = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT], env=env, cwd=REPO_ROOT)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+class ImportTestSuite(unittest.TestCase):
+    """Package import test cases."""
+
+    def test_import_is_lazy(self):
+        result = run_import_script()
+        self.assertEqual(result['loaded'], [])
+        # importing the package does not configure logging
+        self.assertEqual(result['root_handlers'], 0)
+        # the subscription key is only needed when a query is sent
+        self.assertIn('MICROSOFT_ACADEMIC_KEY', result['key_error'])
+
+    def test_import_time_budget(self):
+        # best of a few runs, to smooth over a busy machine
+        elapsed = min(run_import_script()['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET)
+
+    def test_lazy_module(self):
+        from h1theswan_utils.lazy import LazyModule
+        json_lazy = LazyModule('json')
+        self.assertIn('not loaded', repr(json_lazy))
+        self.assertEqual(json_lazy.dumps([1]), '[1]')
+        self.assertIs(json_lazy.loads, json.loads)
+
+
+if __name__ == '__main__':
+    unittest.main()
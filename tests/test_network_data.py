@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+from .context import h1theswan_utils
+
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from io import StringIO
+from tempfile import NamedTemporaryFile, mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from h1theswan_utils.network_data import (PajekFactory, edgelist_to_pajek, extract_subgraph_from_pajek,
+                                            extract_subgraph_from_pajek_and_write_to_pajek, extract_subgraphs_from_pajek_and_write_to_pajek,
+                                            pajek_to_csr, pajekfactory_to_csr,
+                                            PajekIndex, iter_pajek_edges, pajek_edge_byte_ranges, get_pajek_vertex_names,
+                                            aggregate_cluster_edges, cluster_graph_from_pajek)
+from h1theswan_utils.network_data.AutoID import AutoID, CompactAutoID
+from h1theswan_utils.io_utils import open_byte_range
+
+
+def write_pajek_to_string(pjk):
+    outf = StringIO()
+    pjk.write(outf)
+    return outf.getvalue()
+
+
+class AutoIDTestSuite(unittest.TestCase):
+    """AutoID test cases."""
+
+    def test_compact_matches_autoid(self):
+        names = ['a', 'b', u'ç', 'a', 'c', 'b'] + ['n{}'.format(i) for i in range(5000)]
+        ids = AutoID(first_id=1)
+        compact = CompactAutoID(first_id=1)
+        for name in names:
+            self.assertEqual(ids[name], compact[name])
+        self.assertEqual(len(ids), len(compact))
+        self.assertEqual(dict(ids.items()), dict(compact.items()))
+        for id in (1, 3, len(compact)):
+            self.assertEqual(ids.lookup_id(id), compact.lookup_id(id))
+        self.assertIn('n42', compact)
+        self.assertNotIn('missing', compact)
+        self.assertGreater(compact.bytes_per_node(), 0)
+
+    def test_get_ids(self):
+        batches = [['a', 'b', 'a', 5, b'c'], [], ['5', u'ç', 'c', 'd'], ['n{}'.format(i) for i in range(5000)] + ['d', 'e']]
+        ids = AutoID(first_id=1)
+        compact = CompactAutoID(first_id=1, capacity=8)
+        compact_one_at_a_time = CompactAutoID(first_id=1, capacity=8)
+        for names in batches:
+            expected = [ids[name.decode('utf-8') if isinstance(name, bytes) else str(name)] for name in names]
+            self.assertEqual(compact.get_ids(names).tolist(), expected)
+            self.assertEqual([compact_one_at_a_time[name] for name in names], expected)
+            self.assertEqual(ids.get_ids(names[:2]).tolist(), expected[:2])
+        self.assertEqual(list(compact.keys()), list(ids.keys()))
+        self.assertLess(compact.bytes_per_node(), 40)
+        compact.extend(['x', 'y'])
+        self.assertEqual(compact['y'], len(ids) + 2)
+        with self.assertRaises(ValueError):
+            compact.extend(['z', 'a'])
+
+    def test_compact_pickle_across_hash_seeds(self):
+        # the hash table depends on the process's hash seed, so it has to be rebuilt when unpickled
+        script = ("import pickle, sys\n"
+                  "from h1theswan_utils.network_data.AutoID import CompactAutoID\n"
+                  "if sys.argv[1] == 'dump':\n"
+                  "    ids = CompactAutoID(first_id=1)\n"
+                  "    ids.extend(['alpha', 'beta', 'gamma'] + ['n{}'.format(i) for i in range(3000)])\n"
+                  "    sys.stdout.buffer.write(pickle.dumps(ids))\n"
+                  "else:\n"
+                  "    ids = pickle.loads(sys.stdin.buffer.read())\n"
+                  "    print('alpha' in ids, ids['gamma'], ids.get_ids(['n7', 'beta']).tolist(), len(ids))\n")
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        def run(arg, seed, data=None):
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=root)
+            return subprocess.run([sys.executable, '-c', script, arg], input=data, env=env, stdout=subprocess.PIPE, check=True).stdout
+        out = run('load', '2', run('dump', '1'))
+        self.assertEqual(out.decode('utf-8').strip(), 'True 3 [11, 2] 3003')
+
+    def test_compact_finalize(self):
+        compact = CompactAutoID()
+        compact['a']
+        compact.finalize()
+        self.assertEqual(compact['a'], 0)
+        with self.assertRaises(KeyError):
+            compact['b']
+        with self.assertRaises(KeyError):
+            compact.get_ids(['a', 'b'])
+
+    def test_pajek_factory_compact_ids(self):
+        edges = [('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'a')]
+        pjk = PajekFactory()
+        pjk_compact = PajekFactory(compact_ids=True)
+        for source, dest in edges:
+            pjk.add_edge(source, dest)
+            pjk_compact.add_edge(source, dest)
+        self.assertEqual(write_pajek_to_string(pjk), write_pajek_to_string(pjk_compact))
+
+
+class PajekFactoryTestSuite(unittest.TestCase):
+    """PajekFactory test cases."""
+
+    edges = [('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'a'), ('e', 'e'), ('b', 'f')]
+    weights = [1, 2.5, '3', 1, 0.1, 7]
+
+    def test_add_edges_matches_add_edge(self):
+        pjk = PajekFactory()
+        for source, dest in self.edges:
+            pjk.add_edge(source, dest)
+        pjk_bulk = PajekFactory()
+        sources, dests = zip(*self.edges)
+        pjk_bulk.add_edges(np.array(sources), iter(dests), batch_size=4)
+        self.assertEqual(write_pajek_to_string(pjk), write_pajek_to_string(pjk_bulk))
+
+    def test_add_edges_weighted(self):
+        pjk = PajekFactory(weighted=True)
+        for (source, dest), weight in zip(self.edges, self.weights):
+            pjk.add_edge(source, dest, weight=weight)
+        pjk_bulk = PajekFactory(weighted=True)
+        sources, dests = zip(*self.edges)
+        pjk_bulk.add_edges(sources, dests, weights=self.weights, batch_size=4)
+        self.assertEqual(write_pajek_to_string(pjk), write_pajek_to_string(pjk_bulk))
+
+    def test_add_edges_missing_names(self):
+        edges = [('a', None), (None, 'b'), ('b', np.nan), (np.nan, None), ('c', 'a')]
+        for weighted in (False, True):
+            pjk = PajekFactory(weighted=weighted)
+            for i, (source, dest) in enumerate(edges):
+                pjk.add_edge(source, dest, weight=i + 1 if weighted else 1)
+            pjk_bulk = PajekFactory(weighted=weighted)
+            sources, dests = zip(*edges)
+            pjk_bulk.add_edges(sources, dests, weights=list(range(1, 6)) if weighted else None, batch_size=3)
+            self.assertEqual(write_pajek_to_string(pjk), write_pajek_to_string(pjk_bulk))
+            self.assertIn('"None"', write_pajek_to_string(pjk_bulk))
+
+    def test_add_edges_mixed_types(self):
+        batches = [([5, 'a', '5', 1.0, True, 'b'], ['x', 5, 'y', 1, 'z', 'a']),
+                   (np.array([0.1, 0.2, 0.1], dtype=np.float32), np.array([1.5, 0.1, 2], dtype=np.float32)),
+                   ([None, np.nan, 'None', b'a'], ['a', None, 'nan', 'x'])]
+        for compact_ids in (False, True):
+            for sources, dests in batches:
+                pjk = PajekFactory(compact_ids=compact_ids)
+                for source, dest in zip(sources, dests):
+                    pjk.add_edge(source, dest)
+                pjk_bulk = PajekFactory(compact_ids=compact_ids)
+                pjk_bulk.add_edges(sources, dests, batch_size=4)
+                expected = write_pajek_to_string(pjk)
+                self.assertEqual(write_pajek_to_string(pjk_bulk), expected)
+                lines = expected.splitlines()
+                self.assertEqual(int(lines[0].split()[1]), lines.index('*Arcs {}'.format(len(sources))) - 1)
+                self.assertNotIn('0.10000000149011612', expected)
+        # names with the same text are one node with compact ids
+        pjk = PajekFactory(compact_ids=True)
+        pjk.add_edges(*batches[0])
+        self.assertEqual(len(pjk.ids), 9)
+
+    def test_add_edges_validation(self):
+        pjk = PajekFactory()
+        with self.assertRaises(ValueError):
+            pjk.add_edges(['a', 'b'], ['c'])
+        with self.assertRaises(ValueError):
+            pjk.add_edges(['a'], ['b'], weights=[2])
+
+
+class EdgelistToPajekTestSuite(unittest.TestCase):
+    """edgelist_to_pajek test cases."""
+
+    edgelist = "source\ttarget\tweight\na\tb\t1\nb\tc\t0.50\nc\ta\t2\nd\t007\t1\n007\tb\t3\n"
+
+    def test_pandas_engine_matches_python_engine(self):
+        for weighted in (False, True):
+            edgelist = self.edgelist
+            if weighted is False:
+                edgelist = '\n'.join(line.rsplit('\t', 1)[0] for line in edgelist.splitlines()) + '\n'
+            expected = write_pajek_to_string(edgelist_to_pajek(StringIO(edgelist), weighted=weighted))
+            pjk = edgelist_to_pajek(StringIO(edgelist), weighted=weighted, engine='pandas', chunksize=2)
+            self.assertEqual(write_pajek_to_string(pjk), expected)
+
+    def test_parallel_engine(self):
+        with NamedTemporaryFile('w', suffix='.tsv', delete=False) as f:
+            f.write(self.edgelist)
+        try:
+            expected = edgelist_to_pajek(f.name, weighted=True)
+            pjk = edgelist_to_pajek(f.name, weighted=True, engine='parallel', processes=2, first_seen=True)
+            self.assertEqual(write_pajek_to_string(pjk), write_pajek_to_string(expected))
+
+            # default numbering: vertices in sorted order of their names
+            pjk = edgelist_to_pajek(f.name, weighted=True, engine='parallel', processes=2)
+            self.assertEqual(list(pjk.ids.keys()), sorted(expected.ids.keys()))
+            def named_edges(pjk):
+                lines = write_pajek_to_string(pjk).splitlines()[len(pjk.ids) + 2:]
+                return [(pjk.ids.lookup_id(int(s)), pjk.ids.lookup_id(int(t)), w) for s, t, w in (line.split() for line in lines)]
+            self.assertEqual(named_edges(pjk), named_edges(expected))
+        finally:
+            os.remove(f.name)
+
+
+class SubgraphTestSuite(unittest.TestCase):
+    """Subgraph extraction test cases."""
+
+    pajek = '*Vertices 5\n1 "a"\n2 "b b"\n3 "c"\n4 "d"\n5 "e"\n*Arcs 6\n1 2\n2 3\n3 1\n4 1\n5 3\n3 2\n'
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.fname_pjk = os.path.join(self.tempdir, 'test.net')
+        with open(self.fname_pjk, 'w') as outf:
+            outf.write(self.pajek)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_extract_subgraph_from_pajek(self):
+        lines = extract_subgraph_from_pajek(self.fname_pjk, ['b b', 'c', 'e'])
+        self.assertEqual(lines['vertices'], ['1 "b b"\n', '2 "c"\n', '3 "e"\n'])
+        self.assertEqual(lines['edges'], ['1 2\n', '3 2\n', '2 1\n'])
+
+    def test_streaming_write(self):
+        outputs = []
+        for streaming in (False, True):
+            fname_out = os.path.join(self.tempdir, 'streaming_{}.net'.format(streaming))
+            extract_subgraph_from_pajek_and_write_to_pajek(self.fname_pjk, ['b b', 'c', 'e'], fname_out, streaming=streaming)
+            with open(fname_out) as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[1], '*vertices 3\n1 "b b"\n2 "c"\n3 "e"\n*arcs 3\n1 2\n3 2\n2 1\n')
+
+    def test_extract_many_subgraphs(self):
+        subsets = {'x': ['b b', 'c', 'e'], 'y': ['a', 'c', 'd'], 'z': ['nope']}
+        counts = extract_subgraphs_from_pajek_and_write_to_pajek(self.fname_pjk, subsets, os.path.join(self.tempdir, 'batch_{}.net'))
+        self.assertEqual(counts, {'x': (3, 3), 'y': (3, 2), 'z': (0, 0)})
+        for label, names in subsets.items():
+            fname_single = os.path.join(self.tempdir, 'single_{}.net'.format(label))
+            extract_subgraph_from_pajek_and_write_to_pajek(self.fname_pjk, names, fname_single)
+            with open(fname_single) as f_single, open(os.path.join(self.tempdir, 'batch_{}.net'.format(label))) as f_batch:
+                self.assertEqual(f_single.read(), f_batch.read())
+
+
+class PajekIndexTestSuite(unittest.TestCase):
+    """Pajek sidecar index test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.fname_pjk = os.path.join(self.tempdir, 'test.net')
+        pjk = PajekFactory(weighted=True)
+        pjk.add_edges(['n{}'.format(i % 37) for i in range(500)], ['n{}'.format((i * 7) % 41) for i in range(500)], weights=list(range(500)))
+        with open(self.fname_pjk, 'w') as outf:
+            pjk.write(outf)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_vertex_names(self):
+        with open(self.fname_pjk) as f:
+            lines = f.read().splitlines()
+        expected = {int(line.split()[0]): line.split()[1].strip('"') for line in lines[1:int(lines[0].split()[1]) + 1]}
+        index = PajekIndex.build(self.fname_pjk, stride=4)
+        names = index.get_vertex_names([1, 5, 6, 40, 41, 1000])
+        self.assertEqual(names, {id: expected[id] for id in [1, 5, 6, 40, 41]})
+        self.assertEqual(get_pajek_vertex_names(self.fname_pjk, [2, 3]), {2: 'n1', 3: 'n7'})
+
+    def test_edges(self):
+        edges = pd.concat(list(iter_pajek_edges(self.fname_pjk, use_index=False)))
+        self.assertEqual(len(edges), 500)
+        self.assertTrue(os.path.exists(PajekIndex.sidecar_fname(self.fname_pjk)) is False)
+        indexed = pd.concat(list(iter_pajek_edges(self.fname_pjk, chunksize=100)))
+        self.assertTrue(PajekIndex.load(self.fname_pjk).is_current())
+        ranges = pajek_edge_byte_ranges(self.fname_pjk, 3)
+        self.assertEqual(len(ranges), 3)
+        parallel = pd.concat([chunk for byte_range in ranges for chunk in iter_pajek_edges(self.fname_pjk, byte_range=byte_range)])
+        self.assertEqual(edges.values.tolist(), indexed.values.tolist())
+        self.assertEqual(edges.values.tolist(), parallel.values.tolist())
+
+    def test_open_byte_range(self):
+        with open(self.fname_pjk, 'rb') as f:
+            data = f.read()
+        start, end = pajek_edge_byte_ranges(self.fname_pjk, 3)[1]
+        # a small buffer, so the reads cross the end of the range
+        with open_byte_range(self.fname_pjk, start, end, buffer_size=16) as f:
+            first_line = f.readline()
+            self.assertEqual(f.tell(), len(first_line))
+            lines = [first_line] + f.readlines()
+            self.assertEqual(f.read(), b'')
+            f.seek(0)
+            self.assertEqual(f.readline(), first_line)
+        self.assertEqual(b''.join(lines), data[start:end])
+        self.assertTrue(all(line.endswith(b'\n') for line in lines))
+
+    def test_stale_index_is_rebuilt(self):
+        PajekIndex.open(self.fname_pjk)
+        with open(self.fname_pjk, 'a') as outf:
+            outf.write('1 2 3\n')
+        self.assertFalse(PajekIndex.load(self.fname_pjk).is_current())
+        self.assertTrue(PajekIndex.open(self.fname_pjk).is_current())
+
+    def test_corrupted_index_is_rebuilt(self):
+        expected = PajekIndex.build(self.fname_pjk)
+        sidecar_fname = PajekIndex.sidecar_fname(self.fname_pjk)
+        for corrupt in [lambda data: data[:len(data) // 2], lambda data: b'PK' + b'\0' * len(data)]:
+            PajekIndex.open(self.fname_pjk)
+            with open(sidecar_fname, 'rb') as f:
+                data = f.read()
+            with open(sidecar_fname, 'wb') as outf:
+                outf.write(corrupt(data))
+            index = PajekIndex.open(self.fname_pjk)
+            self.assertTrue(index.is_current())
+            self.assertEqual(index.vertex_ids.tolist(), expected.vertex_ids.tolist())
+            self.assertTrue(PajekIndex.load(self.fname_pjk).is_current())
+        self.assertFalse([f for f in os.listdir(self.tempdir) if f.endswith('.tmp')])
+
+
+class CSRGraphTestSuite(unittest.TestCase):
+    """CSR graph format test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.pjk = PajekFactory(weighted=True)
+        self.pjk.add_edges(['c', 'a', 'b', 'a', 'd'], ['a', 'b', 'c', 'c', 'a'], weights=[1.0, 2.0, 3.0, 0.5, 1.0])
+        self.fname_pjk = os.path.join(self.tempdir, 'test.net')
+        with open(self.fname_pjk, 'w') as outf:
+            self.pjk.write(outf)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_pajek_to_csr(self):
+        g = pajek_to_csr(self.fname_pjk, os.path.join(self.tempdir, 'csr'))
+        self.assertEqual((g.num_vertices, g.num_edges), (4, 5))
+        self.assertEqual(g.get_names(), ['c', 'a', 'b', 'd'])
+        self.assertEqual(g.out_degree().tolist(), [1, 2, 1, 1])
+        self.assertEqual(g.neighbors(1).tolist(), [2, 0])  # a -> b, a -> c
+        self.assertEqual(g.weights[g.offsets[1]:g.offsets[2]].tolist(), [2.0, 0.5])
+        self.assertIsInstance(g.targets, np.memmap)
+
+    def test_csr_round_trip(self):
+        g = pajekfactory_to_csr(self.pjk, os.path.join(self.tempdir, 'csr'))
+        fname_out = os.path.join(self.tempdir, 'out.net')
+        g.to_pajek(fname_out)
+        g2 = pajek_to_csr(fname_out, os.path.join(self.tempdir, 'csr2'))
+        self.assertEqual(g.get_names(), g2.get_names())
+        self.assertEqual(g.offsets.tolist(), g2.offsets.tolist())
+        self.assertEqual(g.targets.tolist(), g2.targets.tolist())
+        self.assertEqual(g.weights.tolist(), g2.weights.tolist())
+
+
+class ClusterGraphTestSuite(unittest.TestCase):
+    """Cluster-level network test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        pjk = PajekFactory(weighted=True)
+        pjk.add_edges(['c', 'a', 'b', 'a', 'd'], ['a', 'b', 'c', 'c', 'a'], weights=[1.0, 2.0, 3.0, 0.5, 1.0])
+        self.fname_pjk = os.path.join(self.tempdir, 'test.net')
+        with open(self.fname_pjk, 'w') as outf:
+            pjk.write(outf)
+        self.fname_tree = os.path.join(self.tempdir, 'test.tree')
+        with open(self.fname_tree, 'w') as outf:
+            outf.write('1:1 0.3 "c" 1\n1:2 0.3 "a" 2\n2:1 0.2 "b" 3\n2:2:1 0.2 "d" 4\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_aggregate_cluster_edges(self):
+        node_codes = np.array([-1, 0, 0, 1, 1])
+        expected = {'source': [0, 0, 1], 'target': [0, 1, 0], 'num_edges': [2, 1, 2], 'weight': [1.5, 2.0, 4.0]}
+        for dense in (True, False):
+            edges = aggregate_cluster_edges(self.fname_pjk, node_codes, 2, chunksize=2, dense=dense)
+            self.assertEqual(edges.to_dict('list'), expected)
+
+    def test_cluster_graph_from_pajek(self):
+        pjk = cluster_graph_from_pajek(self.fname_pjk, self.fname_tree, self_loops=False)
+        self.assertEqual(write_pajek_to_string(pjk), '*Vertices 2\n1 "1"\n2 "2"\n*Arcs 2\n1 2 2.0\n2 1 4.0\n')
+        pjk = cluster_graph_from_pajek(self.fname_pjk, self.fname_tree, depth=2, value='count')
+        self.assertEqual(write_pajek_to_string(pjk).splitlines()[:5], ['*Vertices 3', '1 "1"', '2 "2"', '3 "2:2"', '*Arcs 4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
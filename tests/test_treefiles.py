@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+from .context import h1theswan_utils
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from h1theswan_utils.treefiles import Treefile, compare_treefiles
+
+
+TREEFILE = """# path flow name node:
+1:1:1 0.25 "a" 1
+1:1:2 0.125 "b b" 2
+1:2:1 0.125 "c" 3
+1:3 0.0625 "d" 4
+2:1 0.25 "e" 5
+2:2:1:1 0.125 "f" 6
+2:2:1:2 0.0625 "g" 7
+"""
+
+
+class TreefileTestSuite(unittest.TestCase):
+    """Treefile test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.fname = os.path.join(self.tempdir, 'test.tree')
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_columnar_parse(self):
+        df = Treefile(self.fname, chunksize=3).load_df()
+        self.assertEqual(df.columns.tolist(), ['path', 'flow', 'name', 'node'])
+        self.assertEqual(df['name'].tolist(), ['a', 'b b', 'c', 'd', 'e', 'f', 'g'])
+        self.assertEqual(df['node'].tolist(), list(range(1, 8)))
+        self.assertEqual(str(df['flow'].dtype), 'float64')
+        self.assertEqual(df['flow'].sum(), 1.0)
+
+    def test_columnar_matches_python_engine(self):
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE.replace('"b b"', '"b"'))
+        df = Treefile(self.fname).load_df()
+        expected = Treefile(self.fname, engine='python').load_df()
+        self.assertTrue(df.equals(expected))
+
+    def test_comment_char_inside_line(self):
+        # only lines that start with the comment character are comments
+        for row, expected_row in [('1:1 0.5 a#b', {'path': '1:1', 'flow': 0.5, 'name': 'a#b'}),
+                                  ('1:1 0.5 a#b 1', {'path': '1:1', 'flow': 0.5, 'name': 'a#b', 'node': 1})]:
+            with open(self.fname, 'w') as outf:
+                outf.write('# comment\n' + row + '\n#' + row + '\n' + row.replace('a#b', 'c') + '\n')
+            for engine in ['python', 'columnar', 'parallel']:
+                t = Treefile(self.fname, engine=engine, processes=2)
+                df = t.load_df()
+                self.assertEqual(df['name'].tolist(), ['a#b', 'c'])
+                self.assertEqual(t.d[0], expected_row)
+
+    def test_parallel_matches_columnar(self):
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE.replace('1:3 ', '# comment\n1:3 '))
+        df = Treefile(self.fname, engine='parallel', processes=3).load_df()
+        expected = Treefile(self.fname).load_df()
+        self.assertTrue(df.equals(expected))
+
+    def test_snapshot_cache(self):
+        expected = Treefile(self.fname).load_df()
+        df = Treefile(self.fname, cache=True).load_df()
+        self.assertTrue(df.equals(expected))
+        snapshot_dir = self.fname + '.snapshot'
+        self.assertTrue(os.path.exists(os.path.join(snapshot_dir, 'meta.json')))
+        # loaded from the snapshot the second time
+        df = Treefile(self.fname, cache=True).load_df()
+        self.assertTrue(df.equals(expected))
+        self.assertEqual(df['name'].tolist(), ['a', 'b b', 'c', 'd', 'e', 'f', 'g'])
+
+        # a changed treefile makes the snapshot stale
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE.replace('"g"', '"gg"'))
+        df = Treefile(self.fname, cache=True).load_df()
+        self.assertEqual(df['name'].tolist()[-1], 'gg')
+        df = Treefile(self.fname, cache=True).load_df()
+        self.assertEqual(df['name'].tolist()[-1], 'gg')
+
+        cache_dir = os.path.join(self.tempdir, 'cache')
+        df = Treefile(self.fname, cache=True, cache_dir=cache_dir).load_df()
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertTrue(Treefile(self.fname, cache=True, cache_dir=cache_dir).load_df().equals(df))
+
+
+class TreefileHierarchyTestSuite(unittest.TestCase):
+    """Treefile cluster query test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.fname = os.path.join(self.tempdir, 'test.tree')
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE)
+        self.tf = Treefile(self.fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_get_nodes_for_cluster(self):
+        expected = {'1': ['a', 'b b', 'c', 'd'], 2: ['e', 'f', 'g'], '1:1': ['a', 'b b'], '2:2:': ['f', 'g'], '2:2:1': ['f', 'g'], '1:3': [], '9': []}
+        for cluster_name, names in expected.items():
+            self.assertEqual(self.tf.get_nodes_for_cluster(cluster_name), names)
+        # scanning a dataframe passed in gives the same result
+        df = self.tf.df.copy()
+        self.assertEqual(self.tf.get_nodes_for_cluster('1', df=df), expected['1'])
+        self.assertEqual(self.tf.get_nodes_for_cluster('1:1', df=df), expected['1:1'])
+
+    def test_get_cluster_memberships(self):
+        memberships = self.tf.get_cluster_memberships(depth=2)
+        self.assertEqual({k: v.tolist() for k, v in memberships.items()}, {'1:1': ['a', 'b b'], '1:2': ['c'], '2:2': ['f', 'g']})
+        memberships = self.tf.get_cluster_memberships(depth=1, column='node')
+        self.assertEqual({k: v.tolist() for k, v in memberships.items()}, {'1': [1, 2, 3, 4], '2': [5, 6, 7]})
+
+    def test_get_cluster_stats(self):
+        stats = self.tf.get_cluster_stats()
+        self.assertEqual(stats['cluster'].tolist(), ['1', '2', '1:1', '1:2', '2:2', '2:2:1'])
+        self.assertEqual(stats['depth'].tolist(), [1, 1, 2, 2, 2, 3])
+        self.assertEqual(stats['num_nodes'].tolist(), [4, 3, 2, 1, 2, 2])
+        self.assertEqual(stats['flow'].tolist(), [0.5625, 0.4375, 0.375, 0.125, 0.1875, 0.1875])
+        self.assertEqual(stats['max_flow_name'].tolist(), ['a', 'e', 'a', 'c', 'f', 'f'])
+        self.assertEqual(stats['subtree_depth'].tolist(), [2, 3, 1, 1, 2, 1])
+        stats = self.tf.get_cluster_stats(depth=2)
+        self.assertEqual(stats['cluster'].tolist(), ['1:1', '1:2', '2:2'])
+
+    def test_get_top_nodes_by_flow(self):
+        top = self.tf.get_top_nodes_by_flow(k=2, depth=1)
+        self.assertEqual(top['cluster'].tolist(), ['1', '1', '2', '2'])
+        self.assertEqual(top['rank'].tolist(), [0, 1, 0, 1])
+        # ties keep hierarchical order
+        self.assertEqual(top['name'].tolist(), ['a', 'b b', 'e', 'f'])
+        top = self.tf.get_top_nodes_by_flow(k=1, depth=2, column='node')
+        self.assertEqual(top['node'].tolist(), [1, 3, 6])
+        self.assertEqual(top['flow'].tolist(), [0.25, 0.125, 0.125])
+
+
+class TreefileCompareTestSuite(unittest.TestCase):
+    """Treefile partition comparison test cases."""
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.fname = os.path.join(self.tempdir, 'test.tree')
+        with open(self.fname, 'w') as outf:
+            outf.write(TREEFILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_compare_identical(self):
+        result = compare_treefiles(Treefile(self.fname), self.fname, depth=2)
+        self.assertAlmostEqual(result['nmi'], 1.0)
+        self.assertAlmostEqual(result['ari'], 1.0)
+        self.assertEqual(result['num_nodes'], 7)
+        self.assertEqual(result['best_matches']['jaccard'].tolist(), [1.0] * 5)
+
+    def test_compare(self):
+        # move node 'd' to cluster 2, and leave out node 'g'
+        fname2 = os.path.join(self.tempdir, 'test2.tree')
+        with open(fname2, 'w') as outf:
+            outf.write(TREEFILE.replace('1:3 ', '2:3 ').replace('2:2:1:2 0.0625 "g" 7\n', ''))
+        result = compare_treefiles(self.fname, fname2, on='node')
+        self.assertEqual(result['num_nodes'], 6)
+        # contingency table [[3, 1], [0, 2]]: pairs in cells 4, in rows 7, in columns 6, out of 15 pairs
+        expected = 7.0 * 6 / 15
+        self.assertAlmostEqual(result['ari'], (4 - expected) / ((7 + 6) / 2.0 - expected))
+        matches = result['best_matches']
+        self.assertEqual(matches['cluster'].tolist(), ['1', '2'])
+        self.assertEqual(matches['best_match'].tolist(), ['1', '2'])
+        self.assertEqual(matches['jaccard'].tolist(), [0.75, 2.0 / 3])
+        self.assertEqual(matches['num_common'].tolist(), [3, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()